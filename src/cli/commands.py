@@ -8,6 +8,7 @@ from PIL import Image
 import piexif
 from typing import Optional, Tuple, List
 import logging
+import sys
 from tqdm import tqdm
 
 # 设置日志
@@ -214,6 +215,29 @@ def process_directory(input_dir: str, output_dir: str):
     # 生成报告
     generate_report(input_stats, output_stats, output_path)
 
+def _add_project_root() -> None:
+    """复用核心模块，直接以脚本运行时补充项目根目录"""
+    project_root = str(Path(__file__).resolve().parents[2])
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+def find_similar(input_dir: str, threshold: int, workers: Optional[int], use_cache: bool = True,
+                 cascade: Tuple[str, ...] = ('average',), include_videos: bool = False) -> None:
+    """查找并打印相似照片组"""
+    _add_project_root()
+    from src.core.similarity import PhotoSimilarityFinder
+
+    finder = PhotoSimilarityFinder(use_cache=use_cache, cascade=cascade, include_videos=include_videos)
+    similar_photos = finder.find_similar_photos(input_dir, hash_threshold=threshold, workers=workers)
+    if not similar_photos:
+        print("未找到相似照片。")
+        return
+    print(f"找到 {len(similar_photos)} 组相似照片")
+    for group_id, files in similar_photos.items():
+        print(f"组 {group_id}：")
+        for file in files:
+            print(f"  {file}")
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='整理照片和视频文件')
@@ -221,8 +245,32 @@ def main():
     parser.add_argument('--output-dir', '-o', 
                       help='输出目录路径（默认为输入目录）',
                       default=None)
+    parser.add_argument('--find-similar', action='store_true',
+                      help='查找相似照片而不是整理文件')
+    parser.add_argument('--threshold', type=int, default=5,
+                      help='相似度阈值（汉明距离，默认5）')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                      help='并行计算哈希的进程数（0表示使用全部CPU核心，默认串行）')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='不使用持久化哈希缓存')
+    parser.add_argument('--cascade', default='average',
+                      help='哈希算法级联，逗号分隔，如 average,difference,perceptual（默认average）')
+    parser.add_argument('--include-videos', action='store_true',
+                      help='同时查找相似的MP4/MOV视频（需要安装ffmpeg）')
     args = parser.parse_args()
 
+    if args.find_similar:
+        _add_project_root()
+        from src.core.similarity import HASH_FUNCTIONS
+        cascade = tuple(name.strip() for name in args.cascade.split(','))
+        unknown = [name for name in cascade if name not in HASH_FUNCTIONS]
+        if unknown or not all(cascade):
+            parser.error(f"--cascade: 不支持的哈希算法 {', '.join(unknown) or args.cascade}，"
+                         f"可选: {', '.join(HASH_FUNCTIONS)}")
+        find_similar(args.input_dir, args.threshold, args.workers, use_cache=not args.no_cache,
+                     cascade=cascade, include_videos=args.include_videos)
+        return
+
     try:
         # 如果没有指定输出目录，使用输入目录
         output_dir = args.output_dir if args.output_dir else args.input_dir
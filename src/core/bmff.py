@@ -0,0 +1,171 @@
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterator, Optional, Tuple
+import logging
+
+from .exif_reader import HEADER_BUFFER_SIZE, read_tiff_datetime
+
+# QuickTime/MP4时间戳的起点
+MOVIE_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+# ISO-BMFF容器格式
+BMFF_FORMATS = {'.heic', '.heif', '.mp4', '.mov'}
+
+def iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    依次读取[start, end)范围内的盒子头，产出(类型, 数据起始偏移, 盒子结束偏移)
+    只读取8~16字节的盒子头，通过seek跳过数据部分
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        payload = offset + 8
+        if size == 1:
+            largesize = f.read(8)
+            if len(largesize) < 8:
+                return
+            size, = struct.unpack('>Q', largesize)
+            payload += 8
+        elif size == 0:
+            # 盒子延伸到文件末尾
+            size = end - offset
+        if size < payload - offset:
+            return
+        yield box_type, payload, offset + size
+        offset += size
+
+def find_box(f: BinaryIO, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    """在[start, end)范围内查找指定类型的盒子，返回(数据起始偏移, 盒子结束偏移)"""
+    for found, payload, box_end in iter_boxes(f, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+def _read_uint(f: BinaryIO, size: int) -> int:
+    """读取size字节的大端无符号整数，size为0时返回0"""
+    return int.from_bytes(f.read(size), 'big') if size else 0
+
+def _find_exif_item(f: BinaryIO, start: int, end: int) -> Optional[int]:
+    """在iinf中查找类型为Exif的条目，返回其item_ID"""
+    iinf = find_box(f, start, end, b'iinf')
+    if iinf is None:
+        return None
+    payload, box_end = iinf
+    f.seek(payload)
+    version = f.read(4)[0]
+    entries_start = payload + (6 if version == 0 else 8)
+    for box_type, infe, infe_end in iter_boxes(f, entries_start, box_end):
+        if box_type != b'infe':
+            continue
+        f.seek(infe)
+        version = f.read(4)[0]
+        if version < 2:
+            continue
+        item_id = _read_uint(f, 2 if version == 2 else 4)
+        f.read(2)  # item_protection_index
+        if f.read(4) == b'Exif':
+            return item_id
+    return None
+
+def _find_item_offset(f: BinaryIO, start: int, end: int, item_id: int) -> Optional[int]:
+    """在iloc中查找条目数据在文件中的偏移，只支持按文件偏移存放(construction_method 0)的条目"""
+    iloc = find_box(f, start, end, b'iloc')
+    if iloc is None:
+        return None
+    f.seek(iloc[0])
+    version = f.read(4)[0]
+    sizes = f.read(2)
+    offset_size, length_size = sizes[0] >> 4, sizes[0] & 0x0F
+    base_offset_size = sizes[1] >> 4
+    index_size = sizes[1] & 0x0F if version in (1, 2) else 0
+    item_count = _read_uint(f, 2 if version < 2 else 4)
+    for _ in range(item_count):
+        current_id = _read_uint(f, 2 if version < 2 else 4)
+        construction_method = _read_uint(f, 2) & 0x0F if version in (1, 2) else 0
+        f.read(2)  # data_reference_index
+        base_offset = _read_uint(f, base_offset_size)
+        extent_count = _read_uint(f, 2)
+        extents = []
+        for _ in range(extent_count):
+            _read_uint(f, index_size)
+            extents.append((_read_uint(f, offset_size), _read_uint(f, length_size)))
+        if current_id == item_id:
+            if construction_method != 0 or not extents:
+                return None
+            return base_offset + extents[0][0]
+    return None
+
+def read_heif_datetime(f: BinaryIO, meta_start: int, meta_end: int) -> Optional[datetime]:
+    """通过meta中的iinf/iloc定位Exif条目，直接读取其中的TIFF结构"""
+    # meta是FullBox，数据前有4字节版本和标志
+    start = meta_start + 4
+    item_id = _find_exif_item(f, start, meta_end)
+    if item_id is None:
+        return None
+    item_offset = _find_item_offset(f, start, meta_end, item_id)
+    if item_offset is None:
+        return None
+    # Exif条目以4字节的TIFF头偏移开始，其后可能还有'Exif\0\0'前缀
+    f.seek(item_offset)
+    tiff_offset, = struct.unpack('>I', f.read(4))
+    return read_tiff_datetime(f, item_offset + 4 + tiff_offset)
+
+def parse_movie_date(value: str) -> Optional[datetime]:
+    """解析QuickTime的日期字符串，如'2023-05-06T07:08:09+0800'"""
+    value = value.strip().rstrip('\0')
+    for fmt in ('%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+def read_movie_datetime(f: BinaryIO, moov_start: int, moov_end: int) -> Optional[datetime]:
+    """
+    读取moov中的拍摄时间
+    优先使用udta中的©day（包含拍摄地时区），其次使用mvhd的创建时间（UTC，转换为本地时间）
+    """
+    udta = find_box(f, moov_start, moov_end, b'udta')
+    if udta is not None:
+        day = find_box(f, udta[0], udta[1], b'\xa9day')
+        if day is not None and day[1] - day[0] > 4:
+            # QuickTime格式：2字节长度、2字节语言代码，之后是字符串
+            f.seek(day[0])
+            length, _ = struct.unpack('>HH', f.read(4))
+            date = parse_movie_date(f.read(min(length, day[1] - day[0] - 4)).decode('utf-8', errors='ignore'))
+            if date:
+                return date
+
+    mvhd = find_box(f, moov_start, moov_end, b'mvhd')
+    if mvhd is None:
+        return None
+    f.seek(mvhd[0])
+    version = f.read(4)[0]
+    creation_time = _read_uint(f, 8 if version == 1 else 4)
+    if creation_time == 0:
+        # 未设置创建时间
+        return None
+    return (MOVIE_EPOCH + timedelta(seconds=creation_time)).astimezone()
+
+def read_bmff_datetime(file_path: str) -> Optional[datetime]:
+    """
+    从HEIC/HEIF的Exif条目或MP4/MOV的moov中读取拍摄时间
+    只读取盒子头和元数据，通过seek跳过mdat等媒体数据
+    """
+    with open(file_path, 'rb', buffering=HEADER_BUFFER_SIZE) as f:
+        end = os.fstat(f.fileno()).st_size
+        for box_type, payload, box_end in iter_boxes(f, 0, end):
+            if box_type == b'meta':
+                date = read_heif_datetime(f, payload, box_end)
+            elif box_type == b'moov':
+                date = read_movie_datetime(f, payload, box_end)
+            else:
+                continue
+            if date:
+                return date
+    logging.debug(f"{file_path} 中没有找到拍摄时间")
+    return None
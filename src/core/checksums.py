@@ -0,0 +1,127 @@
+import errno
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, IO, Set
+
+from .duplicates import DIGEST_BLOCK_SIZE, file_digest
+
+# 每个目标目录中的校验和文件，格式与 b2sum 相同，可以用 `b2sum -c .checksums.b2` 检查
+CHECKSUM_FILENAME = '.checksums.b2'
+# 回读校验失败时重新复制的次数
+VERIFY_RETRIES = 1
+# 同时保持打开的校验和文件数量上限，超过后关闭最久未写入的文件
+MAX_OPEN_CHECKSUM_FILES = 64
+
+def _drop_cache(fd: int) -> None:
+    """让内核丢弃文件的页缓存，使回读校验读取磁盘上的数据而不是刚写入的缓存"""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+def copy_with_digest(source: str, target: str, read_back: bool = False) -> str:
+    """
+    流式复制文件，复制的同时计算BLAKE2摘要，源文件只读取一次，摘要来自复制时经过缓冲区的数据
+    读取的字节数与源文件大小不一致（读卡器掉线、文件被截断）时报错
+    :param read_back: 写入后fsync、丢弃页缓存并回读目标文件校验，不一致时重新复制；
+                      需要对每个文件多一次fsync和一次完整读取，只在怀疑目标设备不可靠时使用
+    :return: 文件内容的摘要
+    """
+    for attempt in range(VERIFY_RETRIES + 1):
+        digest = hashlib.blake2b()
+        copied = 0
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            expected_size = os.fstat(src.fileno()).st_size
+            for block in iter(lambda: src.read(DIGEST_BLOCK_SIZE), b''):
+                digest.update(block)
+                dst.write(block)
+                copied += len(block)
+            if copied != expected_size:
+                raise OSError(errno.EIO, f"读取 {source} 时只得到 {copied}/{expected_size} 字节")
+            if read_back:
+                dst.flush()
+                os.fsync(dst.fileno())
+                _drop_cache(dst.fileno())
+        expected = digest.hexdigest()
+        if not read_back or file_digest(target) == expected:
+            shutil.copymode(source, target)
+            return expected
+    raise OSError(errno.EIO, f"复制 {source} 后校验失败")
+
+def copy_and_read_back(source: str, target: str) -> str:
+    """流式复制并回读校验，见copy_with_digest"""
+    return copy_with_digest(source, target, read_back=True)
+
+def read_checksums(directory: Path) -> Dict[str, str]:
+    """读取目录的校验和文件，返回 文件名 -> 摘要，同一文件有多行时以最后一行为准"""
+    checksums = {}
+    path = Path(directory) / CHECKSUM_FILENAME
+    if not path.exists():
+        return checksums
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            digest, sep, name = line.rstrip('\n').partition('  ')
+            if sep:
+                checksums[name] = digest
+    return checksums
+
+class ChecksumWriter:
+    """
+    向各目标目录的校验和文件追加记录，多个复制线程共用
+    每个目录的校验和文件在本次运行中保持打开，不再逐个文件打开和关闭；
+    同一文件名再次写入（中断后重新放置）时，close()把该目录的校验和文件改写为每个文件名只保留最后一行
+    """
+    
+    def __init__(self, max_open: int = MAX_OPEN_CHECKSUM_FILES):
+        self.lock = threading.Lock()
+        self.max_open = max(1, max_open)
+        self.files: 'OrderedDict[Path, IO[str]]' = OrderedDict()  # 目录 -> 追加打开的校验和文件
+        self.names: Dict[Path, Set[str]] = {}  # 目录 -> 校验和文件中已有的文件名
+        self.dirty: Set[Path] = set()  # 有重复文件名、需要改写的目录
+        
+    def add(self, path: Path, digest: str) -> None:
+        directory = path.parent
+        with self.lock:
+            names = self.names.get(directory)
+            if names is None:
+                names = self.names[directory] = set(read_checksums(directory))
+            if path.name in names:
+                self.dirty.add(directory)
+            names.add(path.name)
+            self._file(directory).write(f"{digest}  {path.name}\n")
+            
+    def _file(self, directory: Path) -> IO[str]:
+        f = self.files.get(directory)
+        if f is not None:
+            self.files.move_to_end(directory)
+            return f
+        if len(self.files) >= self.max_open:
+            self.files.popitem(last=False)[1].close()
+        f = self.files[directory] = open(directory / CHECKSUM_FILENAME, 'a', encoding='utf-8')
+        return f
+        
+    def flush(self) -> None:
+        """把已写入的记录交给操作系统，调用方在记录文件完成前调用"""
+        with self.lock:
+            for f in self.files.values():
+                f.flush()
+                
+    def close(self) -> None:
+        """关闭所有校验和文件，有重复文件名的目录改写为每个文件名一行；已读取的文件名保留，再次写入时不重新读取"""
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
+            for directory in self.dirty:
+                path = directory / CHECKSUM_FILENAME
+                temp_path = path.with_name(f"{path.name}.partial")
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    for name, digest in read_checksums(directory).items():
+                        f.write(f"{digest}  {name}\n")
+                os.replace(temp_path, path)
+            self.dirty.clear()
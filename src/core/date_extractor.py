@@ -2,33 +2,47 @@ import os
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Optional, List
 import logging
-from PIL import Image
-import piexif
+
+from .bmff import BMFF_FORMATS, read_bmff_datetime
+from .exif_reader import read_exif_datetime
+from .utils import get_number_from_filename
 
 class DateExtractor:
     """日期提取类"""
     
-    def __init__(self):
+    def __init__(self, max_sequence_gap: Optional[int] = None):
+        """
+        :param max_sequence_gap: 从相邻文件推断日期时允许的最大序号差，None表示不限制
+        """
         self.date_patterns = [
             r'(20\d{2})[/_-]?(\d{2})[/_-]?(\d{2})',  # 2023-01-01, 2023_01_01, 20230101
             r'(19\d{2})[/_-]?(\d{2})[/_-]?(\d{2})',  # 1999-01-01, 1999_01_01, 19990101
         ]
+        self.max_sequence_gap = max_sequence_gap
+        # 本次运行中已读取的EXIF日期，每个文件只读取一次
+        self.date_cache: Dict[str, Optional[datetime]] = {}
+        
+    def clear_cache(self) -> None:
+        """清空已读取的日期，文件可能在两次运行之间被修改"""
+        self.date_cache.clear()
         
     def get_creation_date_from_exif(self, file_path: str) -> Optional[datetime]:
-        """从EXIF信息中获取创建时间"""
+        """从EXIF信息（HEIC/MP4/MOV为容器元数据）中获取创建时间，只读取文件头部的元数据段"""
+        file_path = str(file_path)
+        if file_path in self.date_cache:
+            return self.date_cache[file_path]
+        date = None
         try:
             if file_path.lower().endswith(('.jpg', '.jpeg', '.png')):
-                with Image.open(file_path) as img:
-                    if 'exif' in img.info:
-                        exif_dict = piexif.load(img.info['exif'])
-                        if piexif.ExifIFD.DateTimeOriginal in exif_dict['Exif']:
-                            date_str = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode('utf-8')
-                            return datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
+                date = read_exif_datetime(file_path)
+            elif Path(file_path).suffix.lower() in BMFF_FORMATS:
+                date = read_bmff_datetime(file_path)
         except Exception as e:
             logging.error(f"无法从{file_path}读取EXIF信息: {str(e)}")
-        return None
+        self.date_cache[file_path] = date
+        return date
         
     def get_date_from_path(self, file_path: Path) -> Optional[datetime]:
         """从文件路径推断日期"""
@@ -43,24 +57,46 @@ class DateExtractor:
             logging.error(f"从路径推断日期失败: {str(e)}")
         return None
         
+    def _within_gap(self, files: List[Path], i: int, j: int) -> bool:
+        """两个文件的序号差是否在允许范围内，文件名中没有数字时按排序位置计算"""
+        if self.max_sequence_gap is None:
+            return True
+        a = get_number_from_filename(files[i].name)
+        b = get_number_from_filename(files[j].name)
+        gap = abs(a - b) if a is not None and b is not None else abs(i - j)
+        return gap <= self.max_sequence_gap
+        
+    def infer_dates(self, files: List[Path]) -> Dict[Path, Optional[datetime]]:
+        """
+        按给定顺序为一组文件推断日期：有EXIF日期的直接使用，没有的取排序位置最近的有日期的文件
+        每个文件只读取一次EXIF，向前、向后各扫描一遍，总体为线性时间
+        :return: 字典，键为文件，值为日期（无法推断时为None）
+        """
+        dates = [self.get_creation_date_from_exif(str(f)) for f in files]
+        # 每个位置及之前最近的有日期的文件
+        previous = []
+        last = None
+        for i, date in enumerate(dates):
+            if date:
+                last = i
+            previous.append(last)
+            
+        inferred = {}
+        following = None
+        for i in reversed(range(len(files))):
+            if dates[i]:
+                following = i
+            candidates = [j for j in (previous[i], following)
+                          if j is not None and self._within_gap(files, i, j)]
+            # 距离相同时优先使用前一个文件
+            nearest = min(candidates, key=lambda j: abs(i - j), default=None)
+            inferred[files[i]] = dates[nearest] if nearest is not None else None
+        return inferred
+        
     def get_date_from_related_files(self, current_file: Path, related_files: List[Path]) -> Optional[datetime]:
         """从相关文件中获取日期"""
         try:
-            all_files = sorted(related_files)
-            current_index = all_files.index(current_file)
-            
-            # 向前和向后查找最近的有日期的文件
-            for offset in range(len(all_files)):
-                # 向前查找
-                if current_index - offset >= 0:
-                    date = self.get_creation_date_from_exif(str(all_files[current_index - offset]))
-                    if date:
-                        return date
-                # 向后查找
-                if current_index + offset < len(all_files):
-                    date = self.get_creation_date_from_exif(str(all_files[current_index + offset]))
-                    if date:
-                        return date
+            return self.infer_dates(sorted(related_files)).get(current_file)
         except Exception as e:
             logging.error(f"从相关文件获取日期失败: {str(e)}")
         return None
@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+class DestinationIndex:
+    """
+    目标目录内容的内存索引，用于在不逐个探测文件是否存在的情况下分配不冲突的文件名
+    每个目录只在第一次用到时scandir一次，之后分配的文件名直接加入索引
+    文件名按casefold比较，在不区分大小写的文件系统（exFAT、NTFS、APFS）上也不会冲突
+    """
+    
+    def __init__(self):
+        self.names: Dict[Path, Set[str]] = {}  # 目录 -> 已存在或已分配的文件名
+        self.counters: Dict[Tuple[Path, str, str], int] = {}  # (目录, 文件名, 扩展名) -> 下一个可能空闲的编号
+        
+    def _load(self, directory: Path) -> Set[str]:
+        names = self.names.get(directory)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(directory) as entries:
+                    names.update(entry.name.casefold() for entry in entries)
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+            self.names[directory] = names
+        return names
+        
+    def contains(self, path: Path) -> bool:
+        """路径是否已存在或已被分配"""
+        return path.name.casefold() in self._load(path.parent)
+        
+    def reserve(self, path: Path) -> None:
+        """登记一个已确定的目标路径"""
+        self._load(path.parent).add(path.name.casefold())
+        
+    def allocate(self, directory: Path, file_path: Path) -> Tuple[Path, int]:
+        """
+        为文件分配目录中第一个空闲的文件名：原文件名、name_1、name_2……
+        每组同名文件记录已用到的编号，大量同名文件时不会从头重新探测
+        :return: (目标路径, 追加的编号)，编号为0表示使用原文件名
+        """
+        names = self._load(directory)
+        key = (directory, file_path.stem.casefold(), file_path.suffix.casefold())
+        counter = self.counters.get(key, 0)
+        name = file_path.name if counter == 0 else f"{file_path.stem}_{counter}{file_path.suffix}"
+        while name.casefold() in names:
+            counter += 1
+            name = f"{file_path.stem}_{counter}{file_path.suffix}"
+        names.add(name.casefold())
+        self.counters[key] = counter + 1
+        return directory / name, counter
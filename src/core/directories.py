@@ -0,0 +1,92 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+import logging
+
+# 最多同时保持打开的目录数，超过后其余目录退回使用完整路径
+MAX_OPEN_DIRECTORIES = 256
+
+class DirectoryRegistry:
+    """
+    一次整理中的目标目录登记表
+    每个目录只创建一次：上级目录已登记时直接mkdir，不再逐级stat路径上的每个目录（NFS上每次都是一次往返）
+    已打开的目录描述符供 utime、rename 等 *at() 调用使用相对路径，避免每次重新解析完整路径
+    """
+    
+    def __init__(self, max_open: int = MAX_OPEN_DIRECTORIES):
+        self.max_open = max_open
+        self.created: Set[str] = set()
+        self.fds: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        
+    def ensure(self, directory: Path) -> str:
+        """
+        确保目录存在
+        :return: 目录的绝对路径，作为dir_fd等方法的键
+        """
+        path = os.path.abspath(directory)
+        if path in self.created:
+            return path
+        with self.lock:
+            self._create(path)
+        return path
+        
+    def _create(self, path: str) -> None:
+        if path in self.created:
+            return
+        parent = os.path.dirname(path)
+        if parent in self.created or parent == path:
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                if not os.path.isdir(path):
+                    raise
+        else:
+            os.makedirs(path, exist_ok=True)
+            # 创建后路径上的各级目录都已存在
+            ancestor = parent
+            while ancestor not in self.created and os.path.dirname(ancestor) != ancestor:
+                self.created.add(ancestor)
+                ancestor = os.path.dirname(ancestor)
+        self.created.add(path)
+        
+    def precreate(self, directories: Iterable[Path]) -> int:
+        """
+        按计划预先创建全部目标目录，排序后上级目录先于子目录创建
+        :return: 本次新登记的目录数
+        """
+        paths = sorted({os.path.abspath(d) for d in directories} - self.created)
+        with self.lock:
+            for path in paths:
+                self._create(path)
+        if paths:
+            logging.info(f"已预先创建 {len(paths)} 个目标目录")
+        return len(paths)
+        
+    def dir_fd(self, directory: Path) -> Optional[int]:
+        """
+        目录的描述符，每个目录只打开一次，在close前一直有效
+        目录不存在时先创建；平台不支持dir_fd、打开的目录数已达上限或打开失败时返回None，调用方使用完整路径
+        """
+        path = self.ensure(directory)
+        if os.rename not in os.supports_dir_fd:
+            return None
+        fd = self.fds.get(path)
+        if fd is not None:
+            return fd
+        with self.lock:
+            fd = self.fds.get(path)
+            if fd is None and len(self.fds) < self.max_open:
+                try:
+                    fd = self.fds[path] = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+                except OSError as e:
+                    logging.error(f"打开目录 {path} 失败: {str(e)}")
+            return fd
+            
+    def close(self) -> None:
+        """关闭所有目录描述符，已创建目录的记录保留"""
+        with self.lock:
+            for fd in self.fds.values():
+                os.close(fd)
+            self.fds.clear()
@@ -0,0 +1,74 @@
+import os
+import hashlib
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+# 局部摘要读取文件头尾各64KiB
+PARTIAL_DIGEST_SIZE = 64 * 1024
+# 计算完整摘要时的读取块大小
+DIGEST_BLOCK_SIZE = 1024 * 1024
+
+def file_digest(file_path: str) -> str:
+    """计算文件完整内容的BLAKE2摘要"""
+    digest = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def partial_digest(file_path: str, size: int) -> str:
+    """计算文件头尾各64KiB的BLAKE2摘要，文件不大于128KiB时直接返回完整摘要"""
+    if size <= 2 * PARTIAL_DIGEST_SIZE:
+        return file_digest(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(PARTIAL_DIGEST_SIZE))
+        f.seek(-PARTIAL_DIGEST_SIZE, os.SEEK_END)
+        digest.update(f.read(PARTIAL_DIGEST_SIZE))
+    return digest.hexdigest()
+
+def _refine(groups: Iterable[List[str]], key: Callable[[str], str]) -> List[Tuple[str, List[str]]]:
+    """按key细分每个候选组，只保留仍有重复的(摘要, 文件列表)"""
+    refined = []
+    for group in groups:
+        buckets = defaultdict(list)
+        for path in group:
+            try:
+                buckets[key(path)].append(path)
+            except OSError as e:
+                logging.error(f"读取文件 {path} 时出错: {str(e)}")
+        refined.extend((digest, members) for digest, members in buckets.items() if len(members) > 1)
+    return refined
+
+def find_exact_duplicates(paths: Iterable[str],
+                          sizes: Optional[Dict[str, int]] = None) -> Dict[str, List[str]]:
+    """
+    查找内容完全相同的文件，不解码任何像素
+    依次按文件大小、头尾局部摘要、完整摘要筛选，只有仍然冲突的文件才会被完整读取
+    :param paths: 文件路径
+    :param sizes: 已知的文件大小，缺失的通过os.stat获取
+    :return: 字典，键为内容摘要，值为相同内容的文件路径列表
+    """
+    sizes = dict(sizes or {})
+    by_size = defaultdict(list)
+    for path in paths:
+        if path not in sizes:
+            try:
+                sizes[path] = os.stat(path).st_size
+            except OSError as e:
+                logging.error(f"读取文件 {path} 时出错: {str(e)}")
+                continue
+        by_size[sizes[path]].append(path)
+
+    candidates = [group for group in by_size.values() if len(group) > 1]
+    partial = _refine(candidates, lambda path: partial_digest(path, sizes[path]))
+
+    duplicates = {}
+    for digest, group in partial:
+        if sizes[group[0]] <= 2 * PARTIAL_DIGEST_SIZE:
+            # 小文件的局部摘要已是完整摘要
+            duplicates[digest] = group
+        else:
+            duplicates.update(_refine([group], file_digest))
+    return duplicates
@@ -0,0 +1,156 @@
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Optional, Tuple
+import logging
+
+# TIFF标签
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+# TIFF字段类型ASCII
+TYPE_ASCII = 2
+# 单个IFD允许的最大条目数，超过时视为损坏的数据
+MAX_IFD_ENTRIES = 1024
+# 读取文件时的缓冲区大小，EXIF日期所在的IFD通常位于文件开头几KiB内
+HEADER_BUFFER_SIZE = 8 * 1024
+
+def _read_ifd(f: BinaryIO, base: int, endian: str, offset: int) -> Dict[int, Tuple[int, int, bytes]]:
+    """读取一个IFD的全部条目：标签 -> (类型, 数量, 值或偏移的4个原始字节)"""
+    f.seek(base + offset)
+    count_bytes = f.read(2)
+    if len(count_bytes) < 2:
+        return {}
+    count, = struct.unpack(endian + 'H', count_bytes)
+    if count > MAX_IFD_ENTRIES:
+        return {}
+    data = f.read(count * 12)
+    entries = {}
+    for i in range(len(data) // 12):
+        tag, field_type, value_count = struct.unpack(endian + 'HHI', data[i * 12:i * 12 + 8])
+        entries[tag] = (field_type, value_count, data[i * 12 + 8:i * 12 + 12])
+    return entries
+
+def _read_ascii(f: BinaryIO, base: int, endian: str, entry: Optional[Tuple[int, int, bytes]]) -> Optional[str]:
+    """读取ASCII类型的值，不超过4字节时值直接存放在条目中"""
+    if entry is None:
+        return None
+    field_type, count, raw = entry
+    if field_type != TYPE_ASCII or count == 0:
+        return None
+    if count <= 4:
+        value = raw[:count]
+    else:
+        offset, = struct.unpack(endian + 'I', raw)
+        f.seek(base + offset)
+        value = f.read(count)
+    return value.split(b'\0', 1)[0].decode('ascii', errors='ignore').strip() or None
+
+def parse_exif_datetime(value: str, subsec: Optional[str] = None,
+                        offset: Optional[str] = None) -> datetime:
+    """
+    解析EXIF日期时间字符串
+    :param value: 'YYYY:MM:DD HH:MM:SS'
+    :param subsec: 秒的小数部分，如'123'表示0.123秒
+    :param offset: 时区偏移，如'+08:00'；存在时返回带时区的时间
+    """
+    date = datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
+    if subsec and subsec.isdigit():
+        date = date.replace(microsecond=int(subsec[:6].ljust(6, '0')))
+    if offset and len(offset) == 6 and offset[0] in '+-' and offset[3] == ':':
+        sign = -1 if offset[0] == '-' else 1
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+        date = date.replace(tzinfo=timezone(sign * delta))
+    return date
+
+def read_tiff_datetime(f: BinaryIO, base: int = 0) -> Optional[datetime]:
+    """
+    从TIFF结构中读取拍摄时间，只访问IFD0和Exif子IFD
+    :param f: 以二进制方式打开的文件
+    :param base: TIFF头在文件中的偏移，IFD中的偏移都相对于它
+    """
+    f.seek(base)
+    header = f.read(8)
+    if len(header) < 8 or header[:2] not in (b'II', b'MM'):
+        return None
+    endian = '<' if header[:2] == b'II' else '>'
+    magic, ifd0_offset = struct.unpack(endian + 'HI', header[2:])
+    if magic != 42:
+        return None
+
+    ifd0 = _read_ifd(f, base, endian, ifd0_offset)
+    if TAG_EXIF_IFD not in ifd0:
+        return None
+    exif_offset, = struct.unpack(endian + 'I', ifd0[TAG_EXIF_IFD][2])
+    exif = _read_ifd(f, base, endian, exif_offset)
+    value = _read_ascii(f, base, endian, exif.get(TAG_DATETIME_ORIGINAL))
+    if not value:
+        return None
+    return parse_exif_datetime(
+        value,
+        _read_ascii(f, base, endian, exif.get(TAG_SUBSEC_TIME_ORIGINAL)),
+        _read_ascii(f, base, endian, exif.get(TAG_OFFSET_TIME_ORIGINAL))
+    )
+
+def find_jpeg_exif(f: BinaryIO) -> Optional[int]:
+    """按段头依次跳过JPEG标记段，返回APP1中TIFF头的偏移；遇到图像数据(SOS)即停止"""
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:
+            # 标记前允许有填充字节
+            marker = marker[1:] + f.read(1)
+            if len(marker) < 2:
+                return None
+        if marker[1] in (0xD9, 0xDA):
+            return None
+        if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD7:
+            # 无长度字段的独立标记
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length, = struct.unpack('>H', length_bytes)
+        start = f.tell()
+        if marker[1] == 0xE1 and f.read(6) == b'Exif\0\0':
+            return start + 6
+        f.seek(start + length - 2)
+
+def find_png_exif(f: BinaryIO) -> Optional[int]:
+    """按块头依次跳过PNG数据块，返回eXIf块中TIFF头的偏移；遇到图像数据(IDAT)即停止"""
+    if f.read(8) != b'\x89PNG\r\n\x1a\n':
+        return None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'eXIf':
+            return f.tell()
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        # 跳过数据和CRC
+        f.seek(length + 4, 1)
+
+def read_exif_datetime(file_path: str) -> Optional[datetime]:
+    """
+    只读取文件头部的元数据段获取EXIF拍摄时间，不解码像素，也不解析无关的EXIF标签
+    支持JPEG(APP1)和PNG(eXIf)
+    :return: 拍摄时间，包含亚秒；有时区偏移时返回带时区的时间
+    """
+    with open(file_path, 'rb', buffering=HEADER_BUFFER_SIZE) as f:
+        signature = f.read(2)
+        f.seek(0)
+        if signature == b'\xff\xd8':
+            base = find_jpeg_exif(f)
+        elif signature == b'\x89P':
+            base = find_png_exif(f)
+        else:
+            logging.debug(f"{file_path} 不是JPEG或PNG文件")
+            return None
+        if base is None:
+            return None
+        return read_tiff_datetime(f, base)
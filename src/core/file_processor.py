@@ -1,30 +1,69 @@
 import os
-import shutil
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Set, Tuple
 import logging
 
+from .checksums import ChecksumWriter
 from .date_extractor import DateExtractor
+from .destination_index import DestinationIndex
+from .directories import DirectoryRegistry
+from .duplicates import file_digest, find_exact_duplicates
+from .journal import JOURNAL_FILENAME, Journal
+from .library_index import LIBRARY_DEDUP_MODES, LibraryIndex
+from .manifest import MANIFEST_FILENAME, SourceManifest
+from .metadata import FileTimes, apply_times, file_times
+from .placement import FilePlacer, publish_file
+from .plan import make_operation, write_plan
+from .scheduler import DeviceLimiter, schedule_copies
 from .utils import format_size, get_number_from_filename
+from .walker import MediaFile, media_kind, media_stats, merge_stats, walk_media
+
+# 读取EXIF日期的线程数，读取的是文件头部的几KiB，主要等待I/O延迟
+METADATA_WORKERS = 8
+# 复制文件的线程数，应与目标磁盘或网络存储的并发能力相匹配
+COPY_WORKERS = 4
+# 每个复制线程最多排队的文件数，超过后execute_plan的提交循环等待已提交的复制完成，限制排队任务占用的内存
+PENDING_COPIES_PER_WORKER = 16
+# 没有日志时，每放置多少个文件批量设置一次文件时间
+METADATA_BATCH_SIZE = 64
 
 class FileProcessor:
     """文件处理核心类"""
     
-    def __init__(self):
+    def __init__(self, max_sequence_gap: Optional[int] = None,
+                 metadata_workers: int = METADATA_WORKERS, copy_workers: int = COPY_WORKERS,
+                 placement: str = 'auto', verify: bool = False, read_back: bool = False):
+        """
+        :param max_sequence_gap: 从同目录相邻文件推断日期时允许的最大序号差，None表示不限制
+        :param metadata_workers: 批量整理时读取日期的线程数
+        :param copy_workers: 批量整理时复制文件的线程数
+        :param placement: 文件放置方式，见placement.PLACEMENT_MODES
+        :param verify: 复制时计算源数据的校验和并写入各目标目录的 .checksums.b2，之后可用 b2sum -c 检查；
+                       本身不读取目标文件，复制当时的目标文件由read_back检查
+        :param read_back: 写入后回读目标文件与校验和比较，需要额外的fsync和完整读取，速度明显变慢
+        """
         self.supported_formats = {
             'images': {'.jpg', '.jpeg', '.png', '.heic', '.heif'},
             'videos': {'.mp4', '.mov', '.MOV'}
         }
-        self.date_extractor = DateExtractor()
+        self.date_extractor = DateExtractor(max_sequence_gap)
+        # 目标目录中已有和已分配的文件名，批量整理时每次规划重建
+        self.destination_index = DestinationIndex()
+        # 已创建的目标目录和保持打开的目录描述符，只在execute_plan执行期间存在
+        self.directories: Optional[DirectoryRegistry] = None
+        self.metadata_workers = max(1, metadata_workers)
+        self.copy_workers = max(1, copy_workers)
+        # 机械硬盘同时只允许一个读写，其他设备由线程数限制
+        self.limiter = DeviceLimiter(max(self.metadata_workers, self.copy_workers))
+        self.placer = FilePlacer(placement, read_back)
+        self.checksums = ChecksumWriter() if verify else None
         
     def get_supported_files(self, directory: Path) -> List[Path]:
         """获取目录下所有支持的文件"""
-        supported_extensions = set().union(*self.supported_formats.values())
-        return [
-            f for f in directory.rglob('*')
-            if f.suffix.lower() in supported_extensions
-        ]
+        return [f.path for f in walk_media(directory, self.supported_formats)]
         
     def get_file_stats(self, files: List[Path]) -> Dict[str, Dict[str, int]]:
         """统计文件数量和大小"""
@@ -46,19 +85,102 @@ class FileProcessor:
                 
         return stats
         
+    @staticmethod
+    def target_directory(output_base: Path, creation_date: Optional[datetime]) -> Path:
+        """文件的目标目录：有日期时为 年/月，否则为未分类目录"""
+        if not creation_date:
+            return output_base / "Unsorted"
+        return output_base / str(creation_date.year) / f"{creation_date.month:02d}"
+        
+    def place_file(self, file_path: Path, new_path: Path, creation_date: Optional[datetime],
+                   link: Optional[Path] = None, overwrite: bool = False,
+                   next_name: Optional[Callable[[], Path]] = None) -> Tuple[Path, Optional[FileTimes]]:
+        """
+        创建目标目录并放置文件；先写入临时文件再改名，中断时不会留下不完整的目标文件
+        移动模式下同一设备上直接把源文件改名为目标路径，不经过临时文件
+        除移动模式外不修改源文件，目标文件的时间由调用方通过apply_times批量设置
+        :param link: 输出目录中内容相同的文件，给出时创建指向它的硬链接，无法链接时仍按放置方式处理源文件
+        :param overwrite: 允许覆盖已有的目标文件（之前中断的操作留下的文件）
+        :param next_name: 目标文件已存在时获取下一个文件名，None表示抛出FileExistsError
+        :return: (最终的目标路径, 目标文件应设置的时间)，目标与源文件或库中已有文件共用inode时时间为None（不修改时间）
+        """
+        if self.directories:
+            dir_fd = self.directories.dir_fd(new_path.parent)
+        else:
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            dir_fd = None
+        times = file_times(file_path, creation_date)
+        if not link:
+            renamed = self._rename(file_path, new_path, overwrite, next_name)
+            if renamed:
+                if self.checksums:
+                    self._add_checksum(renamed, file_digest(str(renamed)))
+                return renamed, times
+        temp_path = new_path.with_name(f".{new_path.name}.partial")
+        digest = None
+        try:
+            if not link:
+                raise FileNotFoundError
+            if os.path.lexists(str(temp_path)):
+                os.unlink(str(temp_path))
+            os.link(str(link), str(temp_path))
+            method = 'library_link'
+        except OSError:
+            if self.checksums:
+                method, digest = self.placer.place_verified(file_path, temp_path)
+            else:
+                method = self.placer.place(file_path, temp_path)
+        if self.checksums and digest is None:
+            digest = file_digest(str(temp_path))
+        while True:
+            try:
+                publish_file(temp_path, new_path, dir_fd, overwrite)
+                break
+            except FileExistsError:
+                if next_name is None:
+                    os.unlink(str(temp_path))
+                    raise
+                # 索引建立后目录中出现了同名文件，换用下一个文件名
+                new_path = next_name()
+        if self.checksums:
+            self._add_checksum(new_path, digest)
+        self.placer.finish(file_path)
+        if method == 'library_link' or self.placer.shares_source_inode(method):
+            return new_path, None
+        return new_path, times
+        
+    def _add_checksum(self, path: Path, digest: str) -> None:
+        """记录目标文件的校验和；批量执行时校验和文件保持打开到execute_plan结束，单个文件整理时立即关闭"""
+        self.checksums.add(path, digest)
+        if self.directories is None:
+            self.checksums.close()
+            
+    def _rename(self, file_path: Path, new_path: Path, overwrite: bool,
+                next_name: Optional[Callable[[], Path]]) -> Optional[Path]:
+        """
+        移动模式下把源文件直接改名为目标路径，见FilePlacer.rename
+        :return: 最终的目标路径，无法改名时返回None
+        """
+        while True:
+            try:
+                return new_path if self.placer.rename(file_path, new_path, overwrite) else None
+            except FileExistsError:
+                if next_name is None:
+                    raise
+                new_path = next_name()
+                
+    def allocate_path(self, directory: Path, file_path: Path) -> Path:
+        """为单个文件分配目标目录中未被占用的文件名"""
+        return self.destination_index.allocate(directory, file_path)[0]
+        
     def move_to_unsorted(self, file_path: Path, output_base: Path) -> None:
         """将文件移动到未分类目录"""
         try:
-            unsorted_dir = output_base / "Unsorted"
-            unsorted_dir.mkdir(parents=True, exist_ok=True)
-            
-            new_path = unsorted_dir / file_path.name
-            counter = 1
-            while new_path.exists():
-                new_path = unsorted_dir / f"{file_path.stem}_{counter}{file_path.suffix}"
-                counter += 1
-                
-            shutil.copy2(str(file_path), str(new_path))
+            new_path = self.allocate_path(self.target_directory(output_base, None), file_path)
+            new_path, times = self.place_file(file_path, new_path, None,
+                                              next_name=lambda: self.allocate_path(new_path.parent, file_path))
+            if times:
+                apply_times([(new_path, times)])
             logging.info(f"已将文件 {file_path.name} 复制到未分类目录")
         except Exception as e:
             logging.error(f"复制文件到未分类目录失败: {str(e)}")
@@ -73,23 +195,11 @@ class FileProcessor:
                 self.move_to_unsorted(file_path, output_base)
                 return False
                 
-            # 创建目标目录
-            year_dir = output_base / str(creation_date.year)
-            month_dir = year_dir / f"{creation_date.month:02d}"
-            month_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 设置文件时间
-            timestamp = creation_date.timestamp()
-            os.utime(str(file_path), (timestamp, timestamp))
-            
-            # 复制文件
-            new_path = month_dir / file_path.name
-            counter = 1
-            while new_path.exists():
-                new_path = month_dir / f"{file_path.stem}_{counter}{file_path.suffix}"
-                counter += 1
-                
-            shutil.copy2(str(file_path), str(new_path))
+            new_path = self.allocate_path(self.target_directory(output_base, creation_date), file_path)
+            new_path, times = self.place_file(file_path, new_path, creation_date,
+                                              next_name=lambda: self.allocate_path(new_path.parent, file_path))
+            if times:
+                apply_times([(new_path, times)])
             logging.info(f"已处理文件: {file_path.name}")
             return True
             
@@ -97,57 +207,413 @@ class FileProcessor:
             logging.error(f"处理文件 {file_path} 时出错: {str(e)}")
             return False
             
-    def process_directory(self, input_dir: Path, output_dir: Path, 
-                         progress_callback: Optional[callable] = None) -> Dict[str, Any]:
-        """处理整个目录"""
+    def _copy_job(self, op: Dict[str, Any], journal: Optional[Journal] = None) -> Tuple[bool, Optional[FileTimes]]:
+        """
+        在复制线程中放置一个文件，完成记录在设置时间后由_finish_operations写入
+        :return: (是否放置成功, 目标文件应设置的时间)
+        """
+        file_path, new_path = op['source'], op['destination']
+        try:
+            # 计划生成后目标目录中出现的同名文件由发布临时文件时的FileExistsError发现，不逐个检查
+            overwrite = bool(journal and journal.owns(new_path))
+            with self.limiter.hold(self.limiter.device_of(file_path), self.limiter.device_of(new_path)):
+                return True, self.place_file(file_path, new_path, op['date'], op.get('link'), overwrite)[1]
+        except Exception as e:
+            logging.error(f"处理文件 {file_path} 时出错: {str(e)}")
+            return False, None
+            
+    def _finish_operations(self, placed: List[Tuple[Dict[str, Any], Optional[FileTimes]]],
+                           journal: Optional[Journal], manifest: Optional[SourceManifest]) -> None:
+        """
+        元数据阶段：按目标目录批量设置一批已放置文件的时间，然后记录完成
+        时间设置之前中断的操作在日志中仍是未完成状态，重新运行时会再次放置
+        """
+        apply_times(((op['destination'], times) for op, times in placed if times), self.directories)
+        if self.checksums:
+            # 记录完成之前确保这批文件的校验和已写入
+            self.checksums.flush()
+        for op, _ in placed:
+            if journal:
+                journal.complete(op)
+            if manifest:
+                manifest.add(op)
+            if op['date']:
+                logging.info(f"已处理文件: {op['source'].name}")
+            else:
+                logging.info(f"已将文件 {op['source'].name} 复制到未分类目录")
+                
+    def _placed_record(self, op: Dict[str, Any]) -> MediaFile:
+        """已放置文件的记录，大小来自计划，旧版计划没有大小时stat目标文件"""
+        destination = op['destination']
+        size = op['size'] if op['size'] is not None else os.stat(destination).st_size
+        kind = media_kind(destination.name, self.supported_formats) or 'images'
+        return MediaFile(destination, size, 0, 0, kind)
+        
+    def _resolve_date(self, file_path: Path, inferred: Optional[datetime]) -> Tuple[Optional[datetime], Optional[str]]:
+        """确定文件的日期及其来源，EXIF日期已在本次运行的缓存中"""
+        exif_date = self.date_extractor.get_creation_date_from_exif(str(file_path))
+        if exif_date:
+            return exif_date, 'exif'
+        if inferred:
+            return inferred, 'related'
+        path_date = self.date_extractor.get_date_from_path(file_path)
+        if path_date:
+            return path_date, 'path'
+        return None, None
+        
+    def _read_header(self, file: MediaFile) -> Optional[datetime]:
+        """读取文件头部的EXIF日期，占用源设备的并发名额"""
+        with self.limiter.hold(file.device):
+            return self.date_extractor.get_creation_date_from_exif(str(file.path))
+            
+    @staticmethod
+    def _digest_or_none(file_path: Path) -> Optional[str]:
+        """计算文件内容摘要，读取失败时返回None"""
+        try:
+            return file_digest(str(file_path))
+        except OSError as e:
+            logging.error(f"读取文件 {file_path} 时出错: {str(e)}")
+            return None
+            
+    @staticmethod
+    def _still_skipped(record: Dict[str, Any], file: MediaFile, sources: Dict[str, MediaFile],
+                       skip_duplicates: bool, library: Optional[LibraryIndex], library_dedup: str) -> bool:
+        """
+        清单中作为重复文件跳过的源文件本次是否仍然跳过
+        需要相同的去重选项仍然启用，且当时保留的相同文件仍在（大小未变）
+        :param sources: 源文件绝对路径 -> 遍历记录
+        """
+        existing = record['existing']
+        if record['skipped'] == 'duplicate':
+            return skip_duplicates and existing in sources and sources[existing].size == file.size
+        if record['skipped'] == 'library':
+            return library is not None and library_dedup == 'skip' and library.contains(Path(existing), file.size)
+        return False
+        
+    def plan_directory(self, input_dir: Path, output_dir: Path,
+                       skip_duplicates: bool = False,
+                       journal: Optional[Journal] = None,
+                       library: Optional[LibraryIndex] = None,
+                       library_dedup: str = 'skip',
+                       manifest: Optional[SourceManifest] = None) -> Dict[str, Any]:
+        """
+        规划整个目录的整理操作，只读取源文件的元数据，不写入目标目录
+        :param skip_duplicates: 内容完全相同的文件只整理第一份
+        :param journal: 之前运行的日志，已完成的文件不再规划，未完成的沿用原目标路径
+        :param library: 输出目录的内容索引，库中已有相同内容的文件按library_dedup处理
+        :param library_dedup: 'skip' 跳过，'hardlink' 链接到库中已有的文件
+        :param manifest: 已整理源文件的清单，未变化的文件不再读取EXIF也不再规划
+        :return: {'operations': 操作列表, 'total': 待整理文件数, 'completed': 之前已完成的文件数,
+                  'duplicates': 跳过的重复文件数, 'library_duplicates': 库中已有的文件数,
+                  'input_stats': 输入统计, 'completed_stats': 之前已完成的文件的统计}
+        """
         if not input_dir.exists():
             raise ValueError(f"输入目录 {input_dir} 不存在")
             
-        output_dir.mkdir(parents=True, exist_ok=True)
+        self.date_extractor.clear_cache()
         
-        # 获取所有文件
-        all_files = self.get_supported_files(input_dir)
+        # 获取所有文件，遍历时每个文件只stat一次，之后使用记录中的大小
+        records = {f.path: f for f in walk_media(input_dir, self.supported_formats)}
+        all_files = list(records)
         if not all_files:
             logging.warning("未找到支持的文件")
-            return {'processed': 0, 'total': 0, 'success': 0}
+            return {'operations': [], 'total': 0, 'completed': 0, 'duplicates': 0, 'library_duplicates': 0,
+                    'input_stats': media_stats([]), 'completed_stats': media_stats([])}
             
         # 获取输入统计
-        input_stats = self.get_file_stats(all_files)
-        
+        input_stats = media_stats(records.values())
+        if journal:
+            journal.prime(records.values())
+            
+        # 清单中未变化的文件：记录的EXIF日期放入缓存，用于推断同目录新文件的日期
+        # 之前作为重复文件跳过的文件，相同的去重选项仍然启用且保留的文件还在时直接跳过，不再计算摘要
+        unchanged = set()
+        skipped_before = Counter()
+        if manifest:
+            manifest.retain(input_dir, records)
+            sources = {os.path.abspath(path): file for path, file in records.items()}
+            still_skipped = set()
+            for file in records.values():
+                record = manifest.lookup(file)
+                if not record:
+                    continue
+                if record.get('skipped'):
+                    if self._still_skipped(record, file, sources, skip_duplicates, library, library_dedup):
+                        skipped_before[record['skipped']] += 1
+                        still_skipped.add(file.path)
+                    continue
+                unchanged.add(file.path)
+                exif_date = manifest.record_date(record) if record['date_source'] == 'exif' else None
+                self.date_extractor.date_cache[str(file.path)] = exif_date
+            if unchanged:
+                logging.info(f"清单中有 {len(unchanged)} 个未变化的文件，不再处理")
+            if still_skipped:
+                all_files = [f for f in all_files if f not in still_skipped]
+                logging.info(f"清单中有 {len(still_skipped)} 个之前作为重复文件跳过的文件，不再比较内容")
+                
+        # 跳过内容完全相同的重复文件，只比较大小和内容摘要
+        duplicate_count = skipped_before['duplicate']
+        if skip_duplicates:
+            skipped = set()
+            sizes = {str(f): records[f].size for f in all_files if f not in unchanged}
+            for group in find_exact_duplicates(sizes, sizes).values():
+                skipped.update(group[1:])
+                logging.info(f"跳过与 {Path(group[0]).name} 内容相同的 {len(group) - 1} 个文件")
+                if manifest:
+                    for duplicate in group[1:]:
+                        manifest.skip(records[Path(duplicate)], 'duplicate', Path(group[0]))
+            duplicate_count += len(skipped)
+            all_files = [f for f in all_files if str(f) not in skipped]
+            
         # 按目录分组处理文件
         files_by_dir = {}
         for file in all_files:
             files_by_dir.setdefault(file.parent, []).append(file)
             
+        # 文件名在主线程中按固定顺序分配，冲突时的编号与执行顺序无关
+        # 每个目标目录只列出一次，之后的冲突检查都在内存索引中完成
+        operations = []
+        completed = []
+        library_count = skipped_before['library']
+        index = self.destination_index = DestinationIndex()
+        with ThreadPoolExecutor(max_workers=self.metadata_workers) as metadata_pool:
+            # 所有文件头部的读取集中在规划开始时完成，按(设备, inode)排序，机械硬盘上接近顺序读取
+            header_reads = sorted((records[f] for f in all_files if f not in unchanged),
+                                  key=lambda f: (f.device, f.inode))
+            list(metadata_pool.map(self._read_header, header_reads))
+            
+            for dir_path, dir_files in files_by_dir.items():
+                if unchanged.issuperset(dir_files):
+                    completed.extend(records[f] for f in dir_files)
+                    continue
+                logging.info(f"正在规划目录: {dir_path}")
+                
+                # 按文件名排序
+                sorted_files = sorted(dir_files, 
+                                    key=lambda x: get_number_from_filename(x.name) or float('inf'))
+                
+                # 没有EXIF日期的文件使用同目录中最近的有日期的文件推断，每个文件只读取一次EXIF
+                dates = self.date_extractor.infer_dates(sorted_files)
+                # 只有大小与库中文件或本目录其他文件相同的文件才计算摘要
+                sizes, digests = {}, {}
+                if library is not None:
+                    sizes = {f: records[f].size for f in sorted_files}
+                    size_counts = Counter(sizes.values())
+                    candidates = sorted((f for f in sorted_files if f not in unchanged
+                                         if library.has_size(sizes[f]) or size_counts[sizes[f]] > 1),
+                                        key=lambda f: records[f].inode)
+                    digests = dict(zip(candidates, metadata_pool.map(self._digest_or_none, candidates)))
+                    
+                dir_operations = []
+                for file in sorted_files:
+                    if file in unchanged:
+                        completed.append(records[file])
+                        continue
+                    creation_date, date_source = self._resolve_date(file, dates.get(file))
+                    started = None
+                    if journal:
+                        destination = journal.completed_destination(file)
+                        if destination:
+                            completed.append(records[file])
+                            if manifest:
+                                manifest.add(make_operation(file, Path(destination), creation_date, date_source, 0))
+                            continue
+                        started = journal.started_record(file)
+                    link = None
+                    if started:
+                        # 上次运行中断的操作，沿用已分配的目标路径
+                        new_path, suffix = Path(started['destination']), started['suffix']
+                        index.reserve(new_path)
+                    else:
+                        digest = digests.get(file)
+                        existing = library.find(sizes[file], digest) if digest else None
+                        if existing and library_dedup == 'skip':
+                            library_count += 1
+                            logging.info(f"跳过输出目录中已有的文件 {file.name}（与 {existing.name} 相同）")
+                            if manifest:
+                                manifest.skip(records[file], 'library', existing)
+                            continue
+                        link = existing
+                        new_path, suffix = index.allocate(self.target_directory(output_dir, creation_date), file)
+                        if library is not None:
+                            library.add(new_path, existing or file, sizes[file], digest)
+                    dir_operations.append(make_operation(file, new_path, creation_date, date_source, suffix,
+                                                         link, records[file].size))
+                # 文件名已按序号分配，复制时按inode顺序读取
+                dir_operations.sort(key=lambda op: records[op['source']].inode)
+                operations.extend(dir_operations)
+                
+        if completed:
+            logging.info(f"跳过 {len(completed)} 个之前已整理完成的文件")
+        if library_count:
+            logging.info(f"跳过 {library_count} 个输出目录中已有的文件")
+        return {
+            'operations': operations,
+            'total': len(operations) + len(completed),
+            'completed': len(completed),
+            'duplicates': duplicate_count,
+            'library_duplicates': library_count,
+            'input_stats': input_stats,
+            'completed_stats': media_stats(completed)
+        }
+        
+    def execute_plan(self, operations: List[Dict[str, Any]],
+                     progress_callback: Optional[callable] = None,
+                     journal: Optional[Journal] = None,
+                     manifest: Optional[SourceManifest] = None) -> Dict[str, int]:
+        """
+        批量执行整理计划，按目标设备、源设备和源目录排序后交给复制线程池
+        :param operations: plan_directory生成或read_plan读取的操作
+        :param journal: 记录操作进度的日志，每批操作执行前先写入日志
+        :param manifest: 源文件清单，记录放置成功的文件
+        :return: {'processed': 已处理数, 'success': 按日期归档成功数, 'placed_stats': 已放置文件的统计}
+        """
         processed_count = 0
         success_count = 0
-        total_files = len(all_files)
+        total_files = len(operations)
+        submitted: Dict[Future, Dict[str, Any]] = {}
+        placed: List[MediaFile] = []
+        unfinished: List[Tuple[Dict[str, Any], Optional[FileTimes]]] = []
+        finish_batch = journal.sync_interval if journal else METADATA_BATCH_SIZE
         
-        # 处理每个目录
-        for dir_path, dir_files in files_by_dir.items():
-            logging.info(f"正在处理目录: {dir_path}")
-            
-            # 按文件名排序
-            sorted_files = sorted(dir_files, 
-                                key=lambda x: get_number_from_filename(x.name) or float('inf'))
-            
-            for file in sorted_files:
-                if self.process_file(file, output_dir):
-                    success_count += 1
+        def collect(done: Set[Future]) -> None:
+            nonlocal processed_count, success_count
+            for future in done:
+                op = submitted.pop(future)
+                ok, times = future.result()
+                if ok:
+                    unfinished.append((op, times))
+                    placed.append(self._placed_record(op))
+                    if op['date']:
+                        success_count += 1
                 processed_count += 1
-                
                 if progress_callback:
                     progress_callback(processed_count / total_files, 
                                    f"已处理: {processed_count}/{total_files}")
-                    
-        # 获取输出统计
-        output_files = self.get_supported_files(output_dir)
-        output_stats = self.get_file_stats(output_files)
+            if len(unfinished) >= finish_batch:
+                self._finish_operations(unfinished, journal, manifest)
+                unfinished.clear()
+                
+        pending = set()
+        max_pending = self.copy_workers * PENDING_COPIES_PER_WORKER
+        ordered = schedule_copies(operations, self.limiter)
+        batch_size = journal.sync_interval if journal else len(ordered) or 1
+        self.directories = DirectoryRegistry()
+        try:
+            # 目标目录在复制前按计划一次性创建，复制线程不再逐个检查
+            self.directories.precreate(op['destination'].parent for op in operations)
+            with ThreadPoolExecutor(max_workers=self.copy_workers) as copy_pool:
+                for start in range(0, len(ordered), batch_size):
+                    batch = ordered[start:start + batch_size]
+                    if journal:
+                        # 预写日志：整批操作的begin记录落盘后才开始复制
+                        journal.begin(batch)
+                    for op in batch:
+                        # 复制队列已满时等待，避免一次提交过多任务
+                        if len(pending) >= max_pending:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            collect(done)
+                        future = copy_pool.submit(self._copy_job, op, journal)
+                        submitted[future] = op
+                        pending.add(future)
+                done, _ = wait(pending)
+                collect(done)
+            self._finish_operations(unfinished, journal, manifest)
+        finally:
+            self.directories.close()
+            self.directories = None
+            if self.checksums:
+                self.checksums.close()
+                
+        return {'processed': processed_count, 'success': success_count, 'placed_stats': media_stats(placed)}
         
-        return {
-            'processed': processed_count,
-            'success': success_count,
-            'total': total_files,
-            'input_stats': input_stats,
-            'output_stats': output_stats
-        } 
\ No newline at end of file
+    def process_directory(self, input_dir: Path, output_dir: Path, 
+                         progress_callback: Optional[callable] = None,
+                         skip_duplicates: bool = False,
+                         plan_path: Optional[Path] = None,
+                         dry_run: bool = False,
+                         resume: bool = True,
+                         library_dedup: Optional[str] = None,
+                         incremental: bool = True) -> Dict[str, Any]:
+        """
+        处理整个目录：先规划全部操作，再批量执行
+        规划完成前不开始复制，读取文件头部和复制不再重叠；换来的是全部文件头部按(设备, inode)顺序集中读取、
+        冲突编号与执行顺序无关、计划可以先写出或只预览，以及复制前一次性创建全部目标目录。
+        文件头部只有几KiB，规划时间通常远小于复制时间，文件很多而复制很快（如硬链接、同盘移动）时差别才明显
+        :param skip_duplicates: 内容完全相同的文件只整理第一份
+        :param plan_path: 将整理计划写入该JSON Lines文件
+        :param dry_run: 只生成计划，不复制文件
+        :param resume: 在输出目录中记录日志，再次运行时跳过已完成的文件
+        :param library_dedup: 输出目录中已有相同内容时的处理方式，见library_index.LIBRARY_DEDUP_MODES，None表示不检查
+        :param incremental: 在输出目录中保存源文件清单，再次运行时只处理新增或修改过的文件
+        """
+        if not input_dir.exists():
+            raise ValueError(f"输入目录 {input_dir} 不存在")
+            
+        if not dry_run:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            
+        journal = None
+        if resume and (not dry_run or (output_dir / JOURNAL_FILENAME).exists()):
+            journal = Journal(output_dir)
+        library = None
+        if library_dedup:
+            if library_dedup not in LIBRARY_DEDUP_MODES:
+                raise ValueError(f"不支持的去重方式: {library_dedup}")
+            library = LibraryIndex(output_dir, set().union(*self.supported_formats.values()))
+        manifest = None
+        if incremental and (not dry_run or (output_dir / MANIFEST_FILENAME).exists()):
+            manifest = SourceManifest(output_dir)
+        finished = False
+        try:
+            result = self._run_plan(input_dir, output_dir, progress_callback, skip_duplicates,
+                                    plan_path, dry_run, journal, library, library_dedup, manifest)
+            finished = True
+            return result
+        finally:
+            if manifest and not dry_run:
+                manifest.save()
+            if journal:
+                if finished and manifest and not dry_run:
+                    # 完成的操作都已记入清单，日志不再需要
+                    journal.clear()
+                else:
+                    journal.close()
+            if library and not dry_run:
+                library.save()
+                
+    def _run_plan(self, input_dir: Path, output_dir: Path, progress_callback: Optional[callable],
+                  skip_duplicates: bool, plan_path: Optional[Path], dry_run: bool,
+                  journal: Optional[Journal], library: Optional[LibraryIndex],
+                  library_dedup: Optional[str], manifest: Optional[SourceManifest]) -> Dict[str, Any]:
+        """规划并执行，结果格式见process_directory"""
+        plan = self.plan_directory(input_dir, output_dir, skip_duplicates, journal,
+                                   library, library_dedup or 'skip', manifest)
+        if not plan['total'] and not plan['library_duplicates']:
+            return {'processed': 0, 'total': 0, 'success': 0}
+            
+        operations = plan['operations']
+        if plan_path:
+            write_plan(operations, plan_path)
+            logging.info(f"已将 {len(operations)} 个整理操作写入 {plan_path}")
+            
+        result = {
+            'processed': 0,
+            'success': 0,
+            'total': plan['total'],
+            'duplicates': plan['duplicates'],
+            'library_duplicates': plan['library_duplicates'],
+            'planned': len(operations),
+            'completed': plan['completed'],
+            'input_stats': plan['input_stats']
+        }
+        if dry_run:
+            # 预览时输出统计为将要整理的文件
+            placed_stats = media_stats(self._placed_record(op) for op in operations)
+        else:
+            result.update(self.execute_plan(operations, progress_callback, journal, manifest))
+            placed_stats = result.pop('placed_stats')
+            
+        # 输出统计为本次放置的文件加上之前已完成的文件，不再重新遍历输出目录
+        result['output_stats'] = merge_stats(placed_stats, plan['completed_stats'])
+        return result
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+import logging
+
+def default_cache_path() -> Path:
+    """默认的哈希缓存位置"""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(cache_home) / 'MediaOrganizer' / 'hashes.sqlite3'
+
+def file_fingerprint(stat: os.stat_result) -> Tuple[int, int, int]:
+    """文件指纹：(大小, 修改时间纳秒, inode)"""
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+class HashCache:
+    """基于SQLite的持久化哈希缓存，按(路径, 大小, 修改时间, inode, 算法)判断是否需要重新计算"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path) if db_path else default_cache_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 相似照片搜索在工作线程中执行，连接需要跨线程使用
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.pending = 0
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS hashes ('
+                ' path TEXT NOT NULL,'
+                ' algorithm TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' mtime_ns INTEGER NOT NULL,'
+                ' inode INTEGER NOT NULL,'
+                ' hash TEXT NOT NULL,'
+                " source TEXT NOT NULL DEFAULT 'full',"
+                ' PRIMARY KEY (path, algorithm))'
+            )
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(hashes)')}
+            if 'source' not in columns:
+                # 旧版本缓存没有记录哈希来源
+                self.conn.execute("ALTER TABLE hashes ADD COLUMN source TEXT NOT NULL DEFAULT 'full'")
+            self.conn.commit()
+
+    def get_entry(self, path: str, algorithm: str, stat: os.stat_result) -> Optional[Tuple[str, str]]:
+        """获取缓存的(哈希, 来源)，文件指纹不匹配时返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT size, mtime_ns, inode, hash, source FROM hashes WHERE path = ? AND algorithm = ?',
+                (os.path.abspath(path), algorithm)
+            ).fetchone()
+        if row and tuple(row[:3]) == file_fingerprint(stat):
+            return row[3], row[4]
+        return None
+
+    def get(self, path: str, algorithm: str, stat: os.stat_result) -> Optional[str]:
+        """获取缓存的哈希，文件指纹不匹配时返回None"""
+        entry = self.get_entry(path, algorithm, stat)
+        return entry[0] if entry else None
+
+    def put(self, path: str, algorithm: str, stat: os.stat_result, value: str,
+            source: str = 'full') -> None:
+        """写入哈希及其来源，累计一定数量后批量提交"""
+        size, mtime_ns, inode = file_fingerprint(stat)
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO hashes (path, algorithm, size, mtime_ns, inode, hash, source) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (os.path.abspath(path), algorithm, size, mtime_ns, inode, value, source)
+            )
+            self.pending += 1
+            if self.pending >= 1000:
+                self.conn.commit()
+                self.pending = 0
+
+    def flush(self) -> None:
+        """提交尚未写入的缓存项"""
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def prune(self, directory: str, existing_paths: Iterable[str]) -> int:
+        """
+        删除目录下已不存在的文件的缓存项
+        :param directory: 本次扫描的根目录
+        :param existing_paths: 本次扫描到的文件
+        :return: 删除的条目数
+        """
+        prefix = os.path.join(os.path.abspath(directory), '')
+        existing = {os.path.abspath(p) for p in existing_paths}
+        with self.lock:
+            cached = self.conn.execute(
+                'SELECT DISTINCT path FROM hashes WHERE substr(path, 1, ?) = ?',
+                (len(prefix), prefix)
+            ).fetchall()
+            stale = [(path,) for (path,) in cached if path not in existing]
+            if stale:
+                self.conn.executemany('DELETE FROM hashes WHERE path = ?', stale)
+            self.conn.commit()
+            self.pending = 0
+        if stale:
+            logging.info(f"已清理 {len(stale)} 个失效的哈希缓存")
+        return len(stale)
+
+    def close(self) -> None:
+        """提交并关闭数据库"""
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+import logging
+
+# 日志文件名，位于输出目录中
+JOURNAL_FILENAME = '.organize_journal.jsonl'
+# 每完成多少个操作执行一次fsync
+JOURNAL_SYNC_INTERVAL = 64
+
+SourceKey = Tuple[str, int, int]
+
+class Journal:
+    """
+    批量整理的预写日志，记录在输出目录中，用于中断后继续
+    执行一批操作前先写入并fsync 'begin' 记录，复制完成后追加 'done' 记录并批量fsync
+    再次运行时已完成的源文件直接跳过；已开始但未完成的操作沿用原来的目标路径，不会产生 _1 副本
+    源文件以(绝对路径, 大小, inode)标识，文件被替换或大小变化后视为新文件
+    """
+    
+    def __init__(self, output_dir: Path, sync_interval: int = JOURNAL_SYNC_INTERVAL):
+        self.path = Path(output_dir) / JOURNAL_FILENAME
+        self.sync_interval = sync_interval
+        self.completed: Dict[SourceKey, str] = {}  # 源文件 -> 目标路径
+        self.started: Dict[SourceKey, Dict[str, Any]] = {}  # 源文件 -> 未完成的begin记录
+        self.interrupted = set()  # 之前的运行中未完成的操作占用的目标路径，只在读取日志时确定
+        self.keys: Dict[str, SourceKey] = {}
+        self.lock = threading.Lock()
+        self.file = None
+        self.pending = 0
+        self._load()
+        
+    def _load(self) -> None:
+        """读取已有日志，崩溃时最后一行可能不完整，直接忽略"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                key = (record['source'], record['size'], record['inode'])
+                if record['state'] == 'done':
+                    self.completed[key] = record['destination']
+                    self.started.pop(key, None)
+                else:
+                    self.started[key] = record
+        self.interrupted = {record['destination'] for record in self.started.values()}
+        if self.completed or self.started:
+            logging.info(f"从日志中读取到 {len(self.completed)} 个已完成的操作，"
+                         f"{len(self.started)} 个未完成的操作")
+            
+    def source_key(self, source: Path) -> SourceKey:
+        """源文件的标识，每个文件只stat一次"""
+        path = os.path.abspath(source)
+        key = self.keys.get(path)
+        if key is None:
+            stat = os.stat(path)
+            key = self.keys[path] = (path, stat.st_size, stat.st_ino)
+        return key
+        
+    def prime(self, files: Iterable[Any]) -> None:
+        """使用遍历目录时已获取的大小和inode，避免再次stat"""
+        for file in files:
+            path = os.path.abspath(file.path)
+            self.keys[path] = (path, file.size, file.inode)
+            
+    def is_completed(self, source: Path) -> bool:
+        """源文件是否已在之前的运行中整理完成"""
+        return self.source_key(source) in self.completed
+        
+    def completed_destination(self, source: Path) -> Optional[str]:
+        """之前的运行中已完成的操作的目标路径"""
+        return self.completed.get(self.source_key(source))
+        
+    def started_record(self, source: Path) -> Optional[Dict[str, Any]]:
+        """之前的运行中已开始但未完成的操作"""
+        return self.started.get(self.source_key(source))
+        
+    def owns(self, destination: Path) -> bool:
+        """
+        目标路径是否属于之前的运行中未完成的操作，可以被覆盖
+        本次运行的操作不在其中，规划后才出现的同名文件不会被覆盖
+        """
+        return str(destination) in self.interrupted
+        
+    def _write(self, state: str, op: Dict[str, Any]) -> None:
+        path, size, inode = self.source_key(op['source'])
+        record = {
+            'state': state,
+            'source': path,
+            'size': size,
+            'inode': inode,
+            'destination': str(op['destination']),
+            'suffix': op['suffix']
+        }
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        
+    def _sync(self) -> None:
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.pending = 0
+        
+    def begin(self, operations: Iterable[Dict[str, Any]]) -> None:
+        """在执行一批操作前写入begin记录并fsync"""
+        with self.lock:
+            for op in operations:
+                self._write('begin', op)
+            self._sync()
+            
+    def complete(self, op: Dict[str, Any]) -> None:
+        """记录一个已完成的操作，累计sync_interval个后fsync"""
+        with self.lock:
+            self._write('done', op)
+            self.pending += 1
+            if self.pending >= self.sync_interval:
+                self._sync()
+                
+    def close(self) -> None:
+        """fsync并关闭日志"""
+        with self.lock:
+            self._sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                
+    def clear(self) -> None:
+        """整理全部完成、结果已记入源文件清单后删除日志"""
+        self.close()
+        with self.lock:
+            if self.path.exists():
+                self.path.unlink()
+            self.completed.clear()
+            self.started.clear()
+            self.interrupted.clear()
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
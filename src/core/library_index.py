@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from .duplicates import file_digest
+
+# 输出目录中保存内容索引的文件名
+LIBRARY_INDEX_FILENAME = '.library_index.jsonl'
+# 发现输出目录中已有相同内容时的处理方式
+# skip: 不再整理该文件；hardlink: 在目标位置创建指向已有文件的硬链接，不占用额外空间
+LIBRARY_DEDUP_MODES = ('skip', 'hardlink')
+
+class LibraryIndex:
+    """
+    输出目录（照片库）的内容索引，用于跳过库中已有的文件
+    索引同时保存各目录的修改时间和子目录，再次运行时只stat目录：修改时间未变的目录直接沿用保存的文件记录，
+    只有变化过的目录（增删或改名了文件）才重新列出并stat其中的文件
+    只有大小与新文件相同的库文件才会计算摘要；原地修改文件不会改变目录的修改时间，
+    因此找到相同内容时再确认该文件的(大小, 修改时间, inode)未变
+    """
+    
+    def __init__(self, output_dir: Path, extensions: Iterable[str]):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / LIBRARY_INDEX_FILENAME
+        self.entries: Dict[str, Dict[str, Any]] = {}  # 绝对路径 -> {'size', 'mtime_ns', 'inode', 'digest'}
+        self.directories: Dict[str, Dict[str, Any]] = {}  # 目录绝对路径 -> {'mtime_ns', 'subdirs'}
+        self.by_size: Dict[int, List[str]] = defaultdict(list)
+        self.planned: Dict[str, str] = {}  # 本次计划的目标路径 -> 计算摘要时读取的源文件
+        self.lock = threading.Lock()
+        self.refresh(*self._load(), {ext.lower() for ext in extensions})
+        
+    def _load(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        读取上次保存的索引，损坏的行直接忽略
+        :return: (文件绝对路径 -> 记录, 目录绝对路径 -> 记录)
+        """
+        files, directories = {}, {}
+        if not self.path.exists():
+            return files, directories
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if 'dir' in record:
+                        directories[os.path.normpath(self.output_dir / record['dir'])] = record
+                    else:
+                        files[str(self.output_dir / record['path'])] = record
+                except (ValueError, KeyError):
+                    continue
+        return files, directories
+        
+    def refresh(self, saved: Dict[str, Dict[str, Any]], saved_dirs: Dict[str, Dict[str, Any]],
+                extensions: set) -> None:
+        """从输出目录开始逐级检查目录，修改时间未变的目录沿用保存的记录，其余目录重新列出"""
+        saved_by_dir = defaultdict(list)
+        for path, record in saved.items():
+            saved_by_dir[os.path.dirname(path)].append((path, record))
+        reused = scanned = 0
+        stack = [os.path.normpath(self.output_dir)]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            record = saved_dirs.get(directory)
+            if record and record['mtime_ns'] == mtime_ns:
+                for path, entry in saved_by_dir.get(directory, ()):
+                    self._add(path, {key: entry[key] for key in ('size', 'mtime_ns', 'inode', 'digest')})
+                    reused += 1
+                subdirs = record['subdirs']
+            else:
+                subdirs = self._scan(directory, saved, extensions)
+                scanned += 1
+            self.directories[directory] = {'mtime_ns': mtime_ns, 'subdirs': subdirs}
+            stack.extend(os.path.join(directory, name) for name in subdirs)
+        logging.info(f"输出目录中有 {len(self.entries)} 个文件，{reused} 个沿用已保存的记录，"
+                     f"重新列出了 {scanned}/{len(self.directories)} 个目录")
+        
+    def _scan(self, directory: str, saved: Dict[str, Dict[str, Any]], extensions: set) -> List[str]:
+        """列出一个目录并stat其中的文件，文件未变化时沿用保存的摘要，返回子目录名"""
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for item in entries:
+                    if item.name.startswith('.'):
+                        continue
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                            continue
+                        if os.path.splitext(item.name)[1].lower() not in extensions:
+                            continue
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino, 'digest': None}
+                    record = saved.get(item.path)
+                    if record and (record['size'], record['mtime_ns'], record['inode']) == \
+                            (entry['size'], entry['mtime_ns'], entry['inode']):
+                        entry['digest'] = record['digest']
+                    self._add(item.path, entry)
+        except OSError as e:
+            logging.error(f"读取目录 {directory} 时出错: {str(e)}")
+        return subdirs
+        
+    def _add(self, path: str, entry: Dict[str, Any]) -> None:
+        self.entries[path] = entry
+        self.by_size[entry['size']].append(path)
+            
+    def _digest(self, path: str) -> Optional[str]:
+        entry = self.entries[path]
+        if entry['digest'] is None:
+            try:
+                entry['digest'] = file_digest(self.planned.get(path, path))
+            except OSError as e:
+                logging.error(f"读取文件 {path} 时出错: {str(e)}")
+                return None
+        return entry['digest']
+        
+    def _remove(self, path: str) -> Dict[str, Any]:
+        entry = self.entries.pop(path)
+        self.by_size[entry['size']].remove(path)
+        return entry
+        
+    def _unchanged(self, path: str) -> bool:
+        """确认库文件与记录一致；已删除的文件移出索引，原地修改过的文件更新记录并清除摘要"""
+        if path in self.planned:
+            return True
+        entry = self.entries[path]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._remove(path)
+            return False
+        current = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+        if all(entry[key] == value for key, value in current.items()):
+            return True
+        self._remove(path)
+        self._add(path, dict(current, digest=None))
+        return False
+        
+    def has_size(self, size: int) -> bool:
+        """库中是否有相同大小的文件，没有时无需计算新文件的摘要"""
+        return size in self.by_size
+        
+    def contains(self, path: Path, size: int) -> bool:
+        """库中是否仍有该文件且大小和修改时间未变，用于沿用之前按内容相同跳过的结果"""
+        path = os.path.abspath(path)
+        with self.lock:
+            return self.entries.get(path, {}).get('size') == size and self._unchanged(path)
+            
+    def find(self, size: int, digest: str) -> Optional[Path]:
+        """查找库中内容相同的文件，只计算相同大小的库文件的摘要"""
+        with self.lock:
+            for path in list(self.by_size.get(size, ())):
+                if self._digest(path) != digest:
+                    continue
+                if self._unchanged(path):
+                    return Path(path)
+                # 文件在保存索引后被修改，按当前内容重新比较
+                if self.entries.get(path, {}).get('size') == size and self._digest(path) == digest:
+                    return Path(path)
+        return None
+        
+    def add(self, destination: Path, source: Path, size: int, digest: Optional[str] = None) -> None:
+        """登记本次计划放入库中的文件，之后的文件可以与它比较"""
+        path = str(destination)
+        with self.lock:
+            self.planned[path] = str(source)
+            self._add(path, {'size': size, 'mtime_ns': None, 'inode': None, 'digest': digest})
+            
+    def _register_directory(self, directory: str) -> None:
+        """登记本次运行新建的目录，逐级加入上级目录的子目录列表"""
+        while directory not in self.directories:
+            self.directories[directory] = {'mtime_ns': None, 'subdirs': []}
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return
+            self._register_directory(parent)
+            self.directories[parent]['subdirs'].append(os.path.basename(directory))
+            
+    def save(self) -> None:
+        """
+        写入索引，本次新放入的文件重新获取修改时间和inode，未成功放置的文件不写入
+        放入了文件的目录重新获取修改时间，下次运行时不必因为本次的写入重新列出
+        """
+        temp_path = self.path.with_name(f"{self.path.name}.partial")
+        count = 0
+        with self.lock, open(temp_path, 'w', encoding='utf-8') as f:
+            touched = set()
+            for path, entry in self.entries.items():
+                if path in self.planned:
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino)
+                    touched.add(os.path.dirname(path))
+                record = dict(entry, path=os.path.relpath(path, self.output_dir))
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+            for directory in touched:
+                self._register_directory(directory)
+                # 新建的目录及其上级目录的修改时间都因本次运行而改变
+                while directory in self.directories:
+                    try:
+                        self.directories[directory]['mtime_ns'] = os.stat(directory).st_mtime_ns
+                    except OSError:
+                        pass
+                    if directory == os.path.normpath(self.output_dir):
+                        break
+                    directory = os.path.dirname(directory)
+            for directory, entry in self.directories.items():
+                if entry['mtime_ns'] is None:
+                    continue
+                record = dict(entry, dir=os.path.relpath(directory, self.output_dir))
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.path)
+        logging.info(f"已保存 {count} 个文件的内容索引")
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+import logging
+
+# 源文件清单的文件名，位于输出目录中
+MANIFEST_FILENAME = '.source_manifest.jsonl'
+
+class SourceManifest:
+    """
+    已整理源文件的清单，保存在输出目录中，用于增量整理
+    记录每个源文件的(路径, 大小, 修改时间, inode)以及确定的日期和目标路径
+    再次运行时未变化的源文件直接跳过，不读取EXIF也不复制；它们的日期仍用于推断同目录新文件的日期
+    作为重复文件跳过的源文件也记录在清单中（skipped为跳过原因，existing为保留的相同文件），
+    再次运行时不再计算内容摘要
+    """
+    
+    def __init__(self, output_dir: Path):
+        self.path = Path(output_dir) / MANIFEST_FILENAME
+        self.entries: Dict[str, Dict[str, Any]] = {}  # 源文件绝对路径 -> 记录
+        self.lock = threading.Lock()
+        self._load()
+        
+    def _load(self) -> None:
+        """读取清单，损坏的行直接忽略"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self.entries[record['source']] = record
+                except (ValueError, KeyError):
+                    continue
+        logging.info(f"从清单中读取到 {len(self.entries)} 个已整理的源文件")
+        
+    def lookup(self, file: Any) -> Optional[Dict[str, Any]]:
+        """
+        查找未变化的源文件
+        :param file: walker.MediaFile记录
+        :return: 清单中的记录，文件不在清单中或已变化时返回None
+        """
+        record = self.entries.get(os.path.abspath(file.path))
+        if record and (record['size'], record['mtime_ns'], record['inode']) == (file.size, file.mtime_ns, file.inode):
+            return record
+        return None
+        
+    @staticmethod
+    def record_date(record: Dict[str, Any]) -> Optional[datetime]:
+        return datetime.fromisoformat(record['date']) if record['date'] else None
+        
+    def add(self, op: Dict[str, Any]) -> None:
+        """记录一个已整理完成的操作，源文件在放置后重新stat（复制期间源文件可能被修改）"""
+        try:
+            stat = os.stat(op['source'])
+        except OSError:
+            # 移动模式下源文件已不存在
+            return
+        path = os.path.abspath(op['source'])
+        record = {
+            'source': path,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inode': stat.st_ino,
+            'date': op['date'].isoformat() if op['date'] else None,
+            'date_source': op['date_source'],
+            'destination': str(op['destination'])
+        }
+        with self.lock:
+            self.entries[path] = record
+            
+    def skip(self, file: Any, reason: str, existing: Path) -> None:
+        """
+        记录一个因内容重复而跳过的源文件，使用遍历时的stat结果，不再重新stat
+        :param file: walker.MediaFile记录
+        :param reason: 'duplicate' 与本次输入中的其他文件相同，'library' 输出目录中已有相同的文件
+        :param existing: 保留的相同文件
+        """
+        path = os.path.abspath(file.path)
+        record = {
+            'source': path,
+            'size': file.size,
+            'mtime_ns': file.mtime_ns,
+            'inode': file.inode,
+            'date': None,
+            'date_source': None,
+            'destination': None,
+            'skipped': reason,
+            'existing': os.path.abspath(existing)
+        }
+        with self.lock:
+            self.entries[path] = record
+            
+    def retain(self, directory: Path, existing: Iterable[Path]) -> int:
+        """
+        删除目录下已不存在的源文件的记录
+        :return: 删除的记录数
+        """
+        prefix = os.path.join(os.path.abspath(directory), '')
+        existing = {os.path.abspath(p) for p in existing}
+        with self.lock:
+            stale = [path for path in self.entries if path.startswith(prefix) and path not in existing]
+            for path in stale:
+                del self.entries[path]
+        return len(stale)
+        
+    def save(self) -> None:
+        """写入清单，先写临时文件再重命名"""
+        temp_path = self.path.with_name(f"{self.path.name}.partial")
+        with self.lock, open(temp_path, 'w', encoding='utf-8') as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        logging.info(f"已保存 {len(self.entries)} 个源文件的清单")
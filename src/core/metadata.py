@@ -0,0 +1,62 @@
+import os
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+import logging
+
+from .directories import DirectoryRegistry
+
+# (访问时间, 修改时间)，单位纳秒
+FileTimes = Tuple[int, int]
+
+def timestamp_ns(date: datetime) -> int:
+    """日期对应的纳秒时间戳，避免浮点秒数的舍入误差"""
+    return int(date.replace(microsecond=0).timestamp()) * 10**9 + date.microsecond * 1000
+
+def file_times(source: Path, creation_date: Optional[datetime]) -> FileTimes:
+    """目标文件应有的时间：有日期时为拍摄日期，否则沿用源文件的时间（只读取，不修改源文件）"""
+    if creation_date:
+        ns = timestamp_ns(creation_date)
+        return ns, ns
+    stat = os.stat(source)
+    return stat.st_atime_ns, stat.st_mtime_ns
+
+def apply_times(entries: Iterable[Tuple[Path, FileTimes]],
+                directories: Optional[DirectoryRegistry] = None) -> int:
+    """
+    批量设置目标文件的时间，按目录分组，每个目录只打开一次，通过dir_fd使用相对路径
+    单个文件设置失败只记录错误，文件本身已放置完成
+    :param directories: 本次整理的目录登记表，给出时使用其中保持打开的目录描述符
+    :return: 成功设置的文件数
+    """
+    by_directory = defaultdict(list)
+    for path, times in entries:
+        by_directory[str(path.parent)].append((path.name, times))
+
+    use_dir_fd = os.utime in os.supports_dir_fd
+    count = 0
+    for directory, items in by_directory.items():
+        dir_fd = None
+        owned = False
+        try:
+            if directories:
+                dir_fd = directories.dir_fd(Path(directory))
+            elif use_dir_fd:
+                dir_fd = os.open(directory, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+                owned = True
+            for name, times in items:
+                try:
+                    if dir_fd is not None:
+                        os.utime(name, ns=times, dir_fd=dir_fd)
+                    else:
+                        os.utime(os.path.join(directory, name), ns=times)
+                    count += 1
+                except OSError as e:
+                    logging.error(f"设置文件 {name} 的时间失败: {str(e)}")
+        except OSError as e:
+            logging.error(f"打开目录 {directory} 失败: {str(e)}")
+        finally:
+            if owned:
+                os.close(dir_fd)
+    return count
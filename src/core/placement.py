@@ -0,0 +1,237 @@
+import errno
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import logging
+
+from .checksums import copy_and_read_back, copy_with_digest
+from .duplicates import file_digest
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux的FICLONE ioctl，在btrfs、XFS等文件系统上让目标文件共享源文件的数据块
+FICLONE = 0x40049409
+
+# 可选的放置方式
+# auto: 同一设备上依次尝试reflink、copy_file_range，最后回退到普通复制
+# copy: shutil.copyfile
+# 各方式只复制内容和权限，文件时间由整理后的元数据阶段统一设置
+# reflink: 写时复制克隆，不支持时回退到复制
+# hardlink: 硬链接，目标与源文件共享同一个inode，不支持时回退到复制
+# move: 同一设备上直接把源文件改名为最终路径，不支持时依次尝试硬链接、复制后删除源文件；跨设备时复制后删除源文件
+# copy_file_range: 由内核（或NFS/SMB服务器端）复制数据，不经过用户空间
+PLACEMENT_MODES = ('auto', 'copy', 'reflink', 'hardlink', 'move', 'copy_file_range')
+
+# 各放置方式依次尝试的底层方法，(同一设备, 跨设备)
+PLACEMENT_CHAINS = {
+    'auto': (('reflink', 'copy_file_range', 'copy'), ('copy_file_range', 'copy')),
+    'copy': (('copy',), ('copy',)),
+    'reflink': (('reflink', 'copy'), ('copy',)),
+    'hardlink': (('hardlink', 'copy'), ('copy',)),
+    'move': (('hardlink', 'copy'), ('copy',)),
+    'copy_file_range': (('copy_file_range', 'copy'), ('copy_file_range', 'copy')),
+}
+
+# 需要校验时使用的方法：硬链接不复制数据，直接计算摘要；其余方式都改为边复制边计算摘要
+VERIFIED_CHAINS = {
+    'hardlink': (('hardlink', 'verified_copy'), ('verified_copy',)),
+    'move': (('hardlink', 'verified_copy'), ('verified_copy',)),
+}
+DEFAULT_VERIFIED_CHAIN = (('verified_copy',), ('verified_copy',))
+
+# 表示文件系统或平台不支持某种方法的错误码，遇到后对该设备组合改用下一种方法
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS, errno.ENOTTY,
+    errno.EINVAL, errno.EPERM, errno.EMLINK, errno.EBADF, errno.ENOTSOCK
+}
+
+def reflink_file(source: str, target: str) -> None:
+    """通过FICLONE克隆文件，不支持时抛出OSError"""
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "当前平台不支持reflink")
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copymode(source, target)
+
+def copy_range_file(source: str, target: str) -> None:
+    """通过copy_file_range复制文件，旧内核或没有该系统调用时使用sendfile"""
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        offset = 0
+        while remaining > 0:
+            if copy_file_range:
+                sent = copy_file_range(src.fileno(), dst.fileno(), remaining)
+            else:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, remaining)
+            if sent == 0:
+                break
+            offset += sent
+            remaining -= sent
+    shutil.copymode(source, target)
+
+def hardlink_file(source: str, target: str) -> None:
+    os.link(source, target)
+
+def copy_file(source: str, target: str) -> None:
+    shutil.copyfile(source, target)
+    shutil.copymode(source, target)
+
+def publish_file(temp_path: Path, target: Path, dir_fd: Optional[int] = None, overwrite: bool = False) -> None:
+    """
+    将放置好的临时文件改名为最终路径
+    不允许覆盖时用硬链接原子地创建目标再删除临时文件，目标已存在时抛出FileExistsError，临时文件保留
+    文件系统不支持硬链接（exFAT、部分SMB共享）时退回到检查后重命名
+    :param dir_fd: 临时文件和目标所在目录的描述符，给出时使用相对路径
+    """
+    if dir_fd is not None:
+        src, dst, at = temp_path.name, target.name, {'src_dir_fd': dir_fd, 'dst_dir_fd': dir_fd}
+    else:
+        src, dst, at = str(temp_path), str(target), {}
+    if not overwrite:
+        try:
+            os.link(src, dst, **at)
+        except FileExistsError:
+            raise
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            if os.path.lexists(str(target)):
+                raise FileExistsError(errno.EEXIST, "目标文件已存在", str(target))
+        else:
+            os.unlink(src, dir_fd=dir_fd)
+            return
+    os.replace(src, dst, **at)
+
+PLACEMENT_METHODS = {
+    'reflink': reflink_file,
+    'copy_file_range': copy_range_file,
+    'hardlink': hardlink_file,
+    'copy': copy_file,
+    'verified_copy': copy_with_digest,
+    'read_back_copy': copy_and_read_back,
+}
+
+class FilePlacer:
+    """
+    按指定方式把源文件放置到目标路径
+    每种(源设备, 目标设备)组合第一次遇到不支持的方法后记住结果，之后直接使用可用的方法
+    """
+    
+    def __init__(self, mode: str = 'auto', read_back: bool = False):
+        """
+        :param read_back: 校验时回读目标文件，见checksums.copy_with_digest
+        """
+        if mode not in PLACEMENT_MODES:
+            raise ValueError(f"不支持的放置方式: {mode}")
+        self.mode = mode
+        self.read_back = read_back
+        self.unsupported: Dict[Tuple[int, int], set] = {}  # 设备组合 -> 不可用的方法
+        self.devices: Dict[str, int] = {}  # 目录 -> 设备号
+        self.stats: Dict[str, int] = {}  # 方法 -> 使用次数
+        self.lock = threading.Lock()
+        
+    def _device(self, directory: str) -> int:
+        device = self.devices.get(directory)
+        if device is None:
+            device = self.devices[directory] = os.stat(directory).st_dev
+        return device
+        
+    def place(self, source: Path, temp_path: Path) -> str:
+        """
+        将源文件的内容放到临时路径，由调用方重命名为最终路径
+        :return: 实际使用的方法
+        """
+        return self._place(source, temp_path, PLACEMENT_CHAINS[self.mode])[0]
+        
+    def place_verified(self, source: Path, temp_path: Path) -> Tuple[str, str]:
+        """
+        放置文件并计算摘要，复制数据时源文件只读取一次
+        :return: (实际使用的方法, 文件内容的BLAKE2摘要)
+        """
+        chains = VERIFIED_CHAINS.get(self.mode, DEFAULT_VERIFIED_CHAIN)
+        if self.read_back:
+            chains = tuple(tuple('read_back_copy' if m == 'verified_copy' else m for m in chain) for chain in chains)
+        method, digest = self._place(source, temp_path, chains)
+        return method, digest if digest else file_digest(str(temp_path))
+        
+    def shares_source_inode(self, method: str) -> bool:
+        """目标文件是否与仍然保留的源文件共用inode，此时修改目标文件的时间会改动源文件"""
+        return method == 'hardlink' and self.mode != 'move'
+        
+    def _place(self, source: Path, temp_path: Path,
+               chains: Tuple[Tuple[str, ...], Tuple[str, ...]]) -> Tuple[str, Optional[str]]:
+        """依次尝试可用的方法，返回(方法, 方法的返回值)"""
+        source, temp_path = str(source), str(temp_path)
+        devices = (self._device(os.path.dirname(source)), self._device(os.path.dirname(temp_path)))
+        same_device, cross_device = chains
+        chain = same_device if devices[0] == devices[1] else cross_device
+        unsupported = self.unsupported.setdefault(devices, set())
+        if os.path.lexists(temp_path):
+            # 上次中断留下的临时文件
+            os.unlink(temp_path)
+        for method in chain:
+            if method in unsupported and method != chain[-1]:
+                continue
+            try:
+                result = PLACEMENT_METHODS[method](source, temp_path)
+            except OSError as e:
+                if method == chain[-1] or e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                # 清理失败方法可能留下的空文件后尝试下一种方法
+                if os.path.lexists(temp_path):
+                    os.unlink(temp_path)
+                with self.lock:
+                    if method not in unsupported:
+                        unsupported.add(method)
+                        logging.info(f"设备 {devices[0]} -> {devices[1]} 不支持 {method}，改用其他方式: {str(e)}")
+                continue
+            with self.lock:
+                self.stats[method] = self.stats.get(method, 0) + 1
+            return method, result
+        raise OSError(errno.ENOTSUP, "没有可用的放置方式")
+        
+    def rename(self, source: Path, target: Path, overwrite: bool = False) -> bool:
+        """
+        移动模式下同一设备上把源文件直接改名为最终路径，不经过临时文件
+        与发布临时文件相同，不允许覆盖时先链接再删除源文件，目标已存在时抛出FileExistsError
+        任何时刻文件都以源路径或目标路径之一存在，中断后不会只剩下隐藏的临时文件
+        :return: 是否已改名；不是移动模式、跨设备或文件系统不支持时返回False，由调用方按放置链处理
+        """
+        if self.mode != 'move':
+            return False
+        source, target = str(source), str(target)
+        devices = (self._device(os.path.dirname(source)), self._device(os.path.dirname(target)))
+        if devices[0] != devices[1]:
+            return False
+        unsupported = self.unsupported.setdefault(devices, set())
+        if 'rename' in unsupported:
+            return False
+        try:
+            publish_file(Path(source), Path(target), overwrite=overwrite)
+        except FileExistsError:
+            raise
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            with self.lock:
+                if 'rename' not in unsupported:
+                    unsupported.add('rename')
+                    logging.info(f"设备 {devices[0]} -> {devices[1]} 不支持 rename，改用其他方式: {str(e)}")
+            return False
+        if overwrite and os.path.lexists(source) and os.path.samefile(source, target):
+            # 上次运行在链接之后、删除源文件之前中断，目标与源文件是同一个inode，rename不做任何事
+            os.unlink(source)
+        with self.lock:
+            self.stats['rename'] = self.stats.get('rename', 0) + 1
+        return True
+        
+    def finish(self, source: Path) -> None:
+        """目标文件就位后的收尾工作：移动模式下删除源文件"""
+        if self.mode == 'move':
+            os.unlink(str(source))
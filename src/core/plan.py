@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# 预览时写入输出目录的整理计划文件名
+PLAN_FILENAME = 'organize_plan.jsonl'
+# 整理计划中每个操作的字段
+PLAN_FIELDS = ('source', 'destination', 'date', 'date_source', 'suffix', 'link', 'size')
+
+def make_operation(source: Path, destination: Path, date: Optional[datetime],
+                   date_source: Optional[str], suffix: int, link: Optional[Path] = None,
+                   size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    构造一个整理操作
+    :param date_source: 日期来源，'exif'、'related'、'path'，没有日期时为None
+    :param suffix: 文件名冲突时追加的编号，0表示使用原文件名
+    :param link: 输出目录中内容相同的文件，不为None时创建指向它的硬链接而不复制源文件
+    :param size: 源文件大小，用于统计整理结果，未知时为None
+    """
+    return {
+        'source': source,
+        'destination': destination,
+        'date': date,
+        'date_source': date_source,
+        'suffix': suffix,
+        'link': link,
+        'size': size
+    }
+
+def write_plan(operations: Iterable[Dict[str, Any]], plan_path: Path) -> int:
+    """
+    以JSON Lines格式写入整理计划，每行一个操作
+    :return: 写入的操作数
+    """
+    count = 0
+    with open(plan_path, 'w', encoding='utf-8') as f:
+        for op in operations:
+            record = {
+                'source': str(op['source']),
+                'destination': str(op['destination']),
+                'date': op['date'].isoformat() if op['date'] else None,
+                'date_source': op['date_source'],
+                'suffix': op['suffix'],
+                'link': str(op['link']) if op['link'] else None,
+                'size': op['size']
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+def read_plan(plan_path: Path) -> List[Dict[str, Any]]:
+    """读取write_plan写入的整理计划"""
+    operations = []
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            operations.append(make_operation(
+                Path(record['source']),
+                Path(record['destination']),
+                datetime.fromisoformat(record['date']) if record['date'] else None,
+                record['date_source'],
+                record['suffix'],
+                Path(record['link']) if record.get('link') else None,
+                record.get('size')
+            ))
+    return operations
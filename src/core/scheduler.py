@@ -0,0 +1,85 @@
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+@lru_cache(maxsize=None)
+def is_rotational(device: int) -> Optional[bool]:
+    """
+    设备是否为机械硬盘，通过Linux的 /sys/dev/block/主:次/queue/rotational 判断
+    分区的queue目录在所属磁盘下；无法判断时（其他平台、网络文件系统）返回None
+    """
+    base = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    for candidate in (os.path.join(base, 'queue', 'rotational'), os.path.join(base, '..', 'queue', 'rotational')):
+        try:
+            with open(candidate, 'r') as f:
+                return f.read().strip() == '1'
+        except OSError:
+            continue
+    return None
+
+class DeviceLimiter:
+    """
+    按设备限制并发I/O：机械硬盘同时只有一个读写，避免多个线程交替访问造成磁头来回寻道
+    其他设备使用默认并发数
+    """
+    
+    def __init__(self, default_limit: int):
+        self.default_limit = max(1, default_limit)
+        self.semaphores: Dict[int, threading.Semaphore] = {}
+        self.devices: Dict[str, int] = {}  # 目录 -> 设备号
+        self.lock = threading.Lock()
+        
+    def limit_for(self, device: int) -> int:
+        return 1 if is_rotational(device) else self.default_limit
+        
+    def _semaphore(self, device: int) -> threading.Semaphore:
+        with self.lock:
+            semaphore = self.semaphores.get(device)
+            if semaphore is None:
+                limit = self.limit_for(device)
+                semaphore = self.semaphores[device] = threading.Semaphore(limit)
+                if limit == 1:
+                    logging.info(f"设备 {device} 为机械硬盘，按顺序读写")
+            return semaphore
+            
+    def device_of(self, path: Path) -> int:
+        """文件所在的设备号，目录尚未创建时使用最近的已存在的上级目录"""
+        directory = os.path.dirname(os.path.abspath(path))
+        device = self.devices.get(directory)
+        if device is None:
+            current = directory
+            while True:
+                try:
+                    device = os.stat(current).st_dev
+                    break
+                except FileNotFoundError:
+                    parent = os.path.dirname(current)
+                    if parent == current:
+                        raise
+                    current = parent
+            self.devices[directory] = device
+        return device
+        
+    @contextmanager
+    def hold(self, *devices: int) -> Iterator[None]:
+        """占用各设备的一个并发名额，按设备号顺序获取，避免死锁"""
+        with ExitStack() as stack:
+            for device in sorted(set(devices)):
+                semaphore = self._semaphore(device)
+                semaphore.acquire()
+                stack.callback(semaphore.release)
+            yield
+
+def schedule_copies(operations: List[Dict[str, Any]], limiter: DeviceLimiter) -> List[Dict[str, Any]]:
+    """
+    复制顺序：按目标设备、源设备、源目录分组，组内保持规划顺序（已按inode排序）
+    同一目录的文件连续读取，大文件复制接近顺序读写
+    """
+    def key(op):
+        source = op['source']
+        return (limiter.device_of(op['destination']), limiter.device_of(source), str(source.parent))
+    return sorted(operations, key=key)
@@ -1,48 +1,848 @@
+import io
+import math
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache, partial
+from itertools import combinations
 from PIL import Image
 import imagehash
+import numpy as np
+import piexif
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 import logging
 
+from .duplicates import find_exact_duplicates
+from .hash_cache import HashCache
+from .video_hash import (VIDEO_FORMATS, VIDEO_SAMPLE_COUNT, ffmpeg_available, hash_video_file,
+                         load_video_preview, parse_signature, sequence_distance)
+
+# 聚类后端：哈希数量不超过该值时自动使用NumPy分块矩阵，否则使用多索引哈希
+# 实测4000个哈希时两者都在0.2秒内；16000个时多索引哈希在半径5、8下快2~20倍，
+# 半径10且比特分布偏斜时两者相当，之后NumPy按n²增长，多索引哈希增长慢得多
+NUMPY_BACKEND_MAX_HASHES = 4000
+# NumPy后端每个分块的边长，分块矩阵约占 block_size² × 8 字节内存
+NUMPY_BLOCK_SIZE = 2048
+# 多索引哈希查找一个段值相对于核对一个候选哈希的开销，用于选择分段数（按NumPy批量实现实测）
+MIH_PROBE_COST = 8
+# 批量多索引哈希每批核对的候选对数量上限，约占 chunk_size × 40 字节内存
+MIH_CHUNK_SIZE = 1 << 20
+# 并行哈希时每个任务包含的文件数
+HASH_CHUNK_SIZE = 32
+# 计算哈希时的最小解码边长，哈希只需要8x8像素，无需全分辨率解码
+HASH_DECODE_SIZE = 256
+# Image.reduce()支持的图片模式
+REDUCE_MODES = {'L', 'LA', 'La', 'RGB', 'RGBA', 'RGBa', 'RGBX', 'CMYK', 'YCbCr', 'F'}
+
+# 哈希进程池的启动方式：GUI在后台线程中运行哈希，fork多线程的Qt进程可能使子进程死锁
+HASH_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# 支持的哈希算法，按计算开销从低到高排列
+HASH_FUNCTIONS = {
+    'average': imagehash.average_hash,
+    'difference': imagehash.dhash,
+    'perceptual': imagehash.phash,
+    'wavelet': imagehash.whash,
+}
+
+def load_reduced(img: Image.Image, size: int = HASH_DECODE_SIZE) -> Image.Image:
+    """
+    以降低的分辨率解码图片，短边不小于size
+    JPEG通过draft()在DCT阶段直接按1/2~1/8缩放解码，其他格式解码后用reduce()快速缩小
+    reduce()不支持调色板、1位和16位整数等模式，这些图片先转为灰度（哈希本身也在灰度图上计算）
+    """
+    img.draft('L', (size, size))
+    img.load()
+    factor = min(img.width, img.height) // size
+    if factor >= 2:
+        if img.mode not in REDUCE_MODES:
+            img = img.convert('L')
+        img = img.reduce(factor)
+    return img
+
+def open_exif_thumbnail(img: Image.Image) -> Optional[Image.Image]:
+    """读取EXIF IFD1中内嵌的缩略图，不解码主图像"""
+    exif_bytes = img.info.get('exif')
+    if not exif_bytes:
+        return None
+    try:
+        thumbnail = piexif.load(exif_bytes).get('thumbnail')
+        if not thumbnail:
+            return None
+        thumb = Image.open(io.BytesIO(thumbnail))
+        thumb.load()
+        return thumb
+    except Exception:
+        return None
+
+def hash_image_file(image_path: str, use_exif_thumbnail: bool = False,
+                    algorithms: Sequence[str] = ('average',)) -> Tuple[Optional[Dict[str, str]], str]:
+    """
+    解码一次图片并计算多种感知哈希，供主进程和子进程共用
+    :param use_exif_thumbnail: 优先使用EXIF内嵌缩略图，没有时再解码主图像
+    :param algorithms: 要计算的哈希算法，见HASH_FUNCTIONS
+    :return: ({算法: 哈希值}, 来源)，来源为'thumbnail'或'full'
+    """
+    try:
+        with Image.open(image_path) as img:
+            source = 'full'
+            thumb = open_exif_thumbnail(img) if use_exif_thumbnail else None
+            if thumb is not None:
+                source = 'thumbnail'
+                img = thumb
+            else:
+                img = load_reduced(img)
+            # 感知哈希对图片大小和小的修改不敏感
+            return {name: str(HASH_FUNCTIONS[name](img)) for name in algorithms}, source
+    except Exception as e:
+        logging.error(f"处理文件 {image_path} 时出错: {str(e)}")
+        return None, 'full'
+
+def compute_image_hash(image_path: str) -> Optional[str]:
+    """计算单张图片的平均哈希"""
+    hashes, _ = hash_image_file(image_path)
+    return hashes['average'] if hashes else None
+
+def is_video(path: str) -> bool:
+    """按扩展名判断是否为视频文件"""
+    return Path(path).suffix.lower() in VIDEO_FORMATS
+
+def is_video_signature(file_hash: str) -> bool:
+    """视频指纹是逗号分隔的帧哈希序列，图片哈希是单个十六进制数"""
+    return ',' in file_hash
+
+def hash_media_file(path: str, use_exif_thumbnail: bool = False,
+                    algorithms: Sequence[str] = ('average',)) -> Tuple[Optional[Dict[str, str]], str]:
+    """按文件类型计算图片哈希或视频指纹"""
+    if is_video(path):
+        return hash_video_file(path)
+    return hash_image_file(path, use_exif_thumbnail, algorithms)
+
+def _hash_chunk(paths: List[str], use_exif_thumbnail: bool = False,
+                algorithms: Sequence[str] = ('average',)) -> List[Tuple[str, Optional[Dict[str, str]], str]]:
+    """在子进程中计算一批文件的哈希"""
+    return [(path, *hash_media_file(path, use_exif_thumbnail, algorithms)) for path in paths]
+
+def load_preview_image(image_path: str, size: int, use_exif_thumbnail: bool = False) -> Tuple[Image.Image, str]:
+    """
+    加载用于预览的RGB图片，长边不超过size；视频取中间的一帧
+    :return: (图片, 来源)，来源为'thumbnail'、'full'或'video'
+    """
+    if is_video(image_path):
+        return load_video_preview(image_path, size), 'video'
+    with Image.open(image_path) as img:
+        source = 'full'
+        preview = open_exif_thumbnail(img) if use_exif_thumbnail else None
+        if preview is None:
+            img.draft('RGB', (size, size))
+            preview = img.convert('RGB') if img.mode != 'RGB' else img.copy()
+        else:
+            source = 'thumbnail'
+            if preview.mode != 'RGB':
+                preview = preview.convert('RGB')
+    # 保持宽高比缩放
+    ratio = min(size / preview.width, size / preview.height)
+    new_size = (max(1, int(preview.width * ratio)), max(1, int(preview.height * ratio)))
+    return preview.resize(new_size, Image.Resampling.LANCZOS), source
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """解析并行进程数：None或1为串行，0表示使用全部CPU核心"""
+    if workers is None:
+        return 1
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+def hamming_distance(a: int, b: int) -> int:
+    """计算两个整数哈希之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """
+    基于度量距离的BK树，用于按半径查询相近的值，现在只用于视频指纹（逐帧汉明距离之和）
+    实测均匀分布的64位哈希在半径5时每次查询要访问约14%的节点，32000个哈希逐个查询需要约3分钟，
+    图片哈希改用MultiIndexHash或mih_pairs
+    """
+    
+    def __init__(self, distance: Callable[[int, int], int] = hamming_distance):
+        self.distance = distance
+        self.root = None  # 节点结构: (值, {距离: 子节点})
+        self.size = 0
+        
+    def __len__(self) -> int:
+        return self.size
+        
+    def add(self, value: int) -> bool:
+        """插入一个值，已存在时返回False"""
+        if self.root is None:
+            self.root = (value, {})
+            self.size = 1
+            return True
+            
+        node = self.root
+        while True:
+            node_value, children = node
+            d = self.distance(value, node_value)
+            if d == 0:
+                return False
+            child = children.get(d)
+            if child is None:
+                children[d] = (value, {})
+                self.size += 1
+                return True
+            node = child
+            
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """返回距离不超过radius的所有(距离, 值)"""
+        if self.root is None:
+            return []
+            
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            d = self.distance(value, node_value)
+            if d <= radius:
+                results.append((d, node_value))
+            # 三角不等式：只有边距离在[d - radius, d + radius]内的子树可能命中
+            low, high = d - radius, d + radius
+            for child_d, child in children.items():
+                if low <= child_d <= high:
+                    stack.append(child)
+        return results
+
+@lru_cache(maxsize=None)
+def flip_masks(width: int, radius: int) -> Tuple[int, ...]:
+    """width位整数中置位数不超过radius的全部掩码，用于枚举某一段的近邻"""
+    return tuple(sum(1 << bit for bit in bits)
+                 for k in range(min(radius, width) + 1) for bits in combinations(range(width), k))
+
+def segment_widths(bits: int, segments: int) -> List[int]:
+    """把bits位尽量平均地分成segments段"""
+    return [bits // segments + (1 if i < bits % segments else 0) for i in range(segments)]
+
+def choose_segments(expected_size: int, radius: int, bits: int = 64) -> int:
+    """
+    选择多索引哈希的分段数，使查找段值和核对候选的总开销最小
+    段越短，需要枚举的段值越少，但每个段值命中的哈希越多
+    """
+    def cost(segments: int) -> float:
+        total = 0.0
+        for width in segment_widths(bits, segments):
+            probes = sum(math.comb(width, k) for k in range(radius // segments + 1))
+            total += probes * (MIH_PROBE_COST + expected_size / 2 ** width)
+        return total
+    return min(range(1, min(bits, radius + 1) + 1), key=cost)
+
+class MultiIndexHash:
+    """
+    多索引哈希，按汉明半径查询相近的整数哈希
+    把哈希分成m段，距离不超过r的两个哈希至少有一段的距离不超过 r // m（鸽巢原理）
+    每段建立 段值 -> 哈希 的表，查询时只枚举各段距离不超过 r // m 的段值再核对完整距离，
+    候选数由段长和索引大小决定，不会像BK树那样在均匀分布的哈希上访问大部分节点
+    """
+    
+    def __init__(self, expected_size: int, radius: int, bits: int = 64):
+        """
+        :param expected_size: 预计插入的哈希数量，用于选择分段数
+        :param radius: 预计的查询半径，用于选择分段数；查询时可以使用其他半径
+        :param bits: 哈希的比特数
+        """
+        self.segments = []  # (右移位数, 段掩码, 段长)
+        shift = 0
+        for width in segment_widths(bits, choose_segments(expected_size, radius, bits)):
+            self.segments.append((shift, (1 << width) - 1, width))
+            shift += width
+        self.tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in self.segments]
+        self.values = set()
+        
+    def __len__(self) -> int:
+        return len(self.values)
+        
+    def add(self, value: int) -> bool:
+        """插入一个值，已存在时返回False"""
+        if value in self.values:
+            return False
+        self.values.add(value)
+        for (shift, mask, _), table in zip(self.segments, self.tables):
+            table[(value >> shift) & mask].append(value)
+        return True
+        
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """返回距离不超过radius的所有(距离, 值)"""
+        sub_radius = radius // len(self.segments)
+        # 同一个哈希可能在多段中命中，按值去重
+        results = {}
+        for (shift, mask, width), table in zip(self.segments, self.tables):
+            key = (value >> shift) & mask
+            for flip in flip_masks(width, sub_radius):
+                for candidate in table.get(key ^ flip, ()):
+                    d = hamming_distance(value, candidate)
+                    if d <= radius:
+                        results[candidate] = d
+        return [(d, candidate) for candidate, d in results.items()]
+
+class NumpyIndex:
+    """按汉明半径查询相近整数哈希的线性索引，每次查询对全部哈希做一次向量化异或"""
+    
+    def __init__(self, capacity: int = 1024):
+        self.array = np.empty(max(capacity, 1), dtype=np.uint64)
+        self.size = 0
+        self.values = set()
+        
+    def __len__(self) -> int:
+        return self.size
+        
+    def add(self, value: int) -> bool:
+        """插入一个值，已存在时返回False"""
+        if value in self.values:
+            return False
+        if self.size == len(self.array):
+            self.array = np.concatenate([self.array, np.empty(len(self.array), dtype=np.uint64)])
+        self.array[self.size] = value
+        self.size += 1
+        self.values.add(value)
+        return True
+        
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """返回距离不超过radius的所有(距离, 值)"""
+        stored = self.array[:self.size]
+        distances = popcount64(stored ^ np.uint64(value))
+        hits = np.nonzero(distances <= radius)[0]
+        return [(int(distances[i]), int(stored[i])) for i in hits]
+
+def make_index(expected_size: int, radius: int, backend: str = 'auto'):
+    """
+    创建增量查询用的图片哈希索引，后端选择规则与candidate_pairs相同
+    :param expected_size: 预计插入的哈希数量
+    :param radius: 查询半径
+    :return: 支持add和search的NumpyIndex、MultiIndexHash或BKTree
+    """
+    backend = select_backend(expected_size, backend)
+    if backend == 'numpy':
+        return NumpyIndex(expected_size)
+    if backend == 'mih':
+        return MultiIndexHash(expected_size, radius)
+    return BKTree()
+
+class UnionFind:
+    """并查集，用于把相似对合并为连通的相似组"""
+    
+    def __init__(self):
+        self.parent = {}
+        
+    def find(self, x):
+        """查找根节点（带路径压缩）"""
+        root = self.parent.setdefault(x, x)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+        
+    def union(self, a, b) -> None:
+        """合并两个元素所在的组"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+            
+    def groups(self) -> List[list]:
+        """返回包含两个及以上元素的组"""
+        groups = defaultdict(list)
+        for x in self.parent:
+            groups[self.find(x)].append(x)
+        return [members for members in groups.values() if len(members) > 1]
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """逐元素统计uint64数组中置位的比特数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    # 旧版NumPy没有bitwise_count，使用SWAR算法
+    x = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+def bktree_pairs(hashes: Sequence[Any], threshold: int,
+                 distance: Callable[[Any, Any], int] = hamming_distance) -> Iterator[Tuple[Any, Any]]:
+    """通过BK树逐个查询，生成距离不超过阈值的哈希对"""
+    tree = BKTree(distance)
+    for value in hashes:
+        for _, neighbor in tree.search(value, threshold):
+            yield neighbor, value
+        tree.add(value)
+
+def _expand_matches(starts: np.ndarray, counts: np.ndarray, order: np.ndarray,
+                    limit: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    把每个查询命中的排序区间 [starts, starts + counts) 展开为(查询下标, 命中下标)数组
+    按累计命中数分批产出，每批最多约limit对，内存占用受限
+    """
+    queries = np.nonzero(counts)[0]
+    ends = np.cumsum(counts[queries])
+    begin = 0
+    while begin < len(queries):
+        base = ends[begin - 1] if begin else 0
+        stop = max(begin + 1, int(np.searchsorted(ends, base + limit, side='right')))
+        batch = queries[begin:stop]
+        batch_counts = counts[batch]
+        rows = np.repeat(batch, batch_counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+        yield rows, order[np.repeat(starts[batch], batch_counts) + offsets]
+        begin = stop
+
+def mih_pairs(hashes: Sequence[int], threshold: int,
+              chunk_size: int = MIH_CHUNK_SIZE) -> Iterator[Tuple[int, int]]:
+    """
+    批量多索引哈希，生成距离不超过阈值的哈希对，原理见MultiIndexHash
+    每一段按段值排序一次，对每个翻转掩码用searchsorted找出段值相等的全部哈希，候选对在NumPy中核对完整距离
+    :param chunk_size: 每批核对的候选对数量上限
+    """
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    n = len(values)
+    segments = choose_segments(n, threshold)
+    found = []
+    shift = 0
+    for width in segment_widths(64, segments):
+        keys = (values >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+        shift += width
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for flip in flip_masks(width, threshold // segments):
+            probes = keys ^ np.uint64(flip)
+            starts = np.searchsorted(sorted_keys, probes, side='left')
+            counts = np.searchsorted(sorted_keys, probes, side='right') - starts
+            for rows, cols in _expand_matches(starts, counts, order, chunk_size):
+                # 同一对从两端各命中一次，只保留 rows < cols
+                keep = rows < cols
+                rows, cols = rows[keep], cols[keep]
+                close = popcount64(values[rows] ^ values[cols]) <= threshold
+                found.append(rows[close] * n + cols[close])
+    if not found:
+        return
+    # 同一对可能在多段中命中
+    for code in np.unique(np.concatenate(found)):
+        yield int(values[code // n]), int(values[code % n])
+
+def numpy_pairs(hashes: Sequence[int], threshold: int,
+                block_size: int = NUMPY_BLOCK_SIZE) -> Iterator[Tuple[int, int]]:
+    """
+    将哈希打包为uint64数组，分块计算异或后的汉明距离矩阵，生成距离不超过阈值的哈希对
+    只计算上三角分块，内存占用受block_size限制
+    """
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    n = len(values)
+    for i in range(0, n, block_size):
+        rows = values[i:i + block_size]
+        for j in range(i, n, block_size):
+            cols = values[j:j + block_size]
+            distances = popcount64(rows[:, None] ^ cols[None, :])
+            if i == j:
+                # 对角分块只保留 a < b 的一半
+                distances = np.where(np.triu(np.ones(distances.shape, dtype=bool), k=1),
+                                     distances, threshold + 1)
+            for a, b in zip(*np.nonzero(distances <= threshold)):
+                yield int(rows[a]), int(cols[b])
+
+def select_backend(hash_count: int, backend: str = 'auto') -> str:
+    """根据哈希数量选择聚类后端，BK树只在明确指定时使用"""
+    if backend == 'auto':
+        return 'numpy' if hash_count <= NUMPY_BACKEND_MAX_HASHES else 'mih'
+    if backend not in ('numpy', 'mih', 'bktree'):
+        raise ValueError(f"不支持的聚类后端: {backend}")
+    return backend
+
+def candidate_pairs(hashes: Sequence[int], threshold: int, backend: str = 'auto') -> Iterator[Tuple[int, int]]:
+    """使用选定的后端生成汉明距离不超过阈值的哈希对"""
+    backend = select_backend(len(hashes), backend)
+    if backend == 'numpy':
+        return numpy_pairs(hashes, threshold)
+    if backend == 'mih':
+        return mih_pairs(hashes, threshold)
+    return bktree_pairs(hashes, threshold)
+
+def cluster_hashes(hashes: Iterable[int], threshold: int, backend: str = 'auto') -> List[List[int]]:
+    """
+    将去重后的整数哈希按汉明半径聚类为连通组
+    :param hashes: 整数哈希
+    :param threshold: 汉明距离阈值（包含）
+    :param backend: 'numpy'、'mih'、'bktree' 或 'auto'（按数量自动选择）
+    :return: 只包含两个及以上哈希的组
+    """
+    hashes = list(hashes)
+    uf = UnionFind()
+    for value in hashes:
+        uf.find(value)
+    for a, b in candidate_pairs(hashes, threshold, backend):
+        uf.union(a, b)
+    return uf.groups()
+
 class PhotoSimilarityFinder:
     """相似图片查找类"""
     
-    def __init__(self):
+    def __init__(self, cache_path: Optional[str] = None, use_cache: bool = False,
+                 use_exif_thumbnail: bool = False, cascade: Sequence[str] = ('average',),
+                 include_videos: bool = False):
+        """
+        :param cache_path: 哈希缓存数据库路径，指定后自动启用缓存
+        :param use_cache: 是否使用默认位置的哈希缓存
+        :param use_exif_thumbnail: 优先用EXIF内嵌缩略图计算哈希，避免解码主图像
+        :param cascade: 哈希算法级联，第一个算法用于生成候选对，其余算法依次确认候选对
+        :param include_videos: 同时搜索相似视频，需要本地安装ffmpeg
+        """
         self.hash_dict = defaultdict(list)
+        self.hash_records: Dict[str, Dict[str, str]] = {}  # 路径 -> {算法: 哈希值}
+        self.hash_sources: Dict[str, str] = {}  # 路径 -> 哈希来源('thumbnail'或'full')
         self.supported_formats = {'.jpg', '.jpeg', '.png'}
+        self.video_formats = set(VIDEO_FORMATS)
+        self.include_videos = include_videos
+        self.use_exif_thumbnail = use_exif_thumbnail
+        self.cascade = tuple(cascade)
+        self.cache = HashCache(cache_path) if (cache_path or use_cache) else None
+        self.last_stats: Dict[str, int] = {}
+        
+    @property
+    def cascade(self) -> Tuple[str, ...]:
+        return self._cascade
+        
+    @cascade.setter
+    def cascade(self, value: Sequence[str]) -> None:
+        unknown = [name for name in value if name not in HASH_FUNCTIONS]
+        if not value or unknown:
+            raise ValueError(f"不支持的哈希算法: {unknown or value}")
+        self._cascade = tuple(value)
+        
+    def cache_key(self, algorithm: str) -> str:
+        """缓存键中的算法名，包含解码方式，解码方式变化时不会误用旧的哈希"""
+        if algorithm == 'video':
+            return f'video@{VIDEO_SAMPLE_COUNT}'
+        decode = 'thumb' if self.use_exif_thumbnail else HASH_DECODE_SIZE
+        return f'{algorithm}@{decode}'
+        
+    def algorithms_for(self, path: str) -> Tuple[str, ...]:
+        """文件需要计算的哈希算法：视频只有一个指纹，图片使用级联"""
+        return ('video',) if is_video(path) else self.cascade
         
     def compute_hash(self, image_path: str) -> Optional[str]:
-        """计算图片的感知哈希值"""
-        try:
-            with Image.open(image_path) as img:
-                # 使用感知哈希，对图片大小和小的修改不敏感
-                return str(imagehash.average_hash(img))
-        except Exception as e:
-            logging.error(f"处理文件 {image_path} 时出错: {str(e)}")
-            return None
+        """计算图片的感知哈希值（级联中的第一个算法），文件未变化时直接使用缓存"""
+        stat = None
+        if self.cache is not None:
+            try:
+                stat = os.stat(image_path)
+            except OSError as e:
+                logging.error(f"处理文件 {image_path} 时出错: {str(e)}")
+                return None
+            record = self._get_cached_record(image_path, stat)
+            if record:
+                return record
+                
+        hashes, source = hash_media_file(image_path, self.use_exif_thumbnail, self.cascade)
+        return self._store_hash(image_path, hashes, source, {image_path: stat} if stat else {})[1]
+        
+    def collect_image_files(self, directory: str) -> List[str]:
+        """递归收集目录中支持的图片文件，启用视频搜索时也收集视频"""
+        formats = set(self.supported_formats)
+        if self.include_videos:
+            if ffmpeg_available():
+                formats |= self.video_formats
+            else:
+                logging.warning("未找到ffmpeg/ffprobe，跳过视频文件")
+        image_files = []
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if Path(filename).suffix.lower() in formats:
+                    image_files.append(os.path.join(root, filename))
+        return image_files
+        
+    def hash_files(self, paths: List[str], workers: Optional[int] = None,
+                   ordered: bool = True) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        计算一批文件的哈希，逐个产出(路径, 哈希)；全部算法的结果记录在hash_records中
+        :param paths: 文件路径列表
+        :param workers: 并行进程数，None或1为串行，0表示使用全部CPU核心
+        :param ordered: 是否按输入顺序产出；为False时按完成顺序产出，首个结果更快
+        """
+        workers = resolve_workers(workers)
+        if workers <= 1 or len(paths) <= 1:
+            for path in paths:
+                yield path, self.compute_hash(path)
+            if self.cache:
+                self.cache.flush()
+            return
+            
+        # 缓存命中的文件不提交给进程池
+        cached, stats, pending = self.lookup_cached(paths)
+        if not ordered:
+            yield from cached.items()
+            
+        chunks = [pending[i:i + HASH_CHUNK_SIZE] for i in range(0, len(pending), HASH_CHUNK_SIZE)]
+        hash_chunk = partial(_hash_chunk, use_exif_thumbnail=self.use_exif_thumbnail,
+                             algorithms=self.cascade)
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context(HASH_START_METHOD)) as executor:
+            if ordered:
+                computed = (r for chunk in executor.map(hash_chunk, chunks) for r in chunk)
+                # 缓存结果与计算结果按输入顺序合并
+                for path in paths:
+                    if path in cached:
+                        yield path, cached[path]
+                    else:
+                        yield self._store_hash(*next(computed), stats)
+            else:
+                futures = [executor.submit(hash_chunk, chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    for result in future.result():
+                        yield self._store_hash(*result, stats)
+                    
+        if self.cache:
+            self.cache.flush()
+            
+    def lookup_cached(self, paths: List[str]) -> Tuple[Dict[str, str], Dict[str, os.stat_result], List[str]]:
+        """
+        在缓存中查找一批文件
+        :return: (命中的哈希, 文件状态, 需要重新计算的文件)
+        """
+        cached, stats, pending = {}, {}, []
+        for path in paths:
+            if self.cache is None:
+                pending.append(path)
+                continue
+            try:
+                stats[path] = os.stat(path)
+            except OSError:
+                # 交给计算过程记录错误
+                pending.append(path)
+                continue
+            file_hash = self._get_cached_record(path, stats[path])
+            if file_hash:
+                cached[path] = file_hash
+            else:
+                pending.append(path)
+        return cached, stats, pending
+        
+    def _get_cached_record(self, path: str, stat: os.stat_result) -> Optional[str]:
+        """从缓存读取级联中所有算法的哈希，任一缺失时视为未命中"""
+        record = {}
+        source = 'full'
+        algorithms = self.algorithms_for(path)
+        for algorithm in algorithms:
+            entry = self.cache.get_entry(path, self.cache_key(algorithm), stat)
+            if entry is None:
+                return None
+            record[algorithm], source = entry
+        self.hash_records[path] = record
+        self.hash_sources[path] = source
+        return record[algorithms[0]]
+        
+    def _store_hash(self, path: str, hashes: Optional[Dict[str, str]], source: str,
+                    stats: Dict[str, os.stat_result]) -> Tuple[str, Optional[str]]:
+        """记录计算出的哈希及来源并写入缓存，返回(路径, 第一个算法的哈希)"""
+        self.hash_sources[path] = source
+        if not hashes:
+            return path, None
+        self.hash_records[path] = hashes
+        if self.cache and path in stats:
+            for algorithm, value in hashes.items():
+                self.cache.put(path, self.cache_key(algorithm), stats[path], value, source)
+        return path, hashes[self.algorithms_for(path)[0]]
+        
+    def confirm_pair(self, a: str, b: str, threshold: int) -> bool:
+        """用级联中的后续算法确认一对候选照片"""
+        record_a, record_b = self.hash_records[a], self.hash_records[b]
+        return all(
+            hamming_distance(int(record_a[name], 16), int(record_b[name], 16)) <= threshold
+            for name in self.cascade[1:]
+        )
+        
+    def _link_files(self, uf: UnionFind, files_a: List[str], files_b: List[str],
+                    threshold: int) -> None:
+        """合并两组候选照片中通过确认的照片对"""
+        if len(self.cascade) == 1 or is_video(files_a[0]):
+            # 没有确认阶段时（视频只有一个指纹），候选对全部成立
+            for path in files_a + files_b:
+                uf.union(files_a[0], path)
+            return
             
-    def find_similar_photos(self, directory: str, hash_threshold: int = 5) -> Dict[str, List[str]]:
+        same_bucket = files_a is files_b
+        for i, a in enumerate(files_a):
+            for b in (files_b[i + 1:] if same_bucket else files_b):
+                self.last_stats['candidate_pairs'] += 1
+                if self.confirm_pair(a, b, threshold):
+                    self.last_stats['confirmed_pairs'] += 1
+                    uf.union(a, b)
+                    
+    def find_exact_duplicates(self, directory: str) -> Dict[str, List[str]]:
+        """
+        查找内容完全相同的照片，只比较文件大小和内容摘要，不解码像素
+        :return: 字典，键为内容摘要，值为相同照片的路径列表
+        """
+        return find_exact_duplicates(self.collect_image_files(directory))
+        
+    def _start_scan(self, directory: str,
+                    exact_prepass: bool) -> Tuple[List[str], List[str], Dict[str, List[str]]]:
+        """
+        重置上一次搜索的状态并收集文件
+        :return: (全部图片, 需要计算哈希的图片, 代表文件 -> 内容完全相同的其他文件)
+        """
+        self.hash_dict.clear()
+        self.hash_records.clear()
+        self.hash_sources.clear()
+        self.last_stats = {'candidate_pairs': 0, 'confirmed_pairs': 0}
+        
+        image_files = self.collect_image_files(directory)
+        to_hash = image_files
+        copies = {}
+        if exact_prepass:
+            for group in find_exact_duplicates(image_files).values():
+                copies[group[0]] = group[1:]
+            skipped = {path for others in copies.values() for path in others}
+            to_hash = [path for path in image_files if path not in skipped]
+        return image_files, to_hash, copies
+        
+    def _record_hash(self, file_path: str, file_hash: str, copies: Dict[str, List[str]]) -> List[str]:
+        """登记文件的哈希，内容完全相同的副本共用同一哈希；返回登记的全部文件"""
+        recorded = [file_path] + copies.get(file_path, [])
+        for copy_path in recorded[1:]:
+            self.hash_sources[copy_path] = self.hash_sources.get(file_path, 'full')
+            if file_path in self.hash_records:
+                self.hash_records[copy_path] = self.hash_records[file_path]
+        self.hash_dict[file_hash].extend(recorded)
+        return recorded
+        
+    def _log_cascade_stats(self) -> None:
+        if len(self.cascade) > 1:
+            logging.info(f"级联确认: {self.last_stats['candidate_pairs']} 个候选对中"
+                         f" {self.last_stats['confirmed_pairs']} 个通过确认")
+                         
+    @staticmethod
+    def _unique_group_id(file_hash: str, existing) -> str:
+        """以哈希值作为组ID；确认阶段可能把同一哈希的照片拆成多组，此时追加序号"""
+        group_id = file_hash
+        suffix = 1
+        while group_id in existing:
+            group_id = f"{file_hash}-{suffix}"
+            suffix += 1
+        return group_id
+        
+    def find_similar_photos(self, directory: str, hash_threshold: int = 5,
+                            backend: str = 'auto', workers: Optional[int] = None,
+                            ordered: bool = True,
+                            confirm_threshold: Optional[int] = None,
+                            exact_prepass: bool = False) -> Dict[str, List[str]]:
         """
         递归搜索目录中的相似照片
         :param directory: 要搜索的目录
-        :param hash_threshold: 哈希差异阈值，越小表示要求越相似
-        :return: 字典，键为哈希值，值为相似照片的路径列表
+        :param hash_threshold: 哈希差异阈值（汉明距离），越小表示要求越相似
+        :param backend: 聚类后端，'numpy'、'mih'、'bktree' 或 'auto'
+        :param workers: 并行计算哈希的进程数，None或1为串行，0表示使用全部CPU核心
+        :param ordered: 并行时是否保持遍历顺序（影响组内照片顺序）
+        :param confirm_threshold: 级联确认阶段的汉明距离阈值，默认与hash_threshold相同
+        :param exact_prepass: 先找出内容完全相同的文件，每组只计算一次哈希
+        :return: 字典，键为组内首张照片的哈希值，值为相似照片的路径列表
         """
-        self.hash_dict.clear()
+        if confirm_threshold is None:
+            confirm_threshold = hash_threshold
+        image_files, to_hash, copies = self._start_scan(directory, exact_prepass)
+        for file_path, file_hash in self.hash_files(to_hash, workers, ordered):
+            if file_hash:
+                self._record_hash(file_path, file_hash, copies)
+        if self.cache:
+            self.cache.prune(directory, image_files)
+            
+        # 以第一个算法的64位整数哈希建立索引，按汉明半径生成候选对
+        uf = UnionFind()
+        for h, files in self.hash_dict.items():
+            for path in files:
+                uf.find(path)
+            if len(files) > 1:
+                self._link_files(uf, files, files, confirm_threshold)
+        int_hashes = {int(h, 16): h for h in self.hash_dict if not is_video_signature(h)}
+        for a, b in candidate_pairs(list(int_hashes), hash_threshold, backend):
+            self._link_files(uf, self.hash_dict[int_hashes[a]], self.hash_dict[int_hashes[b]],
+                             confirm_threshold)
+        # 视频指纹按逐帧汉明距离之和聚类，阈值按采样帧数放大
+        signatures = {parse_signature(h): h for h in self.hash_dict if is_video_signature(h)}
+        for a, b in bktree_pairs(list(signatures), hash_threshold * VIDEO_SAMPLE_COUNT, sequence_distance):
+            self._link_files(uf, self.hash_dict[signatures[a]], self.hash_dict[signatures[b]],
+                             confirm_threshold)
+        self._log_cascade_stats()
+        
+        primary = {path: h for h, files in self.hash_dict.items() for path in files}
+        similar = {}
+        for files in uf.groups():
+            similar[self._unique_group_id(primary[files[0]], similar)] = files
+        return similar
+        
+    def iter_similar_photos(self, directory: str, hash_threshold: int = 5,
+                            backend: str = 'auto', workers: Optional[int] = None,
+                            confirm_threshold: Optional[int] = None,
+                            exact_prepass: bool = False,
+                            progress_interval: int = 50) -> Iterator[Dict[str, Any]]:
+        """
+        增量搜索相似照片：每算完一张照片就在哈希索引中查询近邻并更新相似组，无需等待全部照片处理完
+        产出的事件为字典：
+        - {'type': 'progress', 'hashed': 已计算数量, 'total': 总数量}
+        - {'type': 'group', 'group_id': 组ID, 'files': 组内照片, 'merged': 并入该组的旧组ID}
+          同一组ID再次出现表示该组有新照片加入
+        参数含义与find_similar_photos相同，并行时按完成顺序处理；
+        backend按待计算的照片数量选择图片哈希索引，视频指纹始终使用BK树
+        """
+        if confirm_threshold is None:
+            confirm_threshold = hash_threshold
+        image_files, to_hash, copies = self._start_scan(directory, exact_prepass)
+        total = len(to_hash)
+        yield {'type': 'progress', 'hashed': 0, 'total': total}
+        
+        tree = make_index(total, hash_threshold, backend)
+        video_tree = BKTree(sequence_distance)
+        uf = UnionFind()
+        hex_hashes = {}  # 整数哈希或视频帧哈希序列 -> 原始哈希字符串
+        members = {}     # 根 -> 组内照片
+        group_ids = {}   # 根 -> 已产出的组ID
+        hashed = 0
+        for file_path, file_hash in self.hash_files(to_hash, workers, ordered=False):
+            hashed += 1
+            if file_hash:
+                if is_video_signature(file_hash):
+                    index, value = video_tree, parse_signature(file_hash)
+                    radius = hash_threshold * VIDEO_SAMPLE_COUNT
+                else:
+                    index, value, radius = tree, int(file_hash, 16), hash_threshold
+                candidates = [
+                    path for _, neighbor in index.search(value, radius)
+                    for path in self.hash_dict[hex_hashes[neighbor]]
+                ]
+                old_roots = list(dict.fromkeys(uf.find(path) for path in candidates))
+                new_files = self._record_hash(file_path, file_hash, copies)
+                index.add(value)
+                hex_hashes[value] = file_hash
+                for path in new_files:
+                    members[uf.find(path)] = [path]
+                    
+                self._link_files(uf, new_files, new_files, confirm_threshold)
+                if candidates:
+                    self._link_files(uf, new_files, candidates, confirm_threshold)
+                    
+                root = uf.find(file_path)
+                involved = [r for r in old_roots + new_files if uf.find(r) == root and r in members]
+                combined = [path for r in involved for path in members.pop(r)]
+                members[root] = combined
+                ids = [group_ids.pop(r) for r in involved if r in group_ids]
+                if len(combined) > 1:
+                    group_id = ids[0] if ids else self._unique_group_id(file_hash, set(group_ids.values()))
+                    group_ids[root] = group_id
+                    yield {'type': 'group', 'group_id': group_id, 'files': list(combined), 'merged': ids[1:]}
+                    
+            if hashed % progress_interval == 0 and hashed < total:
+                yield {'type': 'progress', 'hashed': hashed, 'total': total}
+                
+        if self.cache:
+            self.cache.prune(directory, image_files)
+        self._log_cascade_stats()
+        yield {'type': 'progress', 'hashed': total, 'total': total}
         
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                if Path(filename).suffix.lower() in self.supported_formats:
-                    file_path = os.path.join(root, filename)
-                    file_hash = self.compute_hash(file_path)
-                    if file_hash:
-                        self.hash_dict[file_hash].append(file_path)
-        
-        # 只返回有相似照片的组
-        return {k: v for k, v in self.hash_dict.items() if len(v) > 1}
-    
     @staticmethod
     def get_file_info(file_path: str) -> Dict[str, any]:
         """获取文件信息"""
@@ -0,0 +1,104 @@
+import io
+import shutil
+import subprocess
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+from PIL import Image
+import imagehash
+
+# 支持计算指纹的视频格式
+VIDEO_FORMATS = {'.mp4', '.mov'}
+# 每个视频采样的帧数，采样点均匀分布在时长的 (i + 0.5) / n 处
+VIDEO_SAMPLE_COUNT = 8
+# 采样帧缩放后的边长，平均哈希只需要8x8像素
+VIDEO_FRAME_SIZE = 32
+# 单次ffmpeg/ffprobe调用的超时时间（秒）
+VIDEO_TOOL_TIMEOUT = 30
+
+@lru_cache(maxsize=1)
+def ffmpeg_available() -> bool:
+    """本地是否安装了ffmpeg和ffprobe"""
+    return bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+def probe_duration(video_path: str) -> Optional[float]:
+    """使用ffprobe读取容器中的时长（秒），不解码视频"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'default=noprint_wrappers=1:nokey=1', video_path],
+        capture_output=True, timeout=VIDEO_TOOL_TIMEOUT
+    )
+    try:
+        duration = float(result.stdout.decode().strip())
+    except ValueError:
+        return None
+    return duration if duration > 0 else None
+
+def extract_frame(video_path: str, timestamp: float, size: int = VIDEO_FRAME_SIZE) -> Optional[Image.Image]:
+    """
+    在指定时间点取一帧灰度图并缩放为size×size
+    -ss放在-i之前使用输入端定位，只解码定位点附近的关键帧，不会解码整个文件
+    -noaccurate_seek保留定位到的前一个关键帧，否则只解码关键帧时，最后一个关键帧之后的时间点取不到帧
+    """
+    result = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-skip_frame', 'nokey', '-noaccurate_seek', '-ss', f'{timestamp:.3f}',
+         '-i', video_path, '-frames:v', '1', '-an',
+         '-vf', f'scale={size}:{size}', '-f', 'rawvideo', '-pix_fmt', 'gray', '-'],
+        capture_output=True, timeout=VIDEO_TOOL_TIMEOUT
+    )
+    if len(result.stdout) < size * size:
+        return None
+    return Image.frombytes('L', (size, size), result.stdout[:size * size])
+
+def sample_times(duration: float, count: int = VIDEO_SAMPLE_COUNT) -> List[float]:
+    """均匀分布的采样时间点，避开片头片尾"""
+    return [duration * (i + 0.5) / count for i in range(count)]
+
+def hash_video_file(video_path: str) -> Tuple[Optional[Dict[str, str]], str]:
+    """
+    计算视频指纹：采样帧的平均哈希序列，格式为逗号分隔的十六进制哈希
+    :return: ({'video': 指纹}, 'keyframes')，失败时指纹为None
+    """
+    try:
+        duration = probe_duration(video_path)
+        if duration is None:
+            logging.error(f"无法读取视频 {video_path} 的时长")
+            return None, 'keyframes'
+        frame_hashes = []
+        for timestamp in sample_times(duration):
+            frame = extract_frame(video_path, timestamp)
+            if frame is None:
+                logging.error(f"无法从视频 {video_path} 的 {timestamp:.1f} 秒处取帧")
+                return None, 'keyframes'
+            frame_hashes.append(str(imagehash.average_hash(frame)))
+        return {'video': ','.join(frame_hashes)}, 'keyframes'
+    except Exception as e:
+        logging.error(f"处理视频 {video_path} 时出错: {str(e)}")
+        return None, 'keyframes'
+
+def parse_signature(signature: str) -> Tuple[int, ...]:
+    """将指纹字符串解析为整数哈希序列"""
+    return tuple(int(h, 16) for h in signature.split(','))
+
+def sequence_distance(a: Sequence[int], b: Sequence[int]) -> int:
+    """
+    两个指纹序列逐帧汉明距离之和
+    逐位置求和满足三角不等式，可直接用于BK树；长度不同的指纹视为完全不同
+    """
+    if len(a) != len(b):
+        return 64 * max(len(a), len(b))
+    return sum(bin(x ^ y).count('1') for x, y in zip(a, b))
+
+def load_video_preview(video_path: str, size: int) -> Image.Image:
+    """取视频中间的一帧作为RGB预览，保持宽高比，长边不超过size"""
+    duration = probe_duration(video_path) or 0
+    result = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-ss', f'{duration / 2:.3f}', '-i', video_path,
+         '-frames:v', '1', '-an',
+         '-vf', f'scale={size}:{size}:force_original_aspect_ratio=decrease',
+         '-f', 'image2pipe', '-vcodec', 'png', '-'],
+        capture_output=True, timeout=VIDEO_TOOL_TIMEOUT
+    )
+    if not result.stdout:
+        raise ValueError("无法从视频中取帧")
+    return Image.open(io.BytesIO(result.stdout)).convert('RGB')
@@ -0,0 +1,73 @@
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional
+import logging
+
+class MediaFile(NamedTuple):
+    """遍历目录得到的文件记录"""
+    path: Path
+    size: int
+    mtime_ns: int
+    inode: int
+    kind: str  # 'images' 或 'videos'
+    device: int = 0
+
+def media_kind(name: str, formats: Dict[str, Iterable[str]]) -> Optional[str]:
+    """按扩展名判断文件类别，不支持的文件返回None"""
+    ext = os.path.splitext(name)[1].lower()
+    for kind, extensions in formats.items():
+        if ext in extensions:
+            return kind
+    return None
+
+def walk_media(directory: Path, formats: Dict[str, Iterable[str]]) -> Iterator[MediaFile]:
+    """
+    用os.scandir遍历目录树，只为支持的文件生成记录
+    每个目录只列出一次，每个文件只stat一次，不跟随指向目录的符号链接
+    :param formats: 类别 -> 扩展名集合（小写）
+    """
+    formats = {kind: {ext.lower() for ext in extensions} for kind, extensions in formats.items()}
+    stack = [str(directory)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                subdirs = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        kind = media_kind(entry.name, formats)
+                        if kind is None or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError as e:
+                        logging.error(f"读取文件 {entry.path} 时出错: {str(e)}")
+                        continue
+                    yield MediaFile(Path(entry.path), stat.st_size, stat.st_mtime_ns, stat.st_ino, kind, stat.st_dev)
+        except OSError as e:
+            logging.error(f"读取目录 {current} 时出错: {str(e)}")
+            continue
+        # 倒序入栈，按目录列出的顺序深度优先遍历
+        stack.extend(reversed(subdirs))
+
+def media_stats(files: Iterable[MediaFile]) -> Dict[str, Dict[str, int]]:
+    """按类别统计文件数量和大小，格式与FileProcessor.get_file_stats相同"""
+    stats = {
+        'images': {'count': 0, 'size': 0},
+        'videos': {'count': 0, 'size': 0}
+    }
+    for file in files:
+        stats[file.kind]['count'] += 1
+        stats[file.kind]['size'] += file.size
+    return stats
+
+def merge_stats(*stats: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    """合并多份统计"""
+    merged = media_stats([])
+    for item in stats:
+        for kind, values in item.items():
+            merged[kind]['count'] += values['count']
+            merged[kind]['size'] += values['size']
+    return merged
@@ -1,6 +1,6 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, 
-    QGridLayout, QPushButton, QLineEdit, QProgressBar
+    QGridLayout, QPushButton, QLineEdit, QProgressBar, QCheckBox, QComboBox
 )
 from PyQt6.QtCore import Qt
 from pathlib import Path
@@ -9,6 +9,24 @@ from typing import Callable
 
 from .base_tab import BaseTab
 from ..core import FileProcessor, generate_report
+from ..core.plan import PLAN_FILENAME
+
+# 放置方式选项：(显示名称, placement.PLACEMENT_MODES中的取值)
+PLACEMENT_OPTIONS = [
+    ("自动（优先reflink，不支持时复制）", 'auto'),
+    ("复制", 'copy'),
+    ("reflink克隆（btrfs/XFS/APFS）", 'reflink'),
+    ("硬链接（与源文件共享数据）", 'hardlink'),
+    ("移动（删除源文件）", 'move'),
+    ("copy_file_range（内核/服务器端复制）", 'copy_file_range'),
+]
+
+# 输出目录中已有相同内容的文件时的处理：(显示名称, library_index.LIBRARY_DEDUP_MODES中的取值)
+LIBRARY_DEDUP_OPTIONS = [
+    ("不检查", None),
+    ("跳过", 'skip'),
+    ("硬链接到已有文件", 'hardlink'),
+]
 
 class BatchTab(BaseTab):
     """批量处理选项卡"""
@@ -20,6 +38,12 @@ class BatchTab(BaseTab):
         self.progress_label = None
         self.progressbar = None
         self.start_button = None
+        self.skip_duplicates_checkbox = None
+        self.dry_run_checkbox = None
+        self.verify_checkbox = None
+        self.read_back_checkbox = None
+        self.placement_combobox = None
+        self.library_dedup_combobox = None
         super().__init__(parent)
         
     def setup_ui(self):
@@ -66,6 +90,42 @@ class BatchTab(BaseTab):
         self.progressbar.setValue(0)
         progress_layout.addWidget(self.progressbar)
         
+        # 处理选项
+        self.skip_duplicates_checkbox = QCheckBox("跳过内容完全相同的重复文件")
+        frame_layout.addWidget(self.skip_duplicates_checkbox)
+        
+        # 只生成整理计划，便于预览和检查
+        self.dry_run_checkbox = QCheckBox(f"仅预览：生成整理计划 {PLAN_FILENAME}，不复制文件")
+        frame_layout.addWidget(self.dry_run_checkbox)
+        
+        # 复制时计算校验和并写入校验和文件，之后可以检查归档是否损坏；本身不检查目标文件
+        self.verify_checkbox = QCheckBox("在每个月份目录中写入校验和文件（.checksums.b2，可用 b2sum -c 检查）")
+        frame_layout.addWidget(self.verify_checkbox)
+        # 回读校验才检查写入的目标文件，防止读卡器等不稳定设备造成的静默损坏；需要再完整读取一遍目标文件，默认关闭
+        self.read_back_checkbox = QCheckBox("写入后回读目标文件并与校验和比较（需要再次读取全部文件，速度较慢）")
+        self.read_back_checkbox.setEnabled(False)
+        self.verify_checkbox.toggled.connect(self.read_back_checkbox.setEnabled)
+        frame_layout.addWidget(self.read_back_checkbox)
+        
+        # 文件放置方式
+        placement_frame = QFrame()
+        frame_layout.addWidget(placement_frame)
+        placement_layout = QHBoxLayout(placement_frame)
+        placement_layout.setContentsMargins(0, 0, 0, 0)
+        placement_layout.addWidget(QLabel("放置方式:"))
+        self.placement_combobox = QComboBox()
+        for label, mode in PLACEMENT_OPTIONS:
+            self.placement_combobox.addItem(label, mode)
+        placement_layout.addWidget(self.placement_combobox)
+        
+        # 输出目录中已有相同内容的文件
+        placement_layout.addWidget(QLabel("输出目录中已有的文件:"))
+        self.library_dedup_combobox = QComboBox()
+        for label, mode in LIBRARY_DEDUP_OPTIONS:
+            self.library_dedup_combobox.addItem(label, mode)
+        placement_layout.addWidget(self.library_dedup_combobox)
+        placement_layout.addStretch()
+        
         # 按钮框架
         button_frame = QFrame()
         frame_layout.addWidget(button_frame)
@@ -99,13 +159,34 @@ class BatchTab(BaseTab):
             self.message_callback("开始处理文件...")
             self.update_progress(0.0, "开始处理...")
             
-            processor = FileProcessor()
+            output_dir = Path(self.output_dir_line_edit.text())
+            dry_run = self.dry_run_checkbox.isChecked()
+            plan_path = None
+            if dry_run:
+                output_dir.mkdir(parents=True, exist_ok=True)
+                plan_path = output_dir / PLAN_FILENAME
+                
+            processor = FileProcessor(placement=self.placement_combobox.currentData(),
+                                      verify=self.verify_checkbox.isChecked(),
+                                      read_back=self.read_back_checkbox.isChecked())
             result = processor.process_directory(
                 Path(self.input_dir_line_edit.text()),
-                Path(self.output_dir_line_edit.text()),
-                self.update_progress
+                output_dir,
+                self.update_progress,
+                skip_duplicates=self.skip_duplicates_checkbox.isChecked(),
+                plan_path=plan_path,
+                dry_run=dry_run,
+                library_dedup=self.library_dedup_combobox.currentData()
             )
             
+            if dry_run:
+                self.show_info("预览完成",
+                    f"已规划 {result.get('planned', 0)} 个文件，"
+                    f"跳过重复文件 {result.get('duplicates', 0)} 个，"
+                    f"输出目录中已有 {result.get('library_duplicates', 0)} 个。\n"
+                    f"整理计划已写入 {plan_path}")
+                return
+            
             # 生成报告
             report = generate_report(result['input_stats'], result['output_stats'])
             self.message_callback("=" * 50)
@@ -118,7 +199,9 @@ class BatchTab(BaseTab):
             # 显示完成对话框
             self.show_info("处理完成", 
                 f"所有文件处理完成！\n\n"
-                f"已处理 {result['processed']} 个文件，成功 {result['success']} 个。\n"
+                f"已处理 {result['processed']} 个文件，成功 {result['success']} 个，"
+                f"跳过重复文件 {result.get('duplicates', 0)} 个，"
+                f"输出目录中已有 {result.get('library_duplicates', 0)} 个。\n"
                 f"如需处理新的目录，请选择新的输入/输出目录，然后点击「开始处理」按钮。")
                 
         except Exception as e:
@@ -1,38 +1,66 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, 
     QGridLayout, QPushButton, QLineEdit, QFileDialog,
-    QSlider, QScrollArea, QSizePolicy, QGroupBox, QCheckBox
+    QSlider, QScrollArea, QSizePolicy, QGroupBox, QCheckBox, QSpinBox
 )
 from PyQt6.QtCore import Qt, QSize, QTimer, pyqtSignal, QObject
 from PyQt6.QtGui import QPixmap, QImage
 from pathlib import Path
 import threading
-from typing import Callable, Dict, List, Set
-from PIL import Image
+from typing import Callable, Dict, List, Optional, Set
 import os
 
 from .base_tab import BaseTab
-from ..core.similarity import PhotoSimilarityFinder
+from ..core.similarity import PhotoSimilarityFinder, load_preview_image
+
+CONFIRM_CASCADE = ('average', 'difference', 'perceptual')
 
 class SimilarityWorker(QObject):
     """用于处理相似照片搜索的工作线程"""
-    finished = pyqtSignal(dict)  # 搜索完成信号
-    error = pyqtSignal(str)      # 错误信号
-    progress = pyqtSignal(str)   # 进度信号
+    finished = pyqtSignal(dict)     # 搜索完成信号
+    error = pyqtSignal(str)         # 错误信号
+    progress = pyqtSignal(str)      # 进度信号
+    group_found = pyqtSignal(dict)  # 发现或更新相似组信号
 
     def __init__(self):
         super().__init__()
-        self.finder = PhotoSimilarityFinder()
+        # 使用持久化哈希缓存，重复扫描时只计算新增或修改过的照片
+        self.finder = PhotoSimilarityFinder(use_cache=True)
 
-    def search(self, input_dir: str, threshold: int):
+    def search(self, input_dir: str, threshold: int, workers: Optional[int] = None,
+               use_exif_thumbnail: bool = False, confirm: bool = True, exact_only: bool = False,
+               include_videos: bool = False):
         """执行搜索"""
         try:
+            self.finder.include_videos = include_videos
+            if exact_only:
+                self.search_exact(input_dir)
+                return
+                
             self.progress.emit("开始搜索相似照片...")
-            similar_photos = self.finder.find_similar_photos(
-                Path(input_dir),
-                hash_threshold=threshold
-            )
+            self.finder.use_exif_thumbnail = use_exif_thumbnail
+            # 平均哈希生成候选，差异哈希和感知哈希确认，减少需要人工检查的误报
+            self.finder.cascade = CONFIRM_CASCADE if confirm else ('average',)
+            # 边计算哈希边产出相似组，界面无需等待整个目录处理完
+            similar_photos = {}
+            for event in self.finder.iter_similar_photos(
+                str(input_dir),
+                hash_threshold=threshold,
+                workers=workers,
+                exact_prepass=True
+            ):
+                if event['type'] == 'progress':
+                    self.progress.emit(f"已计算 {event['hashed']}/{event['total']} 张照片")
+                else:
+                    for merged_id in event['merged']:
+                        similar_photos.pop(merged_id, None)
+                    similar_photos[event['group_id']] = event['files']
+                    self.group_found.emit(event)
             
+            if use_exif_thumbnail:
+                thumb_count = sum(1 for source in self.finder.hash_sources.values() if source == 'thumbnail')
+                self.progress.emit(f"{thumb_count}/{len(self.finder.hash_sources)} 张照片使用EXIF缩略图计算哈希")
+                
             if similar_photos:
                 self.progress.emit(f"搜索完成，找到 {len(similar_photos)} 组相似照片")
                 for group_id, files in similar_photos.items():
@@ -44,6 +72,58 @@ class SimilarityWorker(QObject):
                 
         except Exception as e:
             self.error.emit(str(e))
+            
+    def search_exact(self, input_dir: str):
+        """只查找内容完全相同的照片"""
+        self.progress.emit("开始查找完全相同的照片...")
+        duplicates = self.finder.find_exact_duplicates(input_dir)
+        if duplicates:
+            self.progress.emit(f"查找完成，找到 {len(duplicates)} 组完全相同的照片")
+        else:
+            self.progress.emit("未找到完全相同的照片。")
+        self.finished.emit(duplicates)
+
+class GroupPreview(QFrame):
+    """一个相似组的预览：标题、照片网格和分隔线；组内加入照片时只为新照片创建预览"""
+    
+    COLUMNS = 3  # 每行显示的照片数
+    
+    def __init__(self, group_id: str, create_photo_preview: Callable[[str], QWidget]):
+        super().__init__()
+        self.group_id = group_id
+        self.create_photo_preview = create_photo_preview
+        self.photo_frames: Dict[str, QWidget] = {}  # 路径 -> 照片预览
+        group_layout = QVBoxLayout(self)
+        
+        # 组标题
+        self.title_label = QLabel()
+        self.title_label.setStyleSheet("font-weight: bold;")
+        group_layout.addWidget(self.title_label)
+        
+        # 照片网格
+        photos_frame = QFrame()
+        self.photos_layout = QGridLayout(photos_frame)
+        group_layout.addWidget(photos_frame)
+        
+        # 分隔线，放在组框架内以便随组一起移除
+        separator = QFrame()
+        separator.setFrameShape(QFrame.Shape.HLine)
+        separator.setFrameShadow(QFrame.Shadow.Sunken)
+        group_layout.addWidget(separator)
+        
+    def add_files(self, files: List[str], existing: Optional[Dict[str, QWidget]] = None):
+        """
+        添加组内尚未显示的照片
+        :param existing: 已创建的照片预览（并入本组的旧组），直接移到本组而不重新解码
+        """
+        for file_path in files:
+            if file_path in self.photo_frames:
+                continue
+            frame = (existing or {}).get(file_path) or self.create_photo_preview(file_path)
+            index = len(self.photo_frames)
+            self.photos_layout.addWidget(frame, index // self.COLUMNS, index % self.COLUMNS)
+            self.photo_frames[file_path] = frame
+        self.title_label.setText(f"相似组 {self.group_id} (共 {len(self.photo_frames)} 张照片)")
 
 class SimilarityTab(BaseTab):
     """相似照片查找选项卡"""
@@ -53,6 +133,11 @@ class SimilarityTab(BaseTab):
         self.input_dir_line_edit = QLineEdit()
         self.threshold_slider = None
         self.threshold_value_label = None
+        self.workers_spinbox = None
+        self.exif_thumbnail_checkbox = None
+        self.confirm_checkbox = None
+        self.exact_only_checkbox = None
+        self.include_videos_checkbox = None
         self.preview_area = None
         self.similar_photos = {}  # 存储相似照片组
         self.preview_widgets = {}  # 存储预览小部件
@@ -65,6 +150,7 @@ class SimilarityTab(BaseTab):
         self.worker.finished.connect(self.on_search_finished)
         self.worker.error.connect(self.on_search_error)
         self.worker.progress.connect(self.message_callback)
+        self.worker.group_found.connect(self.on_group_found)
         
     def setup_ui(self):
         """设置UI组件"""
@@ -104,6 +190,32 @@ class SimilarityTab(BaseTab):
         self.threshold_value_label = QLabel("5")
         threshold_layout.addWidget(self.threshold_value_label)
         
+        # 并行进程数设置（0表示使用全部CPU核心）
+        threshold_layout.addWidget(QLabel("并行进程数:"))
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setMinimum(0)
+        self.workers_spinbox.setMaximum(os.cpu_count() or 1)
+        self.workers_spinbox.setValue(0)
+        self.workers_spinbox.setSpecialValueText("自动")
+        threshold_layout.addWidget(self.workers_spinbox)
+        
+        # 使用EXIF内嵌缩略图计算哈希和显示预览，避免解码原图
+        self.exif_thumbnail_checkbox = QCheckBox("使用EXIF缩略图(快速)")
+        threshold_layout.addWidget(self.exif_thumbnail_checkbox)
+        
+        # 多算法级联确认
+        self.confirm_checkbox = QCheckBox("多算法确认")
+        self.confirm_checkbox.setChecked(True)
+        threshold_layout.addWidget(self.confirm_checkbox)
+        
+        # 只比较文件内容，不计算感知哈希
+        self.exact_only_checkbox = QCheckBox("仅完全相同")
+        threshold_layout.addWidget(self.exact_only_checkbox)
+        
+        # 按采样关键帧比较MP4/MOV视频，需要安装ffmpeg
+        self.include_videos_checkbox = QCheckBox("包含视频")
+        threshold_layout.addWidget(self.include_videos_checkbox)
+        
         # 缩略图大小设置
         size_frame = QFrame()
         frame_layout.addWidget(size_frame)
@@ -194,12 +306,18 @@ class SimilarityTab(BaseTab):
             
         # 清除先前的结果
         self.clear_preview()
+        self.similar_photos = {}
         
         # 在新线程中搜索
         threshold = self.threshold_slider.value()
+        workers = self.workers_spinbox.value()
+        use_exif_thumbnail = self.exif_thumbnail_checkbox.isChecked()
+        confirm = self.confirm_checkbox.isChecked()
+        exact_only = self.exact_only_checkbox.isChecked()
+        include_videos = self.include_videos_checkbox.isChecked()
         thread = threading.Thread(
             target=self.worker.search,
-            args=(input_dir, threshold)
+            args=(input_dir, threshold, workers, use_exif_thumbnail, confirm, exact_only, include_videos)
         )
         thread.daemon = True
         thread.start()
@@ -207,9 +325,33 @@ class SimilarityTab(BaseTab):
     def on_search_finished(self, similar_photos: Dict):
         """搜索完成的回调"""
         self.similar_photos = similar_photos
-        if self.similar_photos:
+        # 增量显示的组已经与结果一致时无需重新绘制
+        if self.similar_photos and set(self.preview_widgets) != set(self.similar_photos):
             self.show_similar_photos()
             
+    def on_group_found(self, event: Dict):
+        """
+        搜索过程中发现新组或已有组更新时的回调
+        已显示的照片预览保留在原处，只为新加入的照片解码预览，逐张增长的组不会反复重建
+        """
+        group_id = event['group_id']
+        preview = self.preview_widgets.get(group_id)
+        if preview is None:
+            preview = self.add_group_preview(group_id, [])
+        # 并入本组的旧组：已创建的照片预览移到本组，旧组的框架随后移除
+        existing = {}
+        merged_previews = []
+        for merged_id in event['merged']:
+            self.similar_photos.pop(merged_id, None)
+            merged = self.preview_widgets.pop(merged_id, None)
+            if merged is not None:
+                existing.update(merged.photo_frames)
+                merged_previews.append(merged)
+        preview.add_files(event['files'], existing)
+        for merged in merged_previews:
+            merged.setParent(None)
+        self.similar_photos[group_id] = event['files']
+        
     def on_search_error(self, error_msg: str):
         """搜索错误的回调"""
         self.message_callback(f"搜索过程中发生错误: {error_msg}")
@@ -229,48 +371,25 @@ class SimilarityTab(BaseTab):
             # 显示新的预览
             for group_id, files in self.similar_photos.items():
                 self.message_callback(f"正在显示组 {group_id} 的照片...")
-                
-                # 组标题
-                group_frame = QFrame()
-                group_layout = QVBoxLayout(group_frame)
-                
-                title_label = QLabel(f"相似组 {group_id} (共 {len(files)} 张照片)")
-                title_label.setStyleSheet("font-weight: bold;")
-                group_layout.addWidget(title_label)
-                
-                # 照片网格
-                photos_frame = QFrame()
-                photos_layout = QGridLayout(photos_frame)
-                group_layout.addWidget(photos_frame)
-                
-                # 每行显示3张照片
-                for i, file_path in enumerate(files):
-                    self.message_callback(f"正在处理照片: {Path(file_path).name}")
-                    file_info = PhotoSimilarityFinder.get_file_info(file_path)
-                    file_frame = self.create_photo_preview(file_path, file_info, group_id)
-                    
-                    row = i // 3
-                    col = i % 3
-                    photos_layout.addWidget(file_frame, row, col)
-                
-                # 分隔线
-                separator = QFrame()
-                separator.setFrameShape(QFrame.Shape.HLine)
-                separator.setFrameShadow(QFrame.Shadow.Sunken)
-                
-                # 添加到预览区域
-                self.preview_layout.addWidget(group_frame)
-                self.preview_layout.addWidget(separator)
-                
-                # 保存小部件引用
-                self.preview_widgets[group_id] = group_frame
+                self.add_group_preview(group_id, files)
                 
             self.message_callback("相似照片显示完成")
             
         except Exception as e:
             self.message_callback(f"显示相似照片时发生错误: {str(e)}")
             self.show_error("显示错误", f"无法显示相似照片: {str(e)}")
-    
+            
+    def add_group_preview(self, group_id: str, files: List[str]) -> GroupPreview:
+        """在预览区域添加一个相似组"""
+        preview = GroupPreview(group_id, lambda file_path: self.create_photo_preview(
+            file_path, PhotoSimilarityFinder.get_file_info(file_path), group_id))
+        preview.add_files(files)
+        
+        # 添加到预览区域并保存小部件引用
+        self.preview_layout.addWidget(preview)
+        self.preview_widgets[group_id] = preview
+        return preview
+        
     def create_photo_preview(self, file_path: str, file_info: Dict, group_id: int) -> QWidget:
         """创建照片预览小部件"""
         frame = QFrame()
@@ -284,32 +403,25 @@ class SimilarityTab(BaseTab):
         )
         layout.addWidget(checkbox)
         
+        source = None
         try:
-            # 使用PIL打开图片
-            with Image.open(file_path) as img:
-                # 转换为RGB模式（处理RGBA等格式）
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 计算缩放比例，保持宽高比
-                ratio = min(self.thumbnail_size / img.width, self.thumbnail_size / img.height)
-                new_size = (int(img.width * ratio), int(img.height * ratio))
-                
-                # 缩放图片
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-                
-                # 转换为QPixmap
-                img_data = img.tobytes("raw", "RGB")
-                qimage = QImage(img_data, img.width, img.height, img.width * 3, QImage.Format.Format_RGB888)
-                pixmap = QPixmap.fromImage(qimage)
-                
-                # 显示缩略图
-                image_label = QLabel()
-                image_label.setPixmap(pixmap)
-                image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                image_label.setMinimumSize(self.thumbnail_size, self.thumbnail_size)
-                layout.addWidget(image_label)
-                
+            # 加载缩放后的RGB图片，开启EXIF缩略图时优先使用内嵌缩略图
+            img, source = load_preview_image(
+                file_path, self.thumbnail_size, self.exif_thumbnail_checkbox.isChecked()
+            )
+            
+            # 转换为QPixmap
+            img_data = img.tobytes("raw", "RGB")
+            qimage = QImage(img_data, img.width, img.height, img.width * 3, QImage.Format.Format_RGB888)
+            pixmap = QPixmap.fromImage(qimage)
+            
+            # 显示缩略图
+            image_label = QLabel()
+            image_label.setPixmap(pixmap)
+            image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            image_label.setMinimumSize(self.thumbnail_size, self.thumbnail_size)
+            layout.addWidget(image_label)
+            
         except Exception as e:
             # 如果无法加载图像，显示错误消息
             error_label = QLabel(f"无法加载图像: {str(e)}")
@@ -320,11 +432,16 @@ class SimilarityTab(BaseTab):
         
         # 文件信息
         file_size = f"{file_info['size'] // 1024}KB" if 'size' in file_info else 'N/A'
-        info_label = QLabel(
+        info_text = (
             f"文件: {Path(file_path).name}\n"
             f"大小: {file_size}\n"
             f"修改时间: {file_info.get('modified', 'N/A')}"
         )
+        if source == 'thumbnail':
+            info_text += "\n预览: EXIF缩略图"
+        elif source == 'video':
+            info_text += "\n预览: 视频中间帧"
+        info_label = QLabel(info_text)
         info_label.setWordWrap(True)
         info_label.setMinimumHeight(60)
         layout.addWidget(info_label)
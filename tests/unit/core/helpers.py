@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Union
+import tempfile
+import shutil
+
+from src.core import FileProcessor
+
+# 整理测试中默认的EXIF日期
+EXIF_DATE = datetime(2024, 3, 13, 12, 0)
+
+ExifDates = Union[Optional[datetime], Dict[str, datetime], Callable[[str], Optional[datetime]]]
+
+def fake_exif(dates: ExifDates) -> Callable[[str], Optional[datetime]]:
+    """
+    read_exif_datetime的替身
+    :param dates: 所有文件共用的日期；或 文件名 -> 日期 的字典，不在字典中的文件没有日期；或接收路径的函数
+    """
+    if callable(dates):
+        return dates
+    if isinstance(dates, dict):
+        return lambda file_path: dates.get(Path(file_path).name)
+    return lambda file_path: dates
+
+class TempDirTestCase(unittest.TestCase):
+    """在临时目录中运行的测试，input_dir已创建，output_dir由整理时创建"""
+    
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = Path(self.temp_dir) / "input"
+        self.output_dir = Path(self.temp_dir) / "output"
+        self.input_dir.mkdir()
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def organize(self, dates: ExifDates = EXIF_DATE, input_dir: Optional[Path] = None,
+                 processor: Optional[FileProcessor] = None, **options: Any) -> Dict[str, Any]:
+        """
+        替换EXIF读取后把input_dir整理到output_dir
+        :param processor: 使用的FileProcessor，默认新建
+        :param options: 传给process_directory的参数
+        """
+        processor = processor or FileProcessor()
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=fake_exif(dates)):
+            return processor.process_directory(input_dir or self.input_dir, self.output_dir, **options)
@@ -0,0 +1,98 @@
+import unittest
+from pathlib import Path
+import tempfile
+import shutil
+import struct
+from datetime import datetime, timedelta, timezone
+import piexif
+
+from src.core import DateExtractor
+from src.core.bmff import MOVIE_EPOCH, iter_boxes, read_bmff_datetime
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    """构造一个盒子"""
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+def full_box(box_type: bytes, payload: bytes, version: int = 0) -> bytes:
+    """构造一个带版本和标志的盒子"""
+    return box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+def heif_bytes(exif: bytes) -> bytes:
+    """构造只包含Exif条目的最小HEIF文件"""
+    ftyp = box(b'ftyp', b'heic\0\0\0\0mif1heic')
+    infe = full_box(b'infe', struct.pack('>HH4s', 1, 0, b'Exif') + b'\0', version=2)
+    iinf = full_box(b'iinf', struct.pack('>H', 1) + infe)
+    item = struct.pack('>I', 6) + exif
+
+    def build(item_offset: int) -> bytes:
+        iloc = full_box(b'iloc', bytes([0x44, 0x00]) + struct.pack('>HHHHII', 1, 1, 0, 1, item_offset, len(item)))
+        return ftyp + full_box(b'meta', full_box(b'hdlr', b'\0' * 4 + b'pict' + b'\0' * 13) + iinf + iloc)
+
+    head = build(0)
+    # mdat数据紧跟在meta之后
+    return build(len(head) + 8) + box(b'mdat', item)
+
+def movie_bytes(creation_time: int, day: bytes = None, mdat_size: int = 1024) -> bytes:
+    """构造moov位于mdat之后的最小MOV文件"""
+    mvhd = full_box(b'mvhd', struct.pack('>IIII', creation_time, creation_time, 600, 0) + b'\0' * 80)
+    moov_payload = mvhd
+    if day is not None:
+        moov_payload += box(b'udta', box(b'\xa9day', struct.pack('>HH', len(day), 0) + day))
+    return box(b'ftyp', b'qt  \0\0\0\0qt  ') + box(b'mdat', b'\0' * mdat_size) + box(b'moov', moov_payload)
+
+class TestBmff(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.media_dir = Path(self.temp_dir)
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def write_file(self, filename: str, data: bytes) -> Path:
+        file_path = self.media_dir / filename
+        file_path.write_bytes(data)
+        return file_path
+        
+    def test_heic_exif_item(self):
+        """测试通过iinf/iloc读取HEIC的Exif拍摄时间"""
+        exif = piexif.dump({'Exif': {
+            piexif.ExifIFD.DateTimeOriginal: b'2023:05:06 07:08:09',
+            piexif.ExifIFD.OffsetTimeOriginal: b'+09:00'
+        }})
+        image = self.write_file("IMG_0001.HEIC", heif_bytes(exif))
+        self.assertEqual(read_bmff_datetime(str(image)),
+                         datetime(2023, 5, 6, 7, 8, 9, tzinfo=timezone(timedelta(hours=9))))
+        self.assertEqual(DateExtractor().get_creation_date_from_exif(str(image)).day, 6)
+        
+    def test_movie_udta_day(self):
+        """测试优先使用©day中带时区的拍摄时间"""
+        video = self.write_file("clip.MOV", movie_bytes(1, b'2022-08-09T10:11:12+0800'))
+        self.assertEqual(read_bmff_datetime(str(video)),
+                         datetime(2022, 8, 9, 10, 11, 12, tzinfo=timezone(timedelta(hours=8))))
+                         
+    def test_movie_mvhd(self):
+        """测试没有©day时使用mvhd的创建时间"""
+        expected = datetime(2021, 3, 4, 5, 6, 7, tzinfo=timezone.utc)
+        video = self.write_file("clip.mp4", movie_bytes(int((expected - MOVIE_EPOCH).total_seconds())))
+        date = DateExtractor().get_creation_date_from_exif(str(video))
+        self.assertEqual(date, expected)
+        self.assertIsNotNone(date.tzinfo)
+        
+    def test_unset_creation_time(self):
+        """测试未设置创建时间的视频"""
+        video = self.write_file("clip.mp4", movie_bytes(0))
+        self.assertIsNone(read_bmff_datetime(str(video)))
+        
+    def test_iter_boxes_largesize(self):
+        """测试64位长度的盒子头"""
+        mdat = struct.pack('>I4sQ', 1, b'mdat', 16 + 4) + b'\0' * 4
+        data = mdat + box(b'free', b'')
+        path = self.write_file("large.mp4", data)
+        with open(path, 'rb') as f:
+            boxes = list(iter_boxes(f, 0, len(data)))
+        self.assertEqual(boxes, [(b'mdat', 16, 20), (b'free', 28, 28)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import shutil
+import subprocess
+
+from src.core import FileProcessor
+from src.core.checksums import CHECKSUM_FILENAME, ChecksumWriter, copy_with_digest, read_checksums
+from src.core.duplicates import file_digest
+from tests.unit.core.helpers import TempDirTestCase
+
+class TestChecksums(TempDirTestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        super().setUp()
+        self.source = Path(self.temp_dir) / "IMG_0001.jpg"
+        self.source.write_bytes(bytes(range(256)) * 10000)
+        self.target = Path(self.temp_dir) / "copy.jpg"
+        
+    def test_copy_with_digest(self):
+        """测试复制的同时计算摘要"""
+        digest = copy_with_digest(str(self.source), str(self.target))
+        self.assertEqual(self.target.read_bytes(), self.source.read_bytes())
+        self.assertEqual(digest, file_digest(str(self.source)))
+        
+    def test_no_second_read_by_default(self):
+        """测试默认不回读目标文件，也不逐个fsync"""
+        with patch('src.core.checksums.file_digest') as check, patch('src.core.checksums.os.fsync') as fsync:
+            copy_with_digest(str(self.source), str(self.target))
+        check.assert_not_called()
+        fsync.assert_not_called()
+        
+    def test_short_read(self):
+        """测试读取的字节数少于源文件大小时报错"""
+        real_open = open
+        
+        def truncated_open(path, mode='r', *args, **kwargs):
+            f = real_open(path, mode, *args, **kwargs)
+            if path == str(self.source):
+                blocks = iter([f.read(1000), b''])
+                f.read = lambda size=-1: next(blocks)
+            return f
+            
+        with patch('builtins.open', side_effect=truncated_open):
+            with self.assertRaises(OSError):
+                copy_with_digest(str(self.source), str(self.target))
+                
+    def test_retry_after_mismatch(self):
+        """测试回读校验不一致时重新复制"""
+        with patch('src.core.checksums.file_digest', side_effect=['corrupted', file_digest(str(self.source))]) as check:
+            copy_with_digest(str(self.source), str(self.target), read_back=True)
+        self.assertEqual(check.call_count, 2)
+        
+    def test_persistent_mismatch(self):
+        """测试多次回读校验失败时报错"""
+        with patch('src.core.checksums.file_digest', return_value='corrupted'):
+            with self.assertRaises(OSError):
+                copy_with_digest(str(self.source), str(self.target), read_back=True)
+                
+    def test_process_directory_writes_sidecar(self):
+        """测试批量整理时每个月份目录写入校验和文件"""
+        for i in range(3):
+            (self.input_dir / f"IMG_000{i}.jpg").write_bytes(f"photo {i}".encode())
+        result = self.organize(processor=FileProcessor(verify=True))
+        self.assertEqual(result['success'], 3)
+        
+        month_dir = self.output_dir / "2024" / "03"
+        checksums = read_checksums(month_dir)
+        self.assertEqual(sorted(checksums), ['IMG_0000.jpg', 'IMG_0001.jpg', 'IMG_0002.jpg'])
+        for name, digest in checksums.items():
+            self.assertEqual(digest, file_digest(str(month_dir / name)))
+        if shutil.which('b2sum'):
+            check = subprocess.run(['b2sum', '-c', CHECKSUM_FILENAME], cwd=month_dir, capture_output=True)
+            self.assertEqual(check.returncode, 0, check.stdout)
+            
+    def test_writer_opens_each_directory_once(self):
+        """测试每个目录的校验和文件在本次运行中只打开一次，超过上限时关闭最久未写入的文件"""
+        dirs = [Path(self.temp_dir) / name for name in ("a", "b")]
+        for directory in dirs:
+            directory.mkdir()
+        with patch('src.core.checksums.open', create=True, side_effect=open) as opened:
+            writer = ChecksumWriter()
+            for i in range(5):
+                for directory in dirs:
+                    writer.add(directory / f"IMG_000{i}.jpg", f"{i:02x}")
+            writer.close()
+        self.assertEqual(len([call for call in opened.call_args_list if call.args[1] == 'a']), 2)
+        for directory in dirs:
+            self.assertEqual(read_checksums(directory), {f"IMG_000{i}.jpg": f"{i:02x}" for i in range(5)})
+            
+        writer = ChecksumWriter(max_open=1)
+        for directory in dirs:
+            writer.add(directory / "new.jpg", "ff")
+        self.assertEqual(list(writer.files), [dirs[1]])
+        writer.close()
+        self.assertEqual(read_checksums(dirs[0])["new.jpg"], "ff")
+        self.assertEqual(writer.files, {})
+        
+    def test_rewritten_file_is_deduplicated(self):
+        """测试中断后重新放置的文件在校验和文件中只保留最后一行"""
+        month_dir = Path(self.temp_dir) / "03"
+        month_dir.mkdir()
+        (month_dir / CHECKSUM_FILENAME).write_text("aa  IMG_0001.jpg\nbb  IMG_0002.jpg\n")
+        writer = ChecksumWriter()
+        writer.add(month_dir / "IMG_0001.jpg", "cc")
+        writer.add(month_dir / "IMG_0003.jpg", "dd")
+        writer.close()
+        lines = (month_dir / CHECKSUM_FILENAME).read_text().splitlines()
+        self.assertEqual(sorted(lines), ["bb  IMG_0002.jpg", "cc  IMG_0001.jpg", "dd  IMG_0003.jpg"])
+        
+        # 没有重复文件名时只追加，不改写
+        other_dir = Path(self.temp_dir) / "04"
+        other_dir.mkdir()
+        (other_dir / CHECKSUM_FILENAME).write_text("aa  IMG_0001.jpg\n")
+        writer.add(other_dir / "IMG_0002.jpg", "bb")
+        with patch('src.core.checksums.os.replace') as replace:
+            writer.close()
+        replace.assert_not_called()
+        self.assertEqual((other_dir / CHECKSUM_FILENAME).read_text(), "aa  IMG_0001.jpg\nbb  IMG_0002.jpg\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+import tempfile
+import shutil
+
+from src.core import DateExtractor, FileProcessor
+
+class TestDateExtractor(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.photo_dir = Path(self.temp_dir) / "input"
+        self.photo_dir.mkdir()
+        # 只有部分连拍照片带有EXIF日期
+        self.exif_dates = {
+            'IMG_0001.jpg': datetime(2023, 1, 1, 10, 0, 0),
+            'IMG_0005.jpg': datetime(2023, 2, 1, 10, 0, 0),
+        }
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def create_files(self, names):
+        files = []
+        for name in names:
+            file_path = self.photo_dir / name
+            file_path.write_bytes(b'')
+            files.append(file_path)
+        return files
+        
+    def fake_exif(self, file_path: str):
+        return self.exif_dates.get(Path(file_path).name)
+        
+    def test_infer_nearest_dates(self):
+        """测试使用排序位置最近的有日期的文件，距离相同时优先前一个"""
+        files = self.create_files([f'IMG_000{i}.jpg' for i in range(1, 7)])
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif) as reader:
+            dates = DateExtractor().infer_dates(files)
+        self.assertEqual([dates[f].month for f in files], [1, 1, 1, 2, 2, 2])
+        # 每个文件只读取一次
+        self.assertEqual(reader.call_count, len(files))
+        
+    def test_max_sequence_gap(self):
+        """测试序号差超过限制时不推断日期"""
+        files = self.create_files(['IMG_0001.jpg', 'IMG_0002.jpg', 'IMG_0004.jpg', 'IMG_0005.jpg'])
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif):
+            dates = DateExtractor(max_sequence_gap=1).infer_dates(files)
+        self.assertEqual(dates[files[1]], self.exif_dates['IMG_0001.jpg'])
+        self.assertEqual(dates[files[2]], self.exif_dates['IMG_0005.jpg'])
+        
+        self.exif_dates = {'IMG_0001.jpg': datetime(2023, 1, 1)}
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif):
+            dates = DateExtractor(max_sequence_gap=1).infer_dates(files)
+        self.assertIsNone(dates[files[2]])
+        
+    def test_related_files_use_cache(self):
+        """测试多次从相关文件推断时不重复读取EXIF"""
+        files = self.create_files(['IMG_0001.jpg', 'IMG_0002.jpg', 'IMG_0003.jpg'])
+        extractor = DateExtractor()
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif) as reader:
+            for file_path in files:
+                self.assertEqual(extractor.get_creation_date(file_path, files), self.exif_dates['IMG_0001.jpg'])
+        self.assertEqual(reader.call_count, len(files))
+        
+    def test_process_directory_infers_dates(self):
+        """测试整理目录时没有日期的文件按相邻文件归档"""
+        self.create_files(['IMG_0001.jpg', 'IMG_0002.jpg', 'IMG_0005.jpg', 'IMG_0006.jpg'])
+        output_dir = Path(self.temp_dir) / "output"
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif) as reader:
+            result = FileProcessor().process_directory(self.photo_dir, output_dir)
+        self.assertEqual(result['success'], 4)
+        self.assertTrue((output_dir / "2023" / "01" / "IMG_0002.jpg").exists())
+        self.assertTrue((output_dir / "2023" / "02" / "IMG_0006.jpg").exists())
+        self.assertEqual(reader.call_count, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+import os
+import tempfile
+import shutil
+
+from src.core import FileProcessor
+from src.core.destination_index import DestinationIndex
+
+class TestDestinationIndex(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.month_dir = Path(self.temp_dir) / "2024" / "03"
+        self.month_dir.mkdir(parents=True)
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def test_allocate_matches_probing(self):
+        """测试分配结果与逐个探测的第一个空闲文件名一致"""
+        for name in ("IMG_0001.jpg", "IMG_0001_2.jpg", "other.png"):
+            (self.month_dir / name).write_bytes(b'x')
+        index = DestinationIndex()
+        source = Path("IMG_0001.jpg")
+        results = [index.allocate(self.month_dir, source) for _ in range(3)]
+        self.assertEqual(results, [
+            (self.month_dir / "IMG_0001_1.jpg", 1),
+            (self.month_dir / "IMG_0001_3.jpg", 3),
+            (self.month_dir / "IMG_0001_4.jpg", 4),
+        ])
+        self.assertEqual(index.allocate(self.month_dir, Path("new.jpg")), (self.month_dir / "new.jpg", 0))
+        
+    def test_missing_directory(self):
+        """测试尚未创建的目标目录视为空目录"""
+        index = DestinationIndex()
+        missing = Path(self.temp_dir) / "Unsorted"
+        self.assertEqual(index.allocate(missing, Path("scan.png")), (missing / "scan.png", 0))
+        self.assertEqual(index.allocate(missing, Path("scan.png")), (missing / "scan_1.png", 1))
+        self.assertFalse(missing.exists())
+        
+    def test_case_insensitive(self):
+        """测试只有大小写不同的文件名视为冲突"""
+        (self.month_dir / "IMG_0001.JPG").write_bytes(b'x')
+        index = DestinationIndex()
+        self.assertEqual(index.allocate(self.month_dir, Path("img_0001.jpg"))[1], 1)
+        
+    def test_reserve(self):
+        """测试登记的路径不会再被分配"""
+        index = DestinationIndex()
+        index.reserve(self.month_dir / "IMG_0001.jpg")
+        self.assertTrue(index.contains(self.month_dir / "IMG_0001.jpg"))
+        self.assertEqual(index.allocate(self.month_dir, Path("IMG_0001.jpg"))[1], 1)
+        
+    def test_scans_each_directory_once(self):
+        """测试大量同名文件时每个目录只列出一次，不逐个stat"""
+        index = DestinationIndex()
+        with patch('src.core.destination_index.os.scandir', wraps=os.scandir) as scandir, \
+                patch.object(Path, 'exists') as exists:
+            for _ in range(200):
+                index.allocate(self.month_dir, Path("IMG_0001.JPG"))
+        self.assertEqual(scandir.call_count, 1)
+        exists.assert_not_called()
+        self.assertEqual(index.allocate(self.month_dir, Path("IMG_0001.JPG"))[1], 200)
+        
+    def test_file_created_after_indexing_is_not_overwritten(self):
+        """测试目录建立索引后手动放入的同名文件不会被单文件整理覆盖"""
+        input_dir = Path(self.temp_dir) / "input"
+        input_dir.mkdir()
+        for name in ("a.jpg", "b.jpg"):
+            (input_dir / name).write_bytes(name.encode())
+        processor = FileProcessor()
+        date = datetime(2024, 3, 13, 12, 0)
+        self.assertTrue(processor.process_file(input_dir / "a.jpg", Path(self.temp_dir), date))
+        (self.month_dir / "b.jpg").write_bytes(b'PRECIOUS')
+        self.assertTrue(processor.process_file(input_dir / "b.jpg", Path(self.temp_dir), date))
+        self.assertEqual((self.month_dir / "b.jpg").read_bytes(), b'PRECIOUS')
+        self.assertEqual((self.month_dir / "b_1.jpg").read_bytes(), b'b.jpg')
+        self.assertFalse(list(self.month_dir.glob('.*.partial')))
+        
+    def test_execute_does_not_probe_destinations(self):
+        """测试执行计划时不逐个检查目标文件是否存在，冲突由发布时的FileExistsError发现"""
+        input_dir = Path(self.temp_dir) / "input"
+        input_dir.mkdir()
+        for i in range(5):
+            (input_dir / f"IMG_000{i}.jpg").write_bytes(f"photo {i}".encode())
+        processor = FileProcessor()
+        with patch('src.core.date_extractor.read_exif_datetime', return_value=datetime(2024, 3, 13, 12, 0)):
+            plan = processor.plan_directory(input_dir, Path(self.temp_dir))
+        (self.month_dir / "IMG_0003.jpg").write_bytes(b'PRECIOUS')
+        with patch.object(Path, 'exists', autospec=True, side_effect=Path.exists) as exists:
+            result = processor.execute_plan(plan['operations'])
+        self.assertFalse([call for call in exists.call_args_list if call.args[0].parent == self.month_dir])
+        self.assertEqual(result['success'], 4)
+        self.assertEqual((self.month_dir / "IMG_0003.jpg").read_bytes(), b'PRECIOUS')
+        self.assertFalse(list(self.month_dir.glob('.*.partial')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+
+from src.core import FileProcessor
+from src.core.directories import DirectoryRegistry
+from tests.unit.core.helpers import EXIF_DATE, TempDirTestCase
+
+class TestDirectoryRegistry(TempDirTestCase):
+    def test_each_directory_is_created_once(self):
+        """测试已登记的目录不再创建，上级目录已登记时只创建最后一级"""
+        registry = DirectoryRegistry()
+        month = self.output_dir / "2024" / "03"
+        registry.ensure(month)
+        self.assertTrue(month.is_dir())
+        with patch('src.core.directories.os.makedirs', wraps=os.makedirs) as makedirs, \
+             patch('src.core.directories.os.mkdir', wraps=os.mkdir) as mkdir:
+            for _ in range(5):
+                registry.ensure(month)
+            registry.ensure(self.output_dir / "2024" / "04")
+        makedirs.assert_not_called()
+        mkdir.assert_called_once_with(str(self.output_dir / "2024" / "04"))
+        
+    def test_precreate_and_dir_fd(self):
+        """测试按计划预先创建目录，目录描述符只打开一次"""
+        registry = DirectoryRegistry()
+        directories = [self.output_dir / "2024" / f"{m:02d}" for m in (3, 1, 2, 1)]
+        self.assertEqual(registry.precreate(directories), 3)
+        self.assertEqual(registry.precreate(directories), 0)
+        self.assertTrue(all(d.is_dir() for d in directories))
+        
+        fd = registry.dir_fd(directories[0])
+        if fd is not None:
+            self.assertEqual(registry.dir_fd(directories[0]), fd)
+            self.assertEqual(len(registry.fds), 1)
+        registry.close()
+        self.assertEqual(registry.fds, {})
+        
+    def test_open_directory_limit(self):
+        """测试打开的目录数达到上限后返回None"""
+        registry = DirectoryRegistry(max_open=1)
+        first = registry.dir_fd(self.output_dir / "a")
+        self.assertIsNone(registry.dir_fd(self.output_dir / "b"))
+        self.assertTrue((self.output_dir / "b").is_dir())
+        if first is not None:
+            self.assertEqual(len(registry.fds), 1)
+        registry.close()
+        
+    def test_batch_run_creates_month_directories_once(self):
+        """测试批量整理时每个月份目录只创建一次，运行结束后释放登记表"""
+        for i in range(1, 6):
+            (self.input_dir / f"IMG_000{i}.jpg").write_bytes(f"photo {i}".encode())
+            
+        processor = FileProcessor()
+        with patch.object(DirectoryRegistry, '_create', autospec=True, side_effect=DirectoryRegistry._create) as create:
+            result = self.organize(processor=processor)
+        self.assertEqual(result['success'], 5)
+        self.assertEqual(len(list((self.output_dir / "2024" / "03").glob("IMG_*.jpg"))), 5)
+        created = [call.args[1] for call in create.call_args_list]
+        self.assertEqual(created, [str(self.output_dir / "2024" / "03")])
+        self.assertIsNone(processor.directories)
+        
+    def test_single_file_path_holds_no_directories(self):
+        """测试单文件整理不保留目录描述符和已创建目录的记录，输出目录被删除后仍能重新创建"""
+        source = self.input_dir / "IMG_0001.jpg"
+        source.write_bytes(b'photo')
+        processor = FileProcessor()
+        self.assertTrue(processor.process_file(source, self.output_dir, EXIF_DATE))
+        self.assertIsNone(processor.directories)
+        
+        shutil.rmtree(self.output_dir)
+        self.assertTrue(processor.process_file(source, self.output_dir, EXIF_DATE))
+        self.assertEqual(len(list((self.output_dir / "2024" / "03").glob("IMG_0001*.jpg"))), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import shutil
+from PIL import Image
+
+from src.core import FileProcessor, PhotoSimilarityFinder
+from src.core.duplicates import find_exact_duplicates, PARTIAL_DIGEST_SIZE
+
+class TestExactDuplicates(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def create_file(self, filename: str, content: bytes) -> str:
+        """创建测试文件"""
+        file_path = self.temp_dir / filename
+        file_path.write_bytes(content)
+        return str(file_path)
+        
+    def test_small_files(self):
+        """测试小文件按内容分组"""
+        a = self.create_file("a.jpg", b"same")
+        b = self.create_file("b.jpg", b"same")
+        self.create_file("c.jpg", b"diff")
+        self.create_file("d.jpg", b"longer")
+        
+        duplicates = find_exact_duplicates([str(p) for p in self.temp_dir.iterdir()])
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(sorted(next(iter(duplicates.values()))), [a, b])
+        
+    def test_same_head_and_tail_different_middle(self):
+        """测试头尾相同但中间不同的大文件不会被误判"""
+        head = b"h" * PARTIAL_DIGEST_SIZE
+        tail = b"t" * PARTIAL_DIGEST_SIZE
+        a = self.create_file("a.mov", head + b"1" * 1000 + tail)
+        b = self.create_file("b.mov", head + b"2" * 1000 + tail)
+        c = self.create_file("c.mov", head + b"1" * 1000 + tail)
+        
+        duplicates = find_exact_duplicates([a, b, c])
+        self.assertEqual(list(duplicates.values()), [[a, c]])
+        
+    def test_only_same_size_files_are_read(self):
+        """测试大小唯一的文件不会被读取"""
+        a = self.create_file("a.jpg", b"x" * 10)
+        b = self.create_file("b.jpg", b"x" * 20)
+        with patch('src.core.duplicates.file_digest') as mock_digest:
+            self.assertEqual(find_exact_duplicates([a, b]), {})
+            mock_digest.assert_not_called()
+            
+    def test_finder_exact_prepass_hashes_once(self):
+        """测试预处理后内容相同的照片只计算一次哈希"""
+        Image.new('RGB', (64, 64), (10, 20, 30)).save(self.temp_dir / "a.png")
+        shutil.copy(self.temp_dir / "a.png", self.temp_dir / "b.png")
+        
+        finder = PhotoSimilarityFinder()
+        self.assertEqual(len(finder.find_exact_duplicates(str(self.temp_dir))), 1)
+        with patch.object(finder, 'compute_hash', wraps=finder.compute_hash) as mock_hash:
+            result = finder.find_similar_photos(str(self.temp_dir), exact_prepass=True)
+            self.assertEqual(mock_hash.call_count, 1)
+        self.assertEqual(len(next(iter(result.values()))), 2)
+        
+    def test_process_directory_skips_duplicates(self):
+        """测试批量整理时跳过完全相同的文件"""
+        input_dir = self.temp_dir / "input"
+        output_dir = self.temp_dir / "output"
+        (input_dir / "sub").mkdir(parents=True)
+        (input_dir / "2024-03-01 a.jpg").write_bytes(b"photo")
+        (input_dir / "sub" / "2024-03-01 a.jpg").write_bytes(b"photo")
+        
+        result = FileProcessor().process_directory(input_dir, output_dir, skip_duplicates=True)
+        self.assertEqual(result['duplicates'], 1)
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(len(list((output_dir / "2024" / "03").iterdir())), 1)
+
+if __name__ == '__main__':
+    unittest.main()
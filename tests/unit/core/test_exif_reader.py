@@ -0,0 +1,103 @@
+import unittest
+from pathlib import Path
+import tempfile
+import shutil
+import struct
+from datetime import datetime, timedelta, timezone
+from PIL import Image
+import piexif
+
+from src.core import DateExtractor
+from src.core.exif_reader import read_exif_datetime, parse_exif_datetime
+
+class TestExifReader(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.photo_dir = Path(self.temp_dir)
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def create_image_with_exif(self, filename: str, exif_tags: dict, fmt: str = 'JPEG') -> Path:
+        """创建带有EXIF信息的测试图片"""
+        file_path = self.photo_dir / filename
+        exif_bytes = piexif.dump({'0th': {piexif.ImageIFD.Make: b'Test'}, 'Exif': exif_tags})
+        Image.new('RGB', (64, 64), (255, 0, 0)).save(file_path, fmt, exif=exif_bytes)
+        return file_path
+        
+    def test_jpeg_datetime_original(self):
+        """测试读取JPEG的拍摄时间"""
+        image = self.create_image_with_exif("a.jpg", {
+            piexif.ExifIFD.DateTimeOriginal: b'2023:05:06 07:08:09'
+        })
+        self.assertEqual(read_exif_datetime(str(image)), datetime(2023, 5, 6, 7, 8, 9))
+        
+    def test_subsec_and_offset(self):
+        """测试亚秒和时区偏移"""
+        image = self.create_image_with_exif("a.jpg", {
+            piexif.ExifIFD.DateTimeOriginal: b'2023:05:06 07:08:09',
+            piexif.ExifIFD.SubSecTimeOriginal: b'25',
+            piexif.ExifIFD.OffsetTimeOriginal: b'+08:00'
+        })
+        date = read_exif_datetime(str(image))
+        self.assertEqual(date, datetime(2023, 5, 6, 7, 8, 9, 250000,
+                                        tzinfo=timezone(timedelta(hours=8))))
+        # 目录按拍摄地的当地时间划分
+        self.assertEqual((date.year, date.month, date.hour), (2023, 5, 7))
+        
+    def test_png_exif(self):
+        """测试读取PNG eXIf块中的拍摄时间"""
+        image = self.create_image_with_exif("a.png", {
+            piexif.ExifIFD.DateTimeOriginal: b'2022:01:02 03:04:05'
+        }, fmt='PNG')
+        self.assertEqual(read_exif_datetime(str(image)), datetime(2022, 1, 2, 3, 4, 5))
+        
+    def test_little_endian_tiff(self):
+        """测试Intel字节序的TIFF结构"""
+        value = b'2021:12:31 23:59:58\0'
+        # IFD0只有指向Exif子IFD的条目，Exif子IFD只有DateTimeOriginal
+        tiff = b'II' + struct.pack('<HI', 42, 8)
+        tiff += struct.pack('<H', 1) + struct.pack('<HHII', 0x8769, 4, 1, 26) + struct.pack('<I', 0)
+        tiff += struct.pack('<H', 1) + struct.pack('<HHII', 0x9003, 2, len(value), 44) + struct.pack('<I', 0)
+        tiff += value
+        app1 = b'Exif\0\0' + tiff
+        data = b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1 + b'\xff\xd9'
+        image = self.photo_dir / "le.jpg"
+        image.write_bytes(data)
+        self.assertEqual(read_exif_datetime(str(image)), datetime(2021, 12, 31, 23, 59, 58))
+        
+    def test_pixel_data_not_needed(self):
+        """测试只需要文件头部：截断图像数据后仍能读取拍摄时间"""
+        image = self.create_image_with_exif("a.jpg", {
+            piexif.ExifIFD.DateTimeOriginal: b'2023:05:06 07:08:09'
+        })
+        data = image.read_bytes()
+        sos = data.index(b'\xff\xda')
+        image.write_bytes(data[:sos + 4])
+        self.assertEqual(read_exif_datetime(str(image)), datetime(2023, 5, 6, 7, 8, 9))
+        
+    def test_missing_exif(self):
+        """测试没有EXIF信息的图片"""
+        image = self.photo_dir / "plain.jpg"
+        Image.new('RGB', (64, 64)).save(image)
+        self.assertIsNone(read_exif_datetime(str(image)))
+        self.assertIsNone(DateExtractor().get_creation_date_from_exif(str(image)))
+        
+    def test_invalid_datetime(self):
+        """测试无效的日期值"""
+        image = self.create_image_with_exif("a.jpg", {
+            piexif.ExifIFD.DateTimeOriginal: b'0000:00:00 00:00:00'
+        })
+        self.assertIsNone(DateExtractor().get_creation_date_from_exif(str(image)))
+        
+    def test_parse_exif_datetime(self):
+        """测试解析日期字符串"""
+        self.assertEqual(parse_exif_datetime('2020:02:03 04:05:06', '1234567'),
+                         datetime(2020, 2, 3, 4, 5, 6, 123456))
+        self.assertEqual(parse_exif_datetime('2020:02:03 04:05:06', None, '-05:30').utcoffset(),
+                         -timedelta(hours=5, minutes=30))
+
+if __name__ == '__main__':
+    unittest.main()
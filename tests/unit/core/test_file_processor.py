@@ -70,6 +70,47 @@ class TestFileProcessor(unittest.TestCase):
         self.assertFalse(result)
         self.assertFalse(any(self.output_dir.iterdir()))
         
+    def create_burst(self):
+        """创建多个子目录中同名且同一天拍摄的文件"""
+        for folder in ("a", "b", "c"):
+            (self.input_dir / folder).mkdir()
+            for i in range(5):
+                (self.input_dir / folder / f"IMG_{i}.jpg").write_bytes(f"{folder}{i}".encode())
+                
+    def read_output(self, output_dir: Path) -> dict:
+        # 忽略输出目录中的日志等隐藏文件
+        return {str(p.relative_to(output_dir)): p.read_bytes() for p in output_dir.rglob('*')
+                if p.is_file() and not p.name.startswith('.')}
+        
+    @patch('src.core.date_extractor.read_exif_datetime', return_value=datetime(2024, 3, 13, 12, 0))
+    def test_parallel_pipeline_is_deterministic(self, _):
+        """测试并行复制时冲突编号与串行处理一致"""
+        self.create_burst()
+        serial_dir = Path(self.temp_dir) / "serial"
+        parallel_dir = Path(self.temp_dir) / "parallel"
+        
+        serial = FileProcessor(metadata_workers=1, copy_workers=1).process_directory(self.input_dir, serial_dir)
+        progress = []
+        parallel = FileProcessor(metadata_workers=4, copy_workers=4).process_directory(
+            self.input_dir, parallel_dir, lambda value, message: progress.append(value)
+        )
+        
+        self.assertEqual(serial['success'], 15)
+        self.assertEqual(parallel['success'], 15)
+        self.assertEqual(self.read_output(serial_dir), self.read_output(parallel_dir))
+        self.assertEqual(len(progress), 15)
+        self.assertEqual(progress[-1], 1.0)
+        
+    @patch('src.core.file_processor.PENDING_COPIES_PER_WORKER', 1)
+    @patch('src.core.date_extractor.read_exif_datetime', return_value=None)
+    def test_pipeline_backpressure(self, _):
+        """测试复制队列已满时等待，且未分类文件同样被复制"""
+        self.create_burst()
+        result = FileProcessor(copy_workers=2).process_directory(self.input_dir, self.output_dir)
+        self.assertEqual(result['processed'], 15)
+        self.assertEqual(result['success'], 0)
+        self.assertEqual(len(list((self.output_dir / "Unsorted").iterdir())), 15)
+        
     @patch('src.core.file_processor.PhotoSimilarityFinder')
     def test_find_similar_photos(self, mock_finder):
         """测试查找相似照片"""
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import shutil
+import os
+from PIL import Image
+
+from src.core import PhotoSimilarityFinder
+from src.core.hash_cache import HashCache
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.photo_dir = Path(self.temp_dir) / "photos"
+        self.photo_dir.mkdir()
+        self.cache_path = Path(self.temp_dir) / "cache.sqlite3"
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def create_test_image(self, filename: str, color=(255, 0, 0)) -> Path:
+        """创建测试图片"""
+        file_path = self.photo_dir / filename
+        Image.new('RGB', (64, 64), color).save(file_path)
+        return file_path
+        
+    def test_get_and_put(self):
+        """测试按文件指纹读写缓存"""
+        image = self.create_test_image("a.png")
+        with HashCache(self.cache_path) as cache:
+            stat = os.stat(image)
+            self.assertIsNone(cache.get(str(image), 'average', stat))
+            cache.put(str(image), 'average', stat, 'ffff')
+            self.assertEqual(cache.get(str(image), 'average', stat), 'ffff')
+            # 不同算法互不影响
+            self.assertIsNone(cache.get(str(image), 'difference', stat))
+            
+            # 文件修改后缓存失效
+            os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            self.assertIsNone(cache.get(str(image), 'average', os.stat(image)))
+            
+    def test_rescan_uses_cache(self):
+        """测试重复扫描时不会重新解码未变化的图片"""
+        for i in range(3):
+            self.create_test_image(f"img{i}.png")
+            
+        finder = PhotoSimilarityFinder(cache_path=str(self.cache_path))
+        first = finder.find_similar_photos(str(self.photo_dir))
+        finder.cache.close()
+        
+        finder = PhotoSimilarityFinder(cache_path=str(self.cache_path))
+        with patch('src.core.similarity.hash_image_file') as mock_hash:
+            second = finder.find_similar_photos(str(self.photo_dir))
+            mock_hash.assert_not_called()
+            
+            second_parallel = finder.find_similar_photos(str(self.photo_dir), workers=2)
+            mock_hash.assert_not_called()
+        finder.cache.close()
+        self.assertEqual(first, second)
+        self.assertEqual(first, second_parallel)
+        
+    def test_prune_deleted_files(self):
+        """测试清理已删除文件的缓存"""
+        keep = self.create_test_image("keep.png")
+        removed = self.create_test_image("removed.png")
+        
+        finder = PhotoSimilarityFinder(cache_path=str(self.cache_path))
+        finder.find_similar_photos(str(self.photo_dir))
+        removed.unlink()
+        finder.find_similar_photos(str(self.photo_dir))
+        
+        rows = finder.cache.conn.execute('SELECT path FROM hashes').fetchall()
+        finder.cache.close()
+        self.assertEqual([r[0] for r in rows], [os.path.abspath(keep)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import subprocess
+import sys
+
+from src.core import FileProcessor
+from src.core.journal import JOURNAL_FILENAME, JOURNAL_SYNC_INTERVAL, Journal
+from src.core.plan import make_operation
+from tests.unit.core.helpers import EXIF_DATE, TempDirTestCase
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+# 在子进程中整理目录，第crash_after次发布文件之前（before）或之后（after）直接退出进程，模拟断电或被强制结束
+CRASH_SCRIPT = '''
+import os, sys
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+sys.path.insert(0, sys.argv[1])
+from src.core import FileProcessor
+from src.core.placement import publish_file
+
+crash_after, placement, when = int(sys.argv[4]), sys.argv[5], sys.argv[6]
+calls = []
+
+def publish(temp_path, target, *args, **kwargs):
+    calls.append(target)
+    if len(calls) >= crash_after and when == 'before':
+        os._exit(1)
+    publish_file(temp_path, target, *args, **kwargs)
+    if len(calls) >= crash_after:
+        os._exit(1)
+
+with patch('src.core.date_extractor.read_exif_datetime', return_value=datetime(2024, 3, 13, 12, 0)), \\
+        patch('src.core.file_processor.publish_file', side_effect=publish), \\
+        patch('src.core.placement.publish_file', side_effect=publish):
+    FileProcessor(copy_workers=1, placement=placement).process_directory(Path(sys.argv[2]), Path(sys.argv[3]))
+'''
+
+class TestJournal(TempDirTestCase):
+    def create_files(self, count: int):
+        # 两个目录中的文件同名，整理后依赖冲突编号区分
+        for folder in ("a", "b"):
+            (self.input_dir / folder).mkdir()
+            for i in range(count // 2):
+                (self.input_dir / folder / f"IMG_{i:04d}.jpg").write_bytes(f"{folder}{i}".encode())
+                
+    def run_and_crash(self, crash_after: int, placement: str = 'auto', when: str = 'before') -> None:
+        result = subprocess.run(
+            [sys.executable, '-c', CRASH_SCRIPT, str(PROJECT_ROOT), str(self.input_dir),
+             str(self.output_dir), str(crash_after), placement, when],
+            capture_output=True
+        )
+        self.assertEqual(result.returncode, 1, result.stderr.decode(errors='ignore'))
+        
+    def resume(self, placement: str = 'auto'):
+        return self.organize(processor=FileProcessor(copy_workers=2, placement=placement))
+        
+    def assert_complete_output(self, count: int) -> None:
+        month_dir = self.output_dir / "2024" / "03"
+        files = sorted(p.name for p in month_dir.iterdir())
+        # 每个源文件恰好一份，没有中断产生的 _2 副本或残留的临时文件
+        self.assertEqual(len(files), count)
+        self.assertFalse([name for name in files if name.endswith('.partial') or name.endswith('_2.jpg')])
+        contents = sorted(p.read_bytes() for p in month_dir.iterdir())
+        expected = sorted(p.read_bytes() for p in self.input_dir.rglob('*.jpg'))
+        self.assertEqual(contents, expected)
+        
+    def test_resume_after_crash_before_sync(self):
+        """测试完成记录尚未落盘时崩溃，重新运行沿用原目标路径"""
+        self.create_files(20)
+        self.run_and_crash(crash_after=8)
+        self.assertTrue(list((self.output_dir / "2024" / "03").glob('.*.partial')))
+        
+        result = self.resume()
+        self.assertEqual(result['completed'], 0)
+        self.assertEqual(result['success'], 20)
+        self.assert_complete_output(20)
+        
+    def test_resume_skips_synced_operations(self):
+        """测试已落盘的完成记录在重新运行时直接跳过"""
+        count = JOURNAL_SYNC_INTERVAL * 2 + 10
+        self.create_files(count)
+        self.run_and_crash(crash_after=JOURNAL_SYNC_INTERVAL + 20)
+        
+        result = self.resume()
+        self.assertGreater(result['completed'], 0)
+        self.assertLess(result['completed'], JOURNAL_SYNC_INTERVAL + 20)
+        self.assertEqual(result['planned'] + result['completed'], count)
+        self.assert_complete_output(count)
+        
+        # 全部完成后再次运行不复制任何文件
+        result = self.resume()
+        self.assertEqual(result['completed'], count)
+        self.assertEqual(result['processed'], 0)
+        
+    def test_move_mode_never_loses_files(self):
+        """测试移动模式在发布前后中断，每次中断后每个文件都还在源目录或输出目录中，重新运行后全部移入输出目录"""
+        self.create_files(20)
+        expected = sorted(p.read_bytes() for p in self.input_dir.rglob('*.jpg'))
+        
+        def surviving():
+            # 隐藏的临时文件不算，中断后照片必须以源文件或最终文件的形式存在
+            files = list(self.input_dir.rglob('*.jpg')) + list(self.output_dir.rglob('*.jpg'))
+            return sorted(set(p.read_bytes() for p in files if not p.name.startswith('.')))
+            
+        for crash_after, when in ((5, 'after'), (3, 'before'), (4, 'after')):
+            self.run_and_crash(crash_after, 'move', when)
+            self.assertEqual(surviving(), expected)
+            
+        self.resume('move')
+        month_dir = self.output_dir / "2024" / "03"
+        self.assertEqual(sorted(p.read_bytes() for p in month_dir.iterdir()), expected)
+        self.assertFalse(list(self.input_dir.rglob('*.jpg')))
+        
+    def test_modified_source_is_processed_again(self):
+        """测试源文件修改后不再视为已完成"""
+        self.input_dir.joinpath("IMG_0001.jpg").write_bytes(b'old')
+        self.resume()
+        source = self.input_dir / "IMG_0001.jpg"
+        source.write_bytes(b'new content')
+        result = self.resume()
+        self.assertEqual(result['completed'], 0)
+        self.assertEqual(result['success'], 1)
+        
+    def test_truncated_journal(self):
+        """测试崩溃时写了一半的日志行被忽略"""
+        self.output_dir.mkdir()
+        source = self.input_dir / "IMG_0001.jpg"
+        source.write_bytes(b'data')
+        op = make_operation(source, self.output_dir / "IMG_0001.jpg", None, None, 0)
+        with Journal(self.output_dir) as journal:
+            journal.begin([op])
+            journal.complete(op)
+        with open(self.output_dir / JOURNAL_FILENAME, 'a', encoding='utf-8') as f:
+            f.write('{"state": "do')
+        journal = Journal(self.output_dir)
+        self.assertTrue(journal.is_completed(source))
+        self.assertFalse(journal.owns(self.output_dir / "IMG_0001.jpg"))
+        
+    def test_file_created_after_planning_is_not_overwritten(self):
+        """测试规划后才出现在目标位置的文件不会被本次运行的操作覆盖"""
+        self.input_dir.joinpath("IMG_0001.jpg").write_bytes(b'new')
+        self.output_dir.mkdir()
+        processor = FileProcessor()
+        journal = Journal(self.output_dir)
+        with patch('src.core.date_extractor.read_exif_datetime', return_value=EXIF_DATE):
+            plan = processor.plan_directory(self.input_dir, self.output_dir, journal=journal)
+        destination = plan['operations'][0]['destination']
+        destination.parent.mkdir(parents=True)
+        destination.write_bytes(b'PRECIOUS')
+        result = processor.execute_plan(plan['operations'], journal=journal)
+        journal.close()
+        self.assertEqual(result['processed'], 1)
+        self.assertEqual(result['success'], 0)
+        self.assertEqual(destination.read_bytes(), b'PRECIOUS')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import os
+
+from src.core.duplicates import file_digest
+from src.core.library_index import LIBRARY_INDEX_FILENAME, LibraryIndex
+from tests.unit.core.helpers import TempDirTestCase
+
+class TestLibraryIndex(TempDirTestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        super().setUp()
+        self.output_dir.mkdir()
+        
+    def create_dump(self, name: str, contents: dict) -> Path:
+        dump = Path(self.temp_dir) / name
+        dump.mkdir()
+        for filename, data in contents.items():
+            (dump / filename).write_bytes(data)
+        return dump
+        
+    def organize_dump(self, input_dir: Path, library_dedup='skip'):
+        return self.organize(input_dir=input_dir, library_dedup=library_dedup)
+        
+    def month_files(self):
+        return sorted(p.name for p in (self.output_dir / "2024" / "03").iterdir())
+        
+    def test_overlapping_dumps_are_skipped(self):
+        """测试重叠的存储卡备份只整理新增的文件"""
+        self.organize_dump(self.create_dump("dump1", {'IMG_1234.JPG': b'photo a', 'IMG_1235.JPG': b'photo b'}))
+        result = self.organize_dump(self.create_dump("dump2", {'IMG_1234.JPG': b'photo a', 'IMG_1236.JPG': b'photo c'}))
+        self.assertEqual(result['library_duplicates'], 1)
+        self.assertEqual(result['processed'], 1)
+        self.assertEqual(self.month_files(), ['IMG_1234.JPG', 'IMG_1235.JPG', 'IMG_1236.JPG'])
+        
+    def test_same_size_different_content(self):
+        """测试大小相同但内容不同的文件照常整理"""
+        self.organize_dump(self.create_dump("dump1", {'IMG_1234.JPG': b'photo a'}))
+        result = self.organize_dump(self.create_dump("dump2", {'IMG_1234.JPG': b'photo x'}))
+        self.assertEqual(result['library_duplicates'], 0)
+        self.assertEqual(self.month_files(), ['IMG_1234.JPG', 'IMG_1234_1.JPG'])
+        
+    def test_hardlink_mode(self):
+        """测试硬链接模式下重复文件链接到库中已有的文件"""
+        self.organize_dump(self.create_dump("dump1", {'IMG_1234.JPG': b'photo a'}))
+        result = self.organize_dump(self.create_dump("dump2", {'IMG_9999.JPG': b'photo a'}), 'hardlink')
+        self.assertEqual(result['library_duplicates'], 0)
+        month_dir = self.output_dir / "2024" / "03"
+        self.assertEqual((month_dir / "IMG_9999.JPG").stat().st_ino, (month_dir / "IMG_1234.JPG").stat().st_ino)
+        
+    def test_only_size_matches_are_hashed(self):
+        """测试只计算大小相同的文件的摘要，未变化的文件沿用保存的摘要"""
+        self.organize_dump(self.create_dump("dump1", {'IMG_0001.JPG': b'a' * 10, 'IMG_0002.JPG': b'b' * 20}))
+        with patch('src.core.library_index.file_digest', wraps=lambda p: p) as library_digest, \
+                patch('src.core.file_processor.file_digest', return_value='new') as input_digest:
+            self.organize_dump(self.create_dump("dump2", {'IMG_0003.JPG': b'c' * 30}))
+        library_digest.assert_not_called()
+        input_digest.assert_not_called()
+        
+        self.organize_dump(self.create_dump("dump3", {'IMG_0004.JPG': b'a' * 10}))
+        with patch('src.core.library_index.file_digest') as library_digest:
+            result = self.organize_dump(self.create_dump("dump4", {'IMG_0005.JPG': b'a' * 10}))
+        library_digest.assert_not_called()
+        self.assertEqual(result['library_duplicates'], 1)
+        
+    def test_modified_library_file_is_rehashed(self):
+        """测试库中文件变化后保存的摘要失效"""
+        self.organize_dump(self.create_dump("dump1", {'IMG_0001.JPG': b'a' * 10}))
+        self.organize_dump(self.create_dump("dump2", {'IMG_0001.JPG': b'a' * 10}))
+        library_file = self.output_dir / "2024" / "03" / "IMG_0001.JPG"
+        old_digest = file_digest(str(library_file))
+        library_file.write_bytes(b'b' * 10)
+        index = LibraryIndex(self.output_dir, {'.jpg'})
+        self.assertTrue((self.output_dir / LIBRARY_INDEX_FILENAME).exists())
+        self.assertIsNone(index.find(10, old_digest))
+        self.assertEqual(index.find(10, file_digest(str(library_file))), library_file)
+        
+        result = self.organize_dump(self.create_dump("dump3", {'IMG_0002.JPG': b'a' * 10}))
+        self.assertEqual(result['library_duplicates'], 0)
+        
+    def test_unchanged_directories_are_not_listed(self):
+        """测试再次运行时只重新列出修改时间变化的目录，不stat其中的文件"""
+        self.organize_dump(self.create_dump("dump1", {'IMG_0001.JPG': b'a' * 10, 'IMG_0002.JPG': b'b' * 20}))
+        self.organize_dump(self.create_dump("dump2", {'IMG_0003.JPG': b'c' * 30}))
+        with patch('src.core.library_index.os.scandir', wraps=os.scandir) as scandir:
+            index = LibraryIndex(self.output_dir, {'.jpg'})
+        listed = [Path(call.args[0]) for call in scandir.call_args_list]
+        # 输出目录本身因写入索引等文件而变化，年月目录沿用保存的记录
+        self.assertEqual(listed, [self.output_dir])
+        self.assertEqual(len(index.entries), 3)
+        
+        (self.output_dir / "2024" / "03" / "IMG_0004.JPG").write_bytes(b'd' * 40)
+        with patch('src.core.library_index.os.scandir', wraps=os.scandir) as scandir:
+            index = LibraryIndex(self.output_dir, {'.jpg'})
+        self.assertIn(self.output_dir / "2024" / "03", [Path(call.args[0]) for call in scandir.call_args_list])
+        self.assertTrue(index.has_size(40))
+
+if __name__ == '__main__':
+    unittest.main()
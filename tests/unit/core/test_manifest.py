@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+
+from src.core import duplicates, file_processor
+from src.core.journal import JOURNAL_FILENAME
+from src.core.manifest import MANIFEST_FILENAME, SourceManifest
+from tests.unit.core.helpers import TempDirTestCase
+
+class TestSourceManifest(TempDirTestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        super().setUp()
+        self.exif_dates = {'IMG_0001.jpg': datetime(2024, 3, 13, 12, 0), 'IMG_0002.jpg': datetime(2024, 3, 14, 12, 0)}
+        self.exif_calls = []
+        for name in ('IMG_0001.jpg', 'IMG_0002.jpg'):
+            (self.input_dir / name).write_bytes(name.encode())
+            
+    def fake_exif(self, file_path: str):
+        self.exif_calls.append(Path(file_path).name)
+        return self.exif_dates.get(Path(file_path).name) if 'input' in file_path else None
+        
+    def organize(self, **options):
+        """整理并记录读取了EXIF的文件"""
+        self.exif_calls = []
+        return super().organize(self.fake_exif, **options)
+        
+    def test_only_new_files_are_processed(self):
+        """测试再次运行时未变化的文件不读取EXIF也不复制，新文件沿用相邻文件的日期"""
+        self.organize()
+        self.assertTrue((self.output_dir / MANIFEST_FILENAME).exists())
+        self.assertFalse((self.output_dir / JOURNAL_FILENAME).exists())
+        
+        (self.input_dir / "IMG_0003.jpg").write_bytes(b'new photo without exif')
+        result = self.organize()
+        self.assertEqual(self.exif_calls, ['IMG_0003.jpg'])
+        self.assertEqual((result['processed'], result['success'], result['completed']), (1, 1, 2))
+        self.assertEqual(result['output_stats']['images']['count'], 3)
+        self.assertTrue((self.output_dir / "2024" / "03" / "IMG_0003.jpg").exists())
+        
+        result = self.organize()
+        self.assertEqual(self.exif_calls, [])
+        self.assertEqual(result['processed'], 0)
+        
+    def test_modified_file_is_processed_again(self):
+        """测试修改过的源文件重新整理"""
+        self.organize()
+        (self.input_dir / "IMG_0002.jpg").write_bytes(b'edited')
+        result = self.organize()
+        self.assertEqual(self.exif_calls, ['IMG_0002.jpg'])
+        self.assertEqual(result['processed'], 1)
+        self.assertEqual((self.output_dir / "2024" / "03" / "IMG_0002_1.jpg").read_bytes(), b'edited')
+        
+    def test_removed_files_are_pruned(self):
+        """测试源文件删除后清单中的记录一并删除"""
+        self.organize()
+        (self.input_dir / "IMG_0001.jpg").unlink()
+        self.organize()
+        entries = SourceManifest(self.output_dir).entries
+        self.assertEqual([Path(path).name for path in entries], ['IMG_0002.jpg'])
+        self.assertEqual(next(iter(entries.values()))['date_source'], 'exif')
+        
+    def test_skipped_duplicates_are_not_digested_again(self):
+        """测试作为重复文件跳过的源文件记入清单，再次运行时不再计算摘要，关闭去重后重新整理"""
+        (self.input_dir / "copy.jpg").write_bytes(b'IMG_0001.jpg')
+        result = self.organize(skip_duplicates=True, library_dedup='skip')
+        self.assertEqual((result['success'], result['duplicates']), (2, 1))
+        (self.input_dir / "again.jpg").write_bytes(b'IMG_0002.jpg')
+        result = self.organize(skip_duplicates=True, library_dedup='skip')
+        self.assertEqual((result['processed'], result['duplicates'], result['library_duplicates']), (0, 1, 1))
+        entries = {Path(path).name: record for path, record in SourceManifest(self.output_dir).entries.items()}
+        self.assertEqual((entries['copy.jpg']['skipped'], Path(entries['copy.jpg']['existing']).name),
+                         ('duplicate', 'IMG_0001.jpg'))
+        self.assertEqual((entries['again.jpg']['skipped'], Path(entries['again.jpg']['existing']).name),
+                         ('library', 'IMG_0002.jpg'))
+        
+        digested = []
+        def record(digest):
+            return lambda file_path, *args: digested.append(Path(file_path).name) or digest(file_path, *args)
+        with patch.object(duplicates, 'file_digest', side_effect=record(duplicates.file_digest)), \
+                patch.object(duplicates, 'partial_digest', side_effect=record(duplicates.partial_digest)), \
+                patch.object(file_processor, 'file_digest', side_effect=record(duplicates.file_digest)):
+            result = self.organize(skip_duplicates=True, library_dedup='skip')
+        self.assertEqual(digested, [])
+        self.assertEqual(self.exif_calls, [])
+        self.assertEqual((result['processed'], result['completed']), (0, 2))
+        self.assertEqual((result['duplicates'], result['library_duplicates']), (1, 1))
+        
+        result = self.organize()
+        self.assertEqual((result['processed'], result['success']), (2, 2))
+        entries = {Path(path).name: record for path, record in SourceManifest(self.output_dir).entries.items()}
+        self.assertNotIn('skipped', entries['copy.jpg'])
+        
+    def test_not_incremental(self):
+        """测试关闭增量整理时不保存清单"""
+        self.organize(incremental=False)
+        self.assertFalse((self.output_dir / MANIFEST_FILENAME).exists())
+        self.assertTrue((self.output_dir / JOURNAL_FILENAME).exists())
+
+if __name__ == '__main__':
+    unittest.main()
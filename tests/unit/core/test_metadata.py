@@ -0,0 +1,74 @@
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+import os
+import unittest
+
+from src.core import FileProcessor
+from src.core.metadata import apply_times, file_times, timestamp_ns
+from tests.unit.core.helpers import TempDirTestCase
+
+class TestMetadata(TempDirTestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        super().setUp()
+        self.source_ns = 1600000000 * 10**9
+        
+    def create_source(self, name: str) -> Path:
+        path = self.input_dir / name
+        path.write_bytes(name.encode())
+        os.utime(path, ns=(self.source_ns, self.source_ns))
+        return path
+        
+    def test_destination_times_and_untouched_sources(self):
+        """测试目标文件时间为拍摄日期，源文件的时间不变"""
+        date = datetime(2024, 3, 13, 12, 30, 15)
+        source = self.create_source("IMG_0001.jpg")
+        result = self.organize({'IMG_0001.jpg': date})
+        self.assertEqual(result['success'], 1)
+        
+        target = self.output_dir / "2024" / "03" / "IMG_0001.jpg"
+        self.assertEqual(target.stat().st_mtime_ns, timestamp_ns(date))
+        self.assertEqual(source.stat().st_mtime_ns, self.source_ns)
+        
+    def test_undated_files_keep_source_times(self):
+        """测试无日期的文件沿用源文件的时间"""
+        self.create_source("notes.jpg")
+        self.organize({}, processor=FileProcessor(placement='copy'))
+        target = self.output_dir / "Unsorted" / "notes.jpg"
+        self.assertEqual(target.stat().st_mtime_ns, self.source_ns)
+        
+    def test_hardlinks_to_source_are_not_retimed(self):
+        """测试与源文件共用inode的硬链接不设置时间，否则会修改源文件"""
+        source = self.create_source("IMG_0001.jpg")
+        self.organize(processor=FileProcessor(placement='hardlink'))
+        target = self.output_dir / "2024" / "03" / "IMG_0001.jpg"
+        self.assertTrue(target.exists())
+        self.assertEqual(source.stat().st_mtime_ns, self.source_ns)
+        
+    def test_apply_times_opens_each_directory_once(self):
+        """测试同一目录的文件只打开一次目录"""
+        entries = []
+        for directory in ("a", "b"):
+            (self.output_dir / directory).mkdir(parents=True)
+            for i in range(3):
+                path = self.output_dir / directory / f"{i}.jpg"
+                path.write_bytes(b'data')
+                entries.append((path, file_times(path, datetime(2024, 1, i + 1))))
+                
+        real_open = os.open
+        opened = []
+        
+        def counting_open(path, *args, **kwargs):
+            opened.append(path)
+            return real_open(path, *args, **kwargs)
+            
+        with patch('src.core.metadata.os.open', side_effect=counting_open):
+            self.assertEqual(apply_times(entries), 6)
+        if os.utime in os.supports_dir_fd:
+            self.assertEqual(len(opened), 2)
+        for path, times in entries:
+            self.assertEqual(path.stat().st_mtime_ns, times[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,23 @@
 import unittest
 from unittest.mock import patch, MagicMock
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import tempfile
 import shutil
 import os
+import io
 from PIL import Image
+import imagehash
+import piexif
 import numpy as np
 
 from src.core import PhotoSimilarityFinder
+from src.core import similarity
+from src.core.similarity import (
+    BKTree, MultiIndexHash, NumpyIndex, cluster_hashes, hamming_distance, mih_pairs, numpy_pairs, popcount64,
+    compute_image_hash, hash_image_file, load_reduced, load_preview_image,
+    make_index, select_backend, HASH_DECODE_SIZE, HASH_FUNCTIONS, NUMPY_BACKEND_MAX_HASHES
+)
 
 class TestPhotoSimilarityFinder(unittest.TestCase):
     def setUp(self):
@@ -87,6 +97,362 @@ class TestPhotoSimilarityFinder(unittest.TestCase):
         
         # 验证结果
         self.assertEqual(len(result), 0)
+        
+    @patch.object(PhotoSimilarityFinder, 'compute_hash')
+    def test_hash_threshold_groups_near_duplicates(self, mock_hash):
+        """测试阈值内的近似哈希会被归为一组"""
+        hashes = {
+            'a.jpg': '0000000000000000',
+            'b.jpg': '0000000000000007',  # 与a相差3位
+            'c.jpg': 'ffffffffffffffff',
+        }
+        for name in hashes:
+            self.create_test_image(name)
+        mock_hash.side_effect = lambda path: hashes[Path(path).name]
+        
+        result = self.finder.find_similar_photos(self.temp_dir, hash_threshold=3)
+        self.assertEqual(len(result), 1)
+        files = next(iter(result.values()))
+        self.assertEqual(sorted(Path(f).name for f in files), ['a.jpg', 'b.jpg'])
+        
+        # 阈值为2时不再相似
+        result = self.finder.find_similar_photos(self.temp_dir, hash_threshold=2)
+        self.assertEqual(result, {})
+        
+    def test_parallel_hashing_matches_serial(self):
+        """测试多进程计算的哈希与串行结果一致"""
+        for i in range(6):
+            self.create_test_image(f"test{i}.png", color=(i * 40, 0, 0))
+        (Path(self.temp_dir) / "broken.jpg").write_bytes(b"not an image")
+        paths = self.finder.collect_image_files(self.temp_dir)
+        
+        serial = list(self.finder.hash_files(paths))
+        parallel = list(self.finder.hash_files(paths, workers=2))
+        unordered = list(self.finder.hash_files(paths, workers=2, ordered=False))
+        
+        self.assertEqual(parallel, serial)
+        self.assertEqual(sorted(unordered), sorted(serial))
+        self.assertIn((str(Path(self.temp_dir) / "broken.jpg"), None), serial)
+        
+    def test_hash_pool_does_not_fork(self):
+        """测试进程池不使用fork启动，GUI的后台线程中也能安全使用"""
+        for i in range(2):
+            self.create_test_image(f"test{i}.png", color=(i * 40, 0, 0))
+        paths = self.finder.collect_image_files(self.temp_dir)
+        with patch('src.core.similarity.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            list(self.finder.hash_files(paths, workers=2))
+        self.assertNotEqual(pool.call_args.kwargs['mp_context'].get_start_method(), 'fork')
+        
+    def test_reduced_decode_matches_full_decode(self):
+        """测试降分辨率解码得到的哈希与全分辨率解码相差在容差内"""
+        rng = np.random.default_rng(3)
+        pattern = (rng.random((24, 32, 3)) * 255).astype('uint8')
+        large = Image.fromarray(pattern).resize((2048, 1536), Image.Resampling.BICUBIC)
+        for filename in ("large.jpg", "large.png"):
+            file_path = Path(self.temp_dir) / filename
+            large.save(file_path)
+            
+            with Image.open(file_path) as img:
+                full_hash = int(str(imagehash.average_hash(img)), 16)
+                reduced = load_reduced(img)
+                # 解码尺寸明显缩小，但不低于哈希所需的尺寸
+                self.assertLessEqual(reduced.width, large.width // 4)
+                self.assertGreaterEqual(min(reduced.size), HASH_DECODE_SIZE)
+                
+            fast_hash = int(compute_image_hash(str(file_path)), 16)
+            self.assertLessEqual(hamming_distance(full_hash, fast_hash), 4)
+            
+    def test_reduced_decode_keeps_small_images(self):
+        """测试小图片不会被缩小"""
+        file_path = self.create_test_image("small.jpg", size=(120, 80))
+        with Image.open(file_path) as img:
+            self.assertEqual(load_reduced(img).size, (120, 80))
+            
+    def test_reduced_decode_other_modes(self):
+        """测试调色板、1位和16位图片也能降分辨率解码，相同的调色板PNG被归为一组"""
+        rng = np.random.default_rng(5)
+        pattern = (rng.random((24, 32, 3)) * 255).astype('uint8')
+        large = Image.fromarray(pattern).resize((1024, 768), Image.Resampling.BICUBIC)
+        images = {
+            'palette': large.convert('P'),
+            'bilevel': large.convert('1'),
+            'sixteen': large.convert('I;16'),
+        }
+        for name, image in images.items():
+            with self.subTest(mode=image.mode):
+                file_path = Path(self.temp_dir) / f"{name}.png"
+                image.save(file_path)
+                with Image.open(file_path) as img:
+                    reduced = load_reduced(img)
+                self.assertGreaterEqual(min(reduced.size), HASH_DECODE_SIZE)
+                self.assertLess(reduced.width, image.width)
+                self.assertIsNotNone(compute_image_hash(str(file_path)))
+                
+        shutil.copy(Path(self.temp_dir) / "palette.png", Path(self.temp_dir) / "palette_copy.png")
+        for name in ("bilevel", "sixteen"):
+            (Path(self.temp_dir) / f"{name}.png").unlink()
+        groups = self.finder.find_similar_photos(Path(self.temp_dir))
+        self.assertEqual(len(groups), 1)
+        
+    def create_image_with_thumbnail(self, filename: str) -> Path:
+        """创建带EXIF内嵌缩略图的JPEG，缩略图内容与主图不同以便区分来源"""
+        thumb_buffer = io.BytesIO()
+        thumb = Image.new('RGB', (160, 120), (0, 0, 0))
+        thumb.paste((255, 255, 255), (0, 0, 80, 120))
+        thumb.save(thumb_buffer, 'JPEG')
+        exif_bytes = piexif.dump({
+            '0th': {}, 'Exif': {}, 'GPS': {}, 'Interop': {},
+            '1st': {piexif.ImageIFD.JPEGInterchangeFormat: 0,
+                    piexif.ImageIFD.JPEGInterchangeFormatLength: 0},
+            'thumbnail': thumb_buffer.getvalue(),
+        })
+        file_path = Path(self.temp_dir) / filename
+        Image.new('RGB', (640, 480), (200, 30, 30)).save(file_path, exif=exif_bytes)
+        return file_path
+        
+    def test_exif_thumbnail_fast_path(self):
+        """测试开启EXIF缩略图模式时使用内嵌缩略图计算哈希并记录来源"""
+        with_thumb = self.create_image_with_thumbnail("with_thumb.jpg")
+        without_thumb = self.create_test_image("plain.jpg")
+        
+        finder = PhotoSimilarityFinder(use_exif_thumbnail=True)
+        thumb_hash = finder.compute_hash(str(with_thumb))
+        finder.compute_hash(str(without_thumb))
+        self.assertEqual(finder.hash_sources[str(with_thumb)], 'thumbnail')
+        self.assertEqual(finder.hash_sources[str(without_thumb)], 'full')
+        # 缩略图左白右黑，主图为纯色，两者哈希不同
+        self.assertNotEqual(thumb_hash, compute_image_hash(str(with_thumb)))
+        
+        # 默认模式不读取缩略图
+        self.finder.compute_hash(str(with_thumb))
+        self.assertEqual(self.finder.hash_sources[str(with_thumb)], 'full')
+        
+    def test_preview_from_exif_thumbnail(self):
+        """测试预览优先使用EXIF缩略图，并保持宽高比"""
+        with_thumb = self.create_image_with_thumbnail("with_thumb.jpg")
+        preview, source = load_preview_image(str(with_thumb), 100, use_exif_thumbnail=True)
+        self.assertEqual(source, 'thumbnail')
+        self.assertEqual(preview.size, (100, 75))
+        self.assertEqual(preview.mode, 'RGB')
+        
+        preview, source = load_preview_image(str(with_thumb), 100)
+        self.assertEqual(source, 'full')
+        self.assertEqual(preview.size, (100, 75))
+        
+    def test_multiple_hashes_in_one_pass(self):
+        """测试一次解码计算全部哈希算法"""
+        file_path = self.create_test_image("test.jpg", size=(300, 200))
+        hashes, source = hash_image_file(str(file_path), algorithms=tuple(HASH_FUNCTIONS))
+        self.assertEqual(set(hashes), set(HASH_FUNCTIONS))
+        self.assertEqual(source, 'full')
+        self.assertEqual(hashes['average'], compute_image_hash(str(file_path)))
+        
+    @patch('src.core.similarity.hash_image_file')
+    def test_cascade_confirms_candidates(self, mock_hash):
+        """测试级联模式下候选对需要通过后续算法确认"""
+        records = {
+            'a.jpg': {'average': '0000000000000000', 'difference': '0000000000000000'},
+            'b.jpg': {'average': '0000000000000001', 'difference': '0000000000000003'},
+            'c.jpg': {'average': '0000000000000000', 'difference': 'ffffffffffffffff'},
+        }
+        for name in records:
+            self.create_test_image(name)
+        mock_hash.side_effect = lambda path, use_thumb, algorithms: (
+            {name: records[Path(path).name][name] for name in algorithms}, 'full'
+        )
+        
+        # 只用平均哈希时三张照片都相似
+        result = self.finder.find_similar_photos(self.temp_dir, hash_threshold=2)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(next(iter(result.values()))), 3)
+        
+        finder = PhotoSimilarityFinder(cascade=('average', 'difference'))
+        result = finder.find_similar_photos(self.temp_dir, hash_threshold=2)
+        self.assertEqual(len(result), 1)
+        files = next(iter(result.values()))
+        self.assertEqual(sorted(Path(f).name for f in files), ['a.jpg', 'b.jpg'])
+        self.assertEqual(finder.last_stats, {'candidate_pairs': 3, 'confirmed_pairs': 1})
+        
+    @patch.object(PhotoSimilarityFinder, 'compute_hash')
+    @patch.object(PhotoSimilarityFinder, 'collect_image_files')
+    def test_iter_similar_photos_streams_and_merges(self, mock_collect, mock_hash):
+        """测试增量搜索逐步产出相似组，并在桥接照片出现时合并旧组"""
+        hashes = {
+            'a.jpg': '0000000000000000',
+            'c.jpg': '0000000000000003',  # 与a相差2位
+            'd.jpg': '0000000000000007',  # 与c相差1位
+            'b.jpg': '0000000000000001',  # 与a、c都相差1位
+        }
+        mock_collect.return_value = list(hashes)
+        mock_hash.side_effect = lambda path: hashes[path]
+        
+        events = list(self.finder.iter_similar_photos(self.temp_dir, hash_threshold=1, progress_interval=2))
+        self.assertEqual(events[0], {'type': 'progress', 'hashed': 0, 'total': 4})
+        self.assertEqual(events[-1], {'type': 'progress', 'hashed': 4, 'total': 4})
+        
+        groups = [e for e in events if e['type'] == 'group']
+        self.assertEqual(groups[0]['files'], ['c.jpg', 'd.jpg'])
+        self.assertEqual(groups[0]['merged'], [])
+        # b同时连接a和(c, d)，合并为一组
+        self.assertEqual(sorted(groups[-1]['files']), ['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'])
+        self.assertEqual(groups[-1]['group_id'], groups[0]['group_id'])
+        
+        batch = self.finder.find_similar_photos(self.temp_dir, hash_threshold=1)
+        self.assertEqual([sorted(files) for files in batch.values()], [sorted(groups[-1]['files'])])
+        
+    @patch.object(PhotoSimilarityFinder, 'compute_hash')
+    @patch.object(PhotoSimilarityFinder, 'collect_image_files')
+    def test_iter_similar_photos_uses_backend(self, mock_collect, mock_hash):
+        """测试增量搜索按backend选择哈希索引，各后端产出的相似组一致"""
+        rng = np.random.default_rng(4)
+        values = [int(v) for v in rng.integers(0, 2**64, size=200, dtype=np.uint64)]
+        values += [v ^ 0b101 for v in values[:20]]
+        hashes = {f"{i}.jpg": f"{v:016x}" for i, v in enumerate(values)}
+        mock_collect.return_value = list(hashes)
+        mock_hash.side_effect = lambda path: hashes[path]
+        
+        results = {}
+        for backend in ('numpy', 'mih', 'bktree'):
+            with patch.object(similarity, 'make_index', wraps=similarity.make_index) as make_index:
+                events = list(PhotoSimilarityFinder().iter_similar_photos(self.temp_dir, hash_threshold=3,
+                                                                          backend=backend))
+            make_index.assert_called_once_with(len(values), 3, backend)
+            final = {}
+            for event in events:
+                if event['type'] == 'group':
+                    for merged in event['merged']:
+                        final.pop(merged, None)
+                    final[event['group_id']] = sorted(event['files'])
+            results[backend] = sorted(final.values())
+        self.assertEqual(len(results['numpy']), 20)
+        self.assertEqual(results['numpy'], results['mih'])
+        self.assertEqual(results['numpy'], results['bktree'])
+        
+    def test_invalid_cascade(self):
+        """测试不支持的哈希算法"""
+        with self.assertRaises(ValueError):
+            PhotoSimilarityFinder(cascade=('average', 'color'))
+        with self.assertRaises(ValueError):
+            PhotoSimilarityFinder(cascade=())
+
+class TestBKTree(unittest.TestCase):
+    def test_search_matches_brute_force(self):
+        """测试BK树查询结果与暴力比较一致"""
+        rng = np.random.default_rng(0)
+        values = [int(v) for v in rng.integers(0, 2**63, size=300, dtype=np.uint64)]
+        # 加入一些近邻
+        values += [v ^ 0b101 for v in values[:50]]
+        tree = BKTree()
+        for v in values:
+            tree.add(v)
+        self.assertEqual(len(tree), len(set(values)))
+        
+        for query in values[:20]:
+            expected = sorted(v for v in set(values) if hamming_distance(v, query) <= 4)
+            found = sorted(v for _, v in tree.search(query, 4))
+            self.assertEqual(found, expected)
+            
+    def test_cluster_hashes_is_transitive(self):
+        """测试聚类结果为连通分量"""
+        # 0 -> 1 -> 3 链式相连，距离均为1
+        groups = cluster_hashes([0b0, 0b1, 0b11, 0xff00], threshold=1)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(sorted(groups[0]), [0b0, 0b1, 0b11])
+
+class TestMultiIndexHash(unittest.TestCase):
+    def test_search_matches_brute_force(self):
+        """测试不同分段数和查询半径下，多索引哈希的查询结果与暴力比较一致"""
+        rng = np.random.default_rng(2)
+        values = [int(v) for v in rng.integers(0, 2**64, size=300, dtype=np.uint64)]
+        values += [v ^ 0b1011 for v in values[:50]] + [v ^ (0b111 << 60) for v in values[50:80]]
+        for expected_size, radius in ((300, 0), (300, 5), (10**6, 5), (10**6, 8)):
+            index = MultiIndexHash(expected_size, radius)
+            for v in values:
+                index.add(v)
+            self.assertEqual(len(index), len(set(values)))
+            for query_radius in (radius, radius + 3):
+                with self.subTest(expected_size=expected_size, segments=len(index.segments), radius=query_radius):
+                    for query in values[:100]:
+                        expected = sorted(v for v in set(values) if hamming_distance(v, query) <= query_radius)
+                        found = sorted(v for _, v in index.search(query, query_radius))
+                        self.assertEqual(found, expected)
+                        
+    def test_segments_follow_index_size(self):
+        """测试哈希越多分段越少（段越长），每个段值命中的哈希数保持较少"""
+        self.assertEqual(len(MultiIndexHash(1000, 5).segments), 6)
+        self.assertEqual(len(MultiIndexHash(400000, 5).segments), 3)
+        self.assertEqual(len(MultiIndexHash(400000, 0).segments), 1)
+        
+    def test_pairs_are_unique(self):
+        """测试每个哈希对只产出一次"""
+        values = [0, 1, 3, 7, 0xffff << 40]
+        pairs = list(mih_pairs(values, 2))
+        self.assertEqual(len(pairs), len({frozenset(p) for p in pairs}))
+        self.assertEqual({frozenset(p) for p in pairs},
+                         {frozenset(p) for p in ((0, 1), (0, 3), (1, 3), (1, 7), (3, 7))})
+        
+    def test_batched_pairs_match_numpy(self):
+        """测试批量多索引哈希分批核对候选对时，结果与NumPy分块矩阵一致"""
+        rng = np.random.default_rng(3)
+        values = [int(v) for v in rng.integers(0, 2**64, size=400, dtype=np.uint64)]
+        values += [v ^ 0b110001 for v in values[:60]] + [v ^ 1 for v in values[:30]]
+        expected = {frozenset(p) for p in numpy_pairs(values, 4)}
+        self.assertGreater(len(expected), 60)
+        for chunk_size in (7, 1 << 20):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual({frozenset(p) for p in mih_pairs(values, 4, chunk_size=chunk_size)}, expected)
+
+class TestNumpyBackend(unittest.TestCase):
+    def test_backends_agree(self):
+        """测试NumPy分块后端、多索引哈希和BK树后端聚类结果一致"""
+        rng = np.random.default_rng(1)
+        values = [int(v) for v in rng.integers(0, 2**63, size=500, dtype=np.uint64)]
+        values += [v ^ 0b11 for v in values[:40]]
+        
+        by_numpy = sorted(sorted(g) for g in cluster_hashes(values, 3, backend='numpy'))
+        by_tree = sorted(sorted(g) for g in cluster_hashes(values, 3, backend='bktree'))
+        by_mih = sorted(sorted(g) for g in cluster_hashes(values, 3, backend='mih'))
+        self.assertEqual(by_numpy, by_tree)
+        self.assertEqual(by_numpy, by_mih)
+        self.assertEqual(len(by_numpy), 40)
+        
+    def test_pairs_across_blocks(self):
+        """测试分块边界两侧的哈希对也能被找到"""
+        far = 0b11 << 40
+        values = [0, far, far + 1, 1]
+        pairs = {tuple(sorted(p)) for p in numpy_pairs(values, 1, block_size=2)}
+        self.assertEqual(pairs, {(0, 1), (far, far + 1)})
+        
+    def test_popcount_fallback(self):
+        """测试没有bitwise_count时的SWAR实现"""
+        values = np.array([0, 1, 0b1011, 2**64 - 1], dtype=np.uint64)
+        with patch.object(similarity, 'np', MagicMock(wraps=np, spec=['uint64'])):
+            counts = popcount64(values)
+        self.assertEqual(counts.tolist(), [0, 1, 3, 64])
+        
+    def test_auto_backend(self):
+        """测试自动选择：少量哈希使用NumPy分块矩阵，大量哈希使用多索引哈希，不自动选择BK树"""
+        self.assertEqual(select_backend(NUMPY_BACKEND_MAX_HASHES), 'numpy')
+        self.assertEqual(select_backend(NUMPY_BACKEND_MAX_HASHES + 1), 'mih')
+        self.assertEqual(select_backend(400000), 'mih')
+        self.assertEqual(select_backend(400000, 'bktree'), 'bktree')
+        
+    def test_make_index(self):
+        """测试增量索引的后端选择与批量聚类相同"""
+        self.assertIsInstance(make_index(NUMPY_BACKEND_MAX_HASHES, 5), NumpyIndex)
+        self.assertIsInstance(make_index(NUMPY_BACKEND_MAX_HASHES + 1, 5), MultiIndexHash)
+        self.assertIsInstance(make_index(100, 5, 'bktree'), BKTree)
+        index = NumpyIndex(capacity=2)
+        for value in (0, 1, 3, 7, 0xffff << 40):
+            self.assertTrue(index.add(value))
+        self.assertFalse(index.add(3))
+        self.assertEqual(len(index), 5)
+        self.assertEqual(sorted(index.search(1, 1)), [(0, 1), (1, 0), (1, 3)])
+        
+    def test_invalid_backend(self):
+        """测试不支持的后端名称"""
+        with self.assertRaises(ValueError):
+            cluster_hashes([1, 2], 1, backend='gpu')
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
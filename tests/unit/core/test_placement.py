@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+import errno
+import os
+import tempfile
+import shutil
+
+from src.core import FileProcessor
+from src.core.placement import FilePlacer, PLACEMENT_METHODS
+
+class TestPlacement(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = Path(self.temp_dir) / "IMG_0001.jpg"
+        self.source.write_bytes(b'image data' * 1000)
+        self.target = Path(self.temp_dir) / ".IMG_0001.jpg.partial"
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def test_modes_produce_identical_content(self):
+        """测试各种放置方式得到相同的文件内容和权限，时间由元数据阶段设置"""
+        os.chmod(self.source, 0o640)
+        for mode in ('auto', 'copy', 'reflink', 'hardlink', 'copy_file_range'):
+            with self.subTest(mode=mode):
+                method = FilePlacer(mode).place(self.source, self.target)
+                self.assertEqual(self.target.read_bytes(), self.source.read_bytes())
+                self.assertEqual(self.target.stat().st_mode & 0o777, 0o640)
+                if method == 'hardlink':
+                    self.assertEqual(self.target.stat().st_ino, self.source.stat().st_ino)
+                self.target.unlink()
+                
+    def test_fallback_is_remembered_per_device(self):
+        """测试不支持的方法只尝试一次，之后直接使用下一种方法"""
+        calls = []
+        
+        def unsupported(source, target):
+            calls.append(source)
+            open(target, 'wb').close()
+            raise OSError(errno.EOPNOTSUPP, "not supported")
+            
+        placer = FilePlacer('reflink')
+        with patch.dict(PLACEMENT_METHODS, {'reflink': unsupported}):
+            self.assertEqual(placer.place(self.source, self.target), 'copy')
+            self.assertEqual(placer.place(self.source, self.target), 'copy')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(placer.stats, {'copy': 2})
+        self.assertEqual(self.target.read_bytes(), self.source.read_bytes())
+        
+    def test_other_errors_are_raised(self):
+        """测试非“不支持”类的错误不会被回退掩盖"""
+        def failing(source, target):
+            raise OSError(errno.EIO, "I/O error")
+            
+        with patch.dict(PLACEMENT_METHODS, {'reflink': failing}):
+            with self.assertRaises(OSError):
+                FilePlacer('reflink').place(self.source, self.target)
+                
+    def test_invalid_mode(self):
+        """测试不支持的放置方式"""
+        with self.assertRaises(ValueError):
+            FilePlacer('symlink')
+            
+    def test_process_directory_modes(self):
+        """测试批量整理时硬链接和移动模式"""
+        input_dir = Path(self.temp_dir) / "input"
+        input_dir.mkdir()
+        with patch('src.core.date_extractor.read_exif_datetime', return_value=datetime(2024, 3, 13, 12, 0)):
+            source = input_dir / "IMG_0002.jpg"
+            source.write_bytes(b'linked')
+            FileProcessor(placement='hardlink').process_directory(input_dir, Path(self.temp_dir) / "linked")
+            linked = Path(self.temp_dir) / "linked" / "2024" / "03" / "IMG_0002.jpg"
+            self.assertEqual(linked.stat().st_ino, source.stat().st_ino)
+            
+            result = FileProcessor(placement='move').process_directory(input_dir, Path(self.temp_dir) / "moved")
+            moved = Path(self.temp_dir) / "moved" / "2024" / "03" / "IMG_0002.jpg"
+            self.assertEqual(result['success'], 1)
+            self.assertEqual(moved.read_bytes(), b'linked')
+            self.assertFalse(source.exists())
+            
+    def test_move_renames_on_same_device(self):
+        """测试同一设备上移动直接改名为最终路径，不经过临时文件，不支持硬链接时也不复制数据"""
+        inode = self.source.stat().st_ino
+        destination = Path(self.temp_dir) / "2024" / "IMG_0001.jpg"
+        destination.parent.mkdir()
+        placer = FilePlacer('move')
+        unsupported = OSError(errno.EPERM, "not supported")
+        with patch('src.core.placement.os.link', side_effect=unsupported):
+            self.assertTrue(placer.rename(self.source, destination))
+        self.assertEqual(destination.stat().st_ino, inode)
+        self.assertFalse(self.source.exists())
+        self.assertFalse(self.target.exists())
+        self.assertEqual(placer.stats, {'rename': 1})
+        self.assertFalse(FilePlacer('copy').rename(destination, self.source))
+        
+    def test_move_resumes_after_link(self):
+        """测试上次运行链接到目标后中断，覆盖同一个inode时删除源文件"""
+        destination = Path(self.temp_dir) / "IMG_0001_moved.jpg"
+        os.link(self.source, destination)
+        self.assertTrue(FilePlacer('move').rename(self.source, destination, overwrite=True))
+        self.assertFalse(self.source.exists())
+        self.assertEqual(destination.read_bytes(), b'image data' * 1000)
+        
+    def test_move_keeps_source_when_destination_exists(self):
+        """测试移动模式下规划后才出现的目标文件不被覆盖，源文件保持原样"""
+        input_dir = Path(self.temp_dir) / "input"
+        input_dir.mkdir()
+        source = input_dir / "IMG_0003.jpg"
+        source.write_bytes(b'moved')
+        output_dir = Path(self.temp_dir) / "output"
+        processor = FileProcessor(placement='move')
+        with patch('src.core.date_extractor.read_exif_datetime', return_value=datetime(2024, 3, 13, 12, 0)):
+            plan = processor.plan_directory(input_dir, output_dir)
+        destination = plan['operations'][0]['destination']
+        destination.parent.mkdir(parents=True)
+        destination.write_bytes(b'PRECIOUS')
+        result = processor.execute_plan(plan['operations'])
+        self.assertEqual(result['success'], 0)
+        self.assertEqual(source.read_bytes(), b'moved')
+        self.assertEqual(destination.read_bytes(), b'PRECIOUS')
+        self.assertEqual(sorted(p.name for p in destination.parent.iterdir()), ['IMG_0003.jpg'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+import tempfile
+import shutil
+
+from src.core import FileProcessor
+from src.core.plan import read_plan, write_plan
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = Path(self.temp_dir) / "input"
+        self.output_dir = Path(self.temp_dir) / "output"
+        self.input_dir.mkdir()
+        self.exif_dates = {
+            'IMG_0001.jpg': datetime(2023, 1, 1, 10, 0, 0, tzinfo=timezone(timedelta(hours=8))),
+            'IMG_0003.jpg': datetime(2023, 2, 1, 10, 0, 0),
+        }
+        for name in ('IMG_0001.jpg', 'IMG_0002.jpg', 'IMG_0003.jpg'):
+            (self.input_dir / name).write_bytes(name.encode())
+        (self.input_dir / "2019-06-07").mkdir()
+        (self.input_dir / "2019-06-07" / "IMG_0001.jpg").write_bytes(b'dated by path')
+        (self.input_dir / "misc").mkdir()
+        (self.input_dir / "misc" / "scan.png").write_bytes(b'no date')
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def fake_exif(self, file_path: str):
+        return self.exif_dates.get(Path(file_path).name) if 'input/IMG' in file_path.replace('\\', '/') else None
+        
+    def plan(self, **kwargs):
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif):
+            return FileProcessor().plan_directory(self.input_dir, self.output_dir, **kwargs)
+            
+    def test_plan_does_not_touch_destination(self):
+        """测试规划时不创建输出目录，并记录日期来源"""
+        plan = self.plan()
+        self.assertFalse(self.output_dir.exists())
+        self.assertEqual(plan['total'], 5)
+        sources = {op['source'].relative_to(self.input_dir).as_posix(): op for op in plan['operations']}
+        self.assertEqual(sources['IMG_0001.jpg']['date_source'], 'exif')
+        self.assertEqual(sources['IMG_0002.jpg']['date_source'], 'related')
+        self.assertEqual(sources['2019-06-07/IMG_0001.jpg']['date_source'], 'path')
+        self.assertIsNone(sources['misc/scan.png']['date_source'])
+        self.assertEqual(sources['misc/scan.png']['destination'], self.output_dir / "Unsorted" / "scan.png")
+        
+    def test_round_trip_and_execute(self):
+        """测试计划写入JSON Lines后读回并执行"""
+        plan_path = Path(self.temp_dir) / "plan.jsonl"
+        operations = self.plan()['operations']
+        self.assertEqual(write_plan(operations, plan_path), 5)
+        loaded = read_plan(plan_path)
+        self.assertEqual(loaded, operations)
+        self.assertEqual(loaded[0]['date'].utcoffset(), timedelta(hours=8))
+        
+        result = FileProcessor().execute_plan(loaded)
+        self.assertEqual((result['processed'], result['success']), (5, 4))
+        self.assertEqual(result['placed_stats']['images']['count'], 5)
+        self.assertEqual(result['placed_stats']['images']['size'],
+                         sum(op['source'].stat().st_size for op in operations))
+        for op in operations:
+            self.assertEqual(op['destination'].read_bytes(), op['source'].read_bytes())
+            
+    def test_execute_does_not_overwrite(self):
+        """测试计划生成后目标文件被占用时不覆盖"""
+        operations = self.plan()['operations']
+        target = operations[0]['destination']
+        target.parent.mkdir(parents=True)
+        target.write_bytes(b'existing')
+        result = FileProcessor().execute_plan(operations)
+        self.assertEqual(result['processed'], 5)
+        self.assertEqual(target.read_bytes(), b'existing')
+        
+    def test_dry_run(self):
+        """测试预览模式只写入计划"""
+        plan_path = Path(self.temp_dir) / "plan.jsonl"
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=self.fake_exif):
+            result = FileProcessor().process_directory(self.input_dir, self.output_dir,
+                                                       plan_path=plan_path, dry_run=True)
+        self.assertEqual(result['planned'], 5)
+        self.assertEqual(result['processed'], 0)
+        self.assertFalse(self.output_dir.exists())
+        self.assertEqual(len(read_plan(plan_path)), 5)
+
+if __name__ == '__main__':
+    unittest.main()
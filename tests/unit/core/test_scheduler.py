@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import mock_open, patch
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+from src.core import FileProcessor
+from src.core.plan import make_operation
+from src.core.scheduler import DeviceLimiter, is_rotational, schedule_copies
+from tests.unit.core.helpers import TempDirTestCase
+
+class TestScheduler(TempDirTestCase):
+    def setUp(self):
+        """测试前创建临时目录并清空设备类型缓存"""
+        super().setUp()
+        is_rotational.cache_clear()
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        super().tearDown()
+        is_rotational.cache_clear()
+        
+    def test_is_rotational(self):
+        """测试从sysfs读取设备类型"""
+        with patch('src.core.scheduler.open', mock_open(read_data='1\n')):
+            self.assertTrue(is_rotational(os.makedev(8, 1)))
+        with patch('src.core.scheduler.open', side_effect=OSError):
+            self.assertIsNone(is_rotational(os.makedev(8, 2)))
+            
+    def max_concurrency(self, rotational: bool) -> int:
+        limiter = DeviceLimiter(4)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+        
+        def job():
+            with limiter.hold(1, 1):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.01)
+                with lock:
+                    active[0] -= 1
+                    
+        with patch('src.core.scheduler.is_rotational', return_value=rotational):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                for future in [pool.submit(job) for _ in range(12)]:
+                    future.result()
+        return peak[0]
+        
+    def test_rotational_devices_are_serialized(self):
+        """测试机械硬盘同时只有一个读写"""
+        self.assertEqual(self.max_concurrency(True), 1)
+        self.assertGreater(self.max_concurrency(False), 1)
+        
+    def test_device_of_missing_directory(self):
+        """测试尚未创建的目标目录使用上级目录的设备号"""
+        limiter = DeviceLimiter(1)
+        missing = Path(self.temp_dir) / "2024" / "03" / "IMG_0001.jpg"
+        self.assertEqual(limiter.device_of(missing), os.stat(self.temp_dir).st_dev)
+        
+    def test_schedule_groups_by_source_directory(self):
+        """测试复制顺序按源目录分组，组内保持原顺序"""
+        output = Path(self.temp_dir) / "out"
+        ops = [make_operation(Path(self.temp_dir) / folder / name, output / name, None, None, 0)
+               for folder, name in (('b', '1.jpg'), ('a', '2.jpg'), ('b', '3.jpg'), ('a', '4.jpg'))]
+        ordered = schedule_copies(ops, DeviceLimiter(1))
+        self.assertEqual([op['destination'].name for op in ordered], ['2.jpg', '4.jpg', '1.jpg', '3.jpg'])
+        
+    def test_header_reads_in_inode_order(self):
+        """测试规划时按inode顺序读取文件头部，所有目录的读取都在规划开始时完成"""
+        for folder in ('x', 'y'):
+            (self.input_dir / folder).mkdir()
+            for i in (3, 1, 2):
+                (self.input_dir / folder / f"IMG_000{i}.jpg").write_bytes(f"{folder}{i}".encode())
+        reads = []
+        with patch('src.core.date_extractor.read_exif_datetime', side_effect=lambda path: reads.append(path)):
+            plan = FileProcessor(metadata_workers=1).plan_directory(self.input_dir, self.output_dir)
+        inodes = [os.stat(path).st_ino for path in reads]
+        self.assertEqual(len(reads), 6)
+        self.assertEqual(inodes, sorted(inodes))
+        for folder in ('x', 'y'):
+            dir_inodes = [op['source'].stat().st_ino for op in plan['operations'] if op['source'].parent.name == folder]
+            self.assertEqual(dir_inodes, sorted(dir_inodes))
+
+if __name__ == '__main__':
+    unittest.main()
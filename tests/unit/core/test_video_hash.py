@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import shutil
+import subprocess
+from PIL import Image
+
+from src.core import PhotoSimilarityFinder
+from src.core.video_hash import (VIDEO_FRAME_SIZE, VIDEO_SAMPLE_COUNT, extract_frame, ffmpeg_available,
+                                 hash_video_file, parse_signature, sample_times, sequence_distance)
+
+def fake_frame(video_path: str, timestamp: float, size: int = 32) -> Image.Image:
+    """根据文件内容和时间点生成确定的测试帧，代替ffmpeg解码"""
+    pattern = Path(video_path).read_text()
+    img = Image.new('L', (size, size), 0)
+    for x in range(size):
+        for y in range(size):
+            # 每个模式在不同时间点产生不同的明暗分布
+            if (x * (ord(pattern[0]) % 7 + 1) + y + int(timestamp)) % 5 < 2:
+                img.putpixel((x, y), 255)
+    return img
+
+@patch('src.core.similarity.ffmpeg_available', return_value=True)
+@patch('src.core.video_hash.extract_frame', side_effect=fake_frame)
+@patch('src.core.video_hash.probe_duration', return_value=80.0)
+class TestVideoHash(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.video_dir = Path(self.temp_dir) / "videos"
+        self.video_dir.mkdir()
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def create_test_video(self, filename: str, pattern: str) -> Path:
+        """创建内容为模式字符的占位视频文件"""
+        file_path = self.video_dir / filename
+        file_path.write_text(pattern)
+        return file_path
+        
+    def test_signature_samples_fixed_frames(self, probe, extract, available):
+        """测试指纹只采样固定数量的帧"""
+        video = self.create_test_video("a.mp4", "A")
+        hashes, source = hash_video_file(str(video))
+        self.assertEqual(source, 'keyframes')
+        self.assertEqual(len(parse_signature(hashes['video'])), VIDEO_SAMPLE_COUNT)
+        self.assertEqual(extract.call_count, VIDEO_SAMPLE_COUNT)
+        timestamps = [call.args[1] for call in extract.call_args_list]
+        self.assertEqual(timestamps, sample_times(80.0))
+        
+    def test_unreadable_video(self, probe, extract, available):
+        """测试无法读取时长的视频"""
+        probe.return_value = None
+        video = self.create_test_video("broken.mov", "A")
+        self.assertEqual(hash_video_file(str(video)), (None, 'keyframes'))
+        
+    def test_sequence_distance(self, probe, extract, available):
+        """测试序列距离为逐帧汉明距离之和"""
+        self.assertEqual(sequence_distance((0b1, 0b11), (0b0, 0b00)), 3)
+        self.assertEqual(sequence_distance((5, 6), (5, 6)), 0)
+        # 长度不同的指纹视为完全不同
+        self.assertEqual(sequence_distance((0,), (0, 0)), 128)
+        
+    def test_find_similar_videos(self, probe, extract, available):
+        """测试重新导出的视频与原视频分为一组，图片与视频互不混合"""
+        original = self.create_test_video("clip.mp4", "A")
+        export = self.create_test_video("clip_export.MOV", "A")
+        other = self.create_test_video("other.mp4", "B")
+        Image.new('RGB', (64, 64), (255, 0, 0)).save(self.video_dir / "photo.png")
+        
+        finder = PhotoSimilarityFinder(include_videos=True)
+        similar = finder.find_similar_photos(str(self.video_dir), hash_threshold=2)
+        self.assertEqual(len(similar), 1)
+        self.assertEqual(sorted(next(iter(similar.values()))), sorted([str(original), str(export)]))
+        self.assertNotIn(str(other), finder.hash_dict.get(finder.hash_records[str(original)]['video'], []))
+        
+        # 增量搜索得到相同的组
+        groups = [e for e in finder.iter_similar_photos(str(self.video_dir), hash_threshold=2)
+                  if e['type'] == 'group']
+        self.assertEqual(sorted(groups[-1]['files']), sorted([str(original), str(export)]))
+        
+    def test_videos_skipped_by_default(self, probe, extract, available):
+        """测试未启用视频搜索时不收集视频"""
+        self.create_test_video("clip.mp4", "A")
+        self.assertEqual(PhotoSimilarityFinder().collect_image_files(str(self.video_dir)), [])
+        
+    def test_video_signature_cached(self, probe, extract, available):
+        """测试视频指纹写入缓存，再次扫描时不重新取帧"""
+        self.create_test_video("clip.mp4", "A")
+        self.create_test_video("copy.mp4", "A")
+        cache_path = Path(self.temp_dir) / "cache.sqlite3"
+        PhotoSimilarityFinder(cache_path=str(cache_path), include_videos=True).find_similar_photos(
+            str(self.video_dir))
+        extract.reset_mock()
+        finder = PhotoSimilarityFinder(cache_path=str(cache_path), include_videos=True)
+        similar = finder.find_similar_photos(str(self.video_dir))
+        self.assertEqual(len(similar), 1)
+        extract.assert_not_called()
+
+class TestExtractFrame(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    @patch('src.core.video_hash.subprocess.run')
+    def test_seek_keeps_preceding_keyframe(self, run):
+        """测试只解码关键帧时关闭精确定位，采样点在最后一个关键帧之后也能取到该关键帧"""
+        run.return_value = subprocess.CompletedProcess([], 0, stdout=bytes(VIDEO_FRAME_SIZE ** 2))
+        self.assertIsNotNone(extract_frame("clip.mp4", 3.5))
+        args = run.call_args.args[0]
+        self.assertIn('-noaccurate_seek', args)
+        self.assertLess(args.index('-noaccurate_seek'), args.index('-i'))
+        self.assertLess(args.index('-ss'), args.index('-i'))
+        
+    @unittest.skipUnless(ffmpeg_available(), "需要ffmpeg和ffprobe")
+    def test_real_clip_with_single_keyframe(self):
+        """测试只有开头一个关键帧的真实短视频，所有采样点都能取到帧"""
+        clip = str(Path(self.temp_dir) / "clip.mp4")
+        subprocess.run(
+            ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=4:size=64x64:rate=25',
+             '-g', '1000', '-pix_fmt', 'yuv420p', clip],
+            check=True, capture_output=True, timeout=60
+        )
+        hashes, source = hash_video_file(clip)
+        self.assertEqual(source, 'keyframes')
+        self.assertIsNotNone(hashes)
+        self.assertEqual(len(parse_signature(hashes['video'])), VIDEO_SAMPLE_COUNT)
+        self.assertIsNotNone(extract_frame(clip, 3.9))
+
+if __name__ == '__main__':
+    unittest.main()
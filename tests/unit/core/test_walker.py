@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from datetime import datetime
+import os
+import tempfile
+import shutil
+
+from src.core import FileProcessor
+from src.core.walker import media_stats, merge_stats, walk_media
+
+FORMATS = {'images': {'.jpg', '.png'}, 'videos': {'.mov'}}
+
+class TestWalker(unittest.TestCase):
+    def setUp(self):
+        """测试前创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = Path(self.temp_dir) / "input"
+        (self.input_dir / "a" / "b").mkdir(parents=True)
+        (self.input_dir / "IMG_0001.JPG").write_bytes(b'x' * 10)
+        (self.input_dir / "a" / "clip.MOV").write_bytes(b'y' * 20)
+        (self.input_dir / "a" / "b" / "scan.png").write_bytes(b'z' * 30)
+        (self.input_dir / "a" / "notes.txt").write_bytes(b'not media')
+        (self.input_dir / "folder.jpg").mkdir()
+        
+    def tearDown(self):
+        """测试后清理临时目录"""
+        shutil.rmtree(self.temp_dir)
+        
+    def test_records(self):
+        """测试只为支持的文件生成记录，并带有大小、inode和类别"""
+        records = {f.path.relative_to(self.input_dir).as_posix(): f for f in walk_media(self.input_dir, FORMATS)}
+        self.assertEqual(sorted(records), ['IMG_0001.JPG', 'a/b/scan.png', 'a/clip.MOV'])
+        clip = records['a/clip.MOV']
+        self.assertEqual((clip.size, clip.kind), (20, 'videos'))
+        stat = (self.input_dir / "a" / "clip.MOV").stat()
+        self.assertEqual((clip.inode, clip.mtime_ns), (stat.st_ino, stat.st_mtime_ns))
+        
+    def test_does_not_follow_directory_symlinks(self):
+        """测试不跟随指向目录的符号链接，避免循环"""
+        os.symlink(self.input_dir, self.input_dir / "a" / "loop")
+        self.assertEqual(len(list(walk_media(self.input_dir, FORMATS))), 3)
+        
+    def test_stats(self):
+        """测试统计与合并"""
+        stats = media_stats(walk_media(self.input_dir, FORMATS))
+        self.assertEqual(stats, {'images': {'count': 2, 'size': 40}, 'videos': {'count': 1, 'size': 20}})
+        self.assertEqual(merge_stats(stats, stats)['videos'], {'count': 2, 'size': 40})
+        
+    def test_output_stats_from_plan(self):
+        """测试输出统计来自执行的计划，不重新遍历输出目录，重新运行时包含之前完成的文件"""
+        output_dir = Path(self.temp_dir) / "output"
+        with patch('src.core.date_extractor.read_exif_datetime', return_value=datetime(2024, 3, 13, 12, 0)), \
+                patch('src.core.file_processor.walk_media', wraps=walk_media) as walker:
+            result = FileProcessor().process_directory(self.input_dir, output_dir)
+            self.assertEqual(walker.call_count, 1)
+            self.assertEqual(result['output_stats'], result['input_stats'])
+            
+            (self.input_dir / "IMG_0002.jpg").write_bytes(b'w' * 5)
+            result = FileProcessor().process_directory(self.input_dir, output_dir)
+        self.assertEqual(result['processed'], 1)
+        self.assertEqual(result['output_stats']['images'], {'count': 3, 'size': 45})
+
+if __name__ == '__main__':
+    unittest.main()